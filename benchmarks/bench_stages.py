@@ -0,0 +1,488 @@
+"""Stage-level benchmarks of every processing path on synthetic media.
+
+Times decode, inference, post-processing, blur, encode and the ffmpeg
+transcode separately for the image upload, video upload, folder mode and
+livestream frame paths, then runs each path end to end, sampling the
+process's peak and steady-state resident memory meanwhile. Results are written
+as JSON so runs can be compared across commits; with --baseline the run is
+compared against an earlier result and exits non-zero on a regression.
+
+    python -m benchmarks.bench_stages [--model stub|real] [--backend onnx]
+        [--paths image,video,folder,livestream] [--quick]
+        [--output bench_stages.json] [--baseline old.json] [--tolerance 0.2]
+
+The stub model is deterministic and nearly free, so it isolates everything
+around inference; --model real loads the configured detector.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mediascanner.settings")
+os.environ.setdefault("SECRET_KEY", "benchmarks")
+
+import django
+
+django.setup()
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import StubModel, make_images, make_video, synthetic_frame
+from livestream.adaptation import AdaptiveStream
+from livestream.batching import BatchScheduler
+from livestream.tracking import Tracker
+from media_scanner.ffmpeg_writer import FFMPEG_BINARY, FFmpegWriter, get_profile
+from media_scanner.frame_pool import FramePool, read_into
+from media_scanner.redaction import detections_from_result, redact, render_detections
+from mediascanner import settings
+
+# ─── CONFIG ──────────────────────────────
+CONF_THRESHOLD = 0.5
+IMAGE_SIZE = (1920, 1080)
+IMAGE_COUNT = 40
+VIDEO_SIZE = (1280, 720)
+VIDEO_FRAMES = 150
+FOLDER_SIZE = (1280, 960)
+FOLDER_COUNT = 64
+LIVE_SIZE = (1280, 720)
+LIVE_FRAMES = 200
+LIVE_FPS = 25
+NOISE_FLOOR_MS = 0.05    # stages faster than this are ignored when comparing runs
+MEMORY_INTERVAL = 0.005  # seconds between resident memory samples
+# ─────────────────────────────────────────
+
+PATHS = ("image", "video", "folder", "livestream")
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    @contextlib.contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        yield
+        self.samples[stage].append(time.perf_counter() - start)
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def report(self, items, wall):
+        stages = {}
+        for stage, samples in self.samples.items():
+            ms = np.asarray(samples) * 1000
+            stages[stage] = {
+                "count": len(samples),
+                "mean_ms": round(float(ms.mean()), 4),
+                "p50_ms": round(float(np.percentile(ms, 50)), 4),
+                "p95_ms": round(float(np.percentile(ms, 95)), 4),
+                "total_s": round(float(ms.sum()) / 1000, 4),
+            }
+        return {
+            "items": items,
+            "wall_s": round(wall, 4),
+            "throughput_per_s": round(items / wall, 2) if wall else None,
+            "stages": stages,
+        }
+
+
+def _rss_bytes():
+    """Resident memory of this process, or None where it can't be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class MemoryProbe:
+    """Samples the process's resident memory on a thread while a path runs.
+
+    The steady state is the median of the second half of the samples, once
+    buffers, pools and caches have filled; growth is relative to the memory
+    in use before the path started.
+    """
+
+    def __init__(self, interval=MEMORY_INTERVAL):
+        self.interval = interval
+        self.baseline = None
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.samples.append(_rss_bytes())
+
+    def __enter__(self):
+        self.baseline = _rss_bytes()
+        if self.baseline is not None:
+            self._thread = threading.Thread(target=self._run, name="memory-probe", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.samples.append(_rss_bytes())
+
+    def report(self):
+        if self.baseline is None or not self.samples:
+            return {"skipped": "resident memory not available on this platform"}
+        mb = 1024 * 1024
+        samples = np.asarray(self.samples, np.float64)
+        peak = float(samples.max())
+        steady = float(np.median(samples[len(samples) // 2:]))
+        return {
+            "baseline_mb": round(self.baseline / mb, 2),
+            "peak_mb": round(peak / mb, 2),
+            "steady_mb": round(steady / mb, 2),
+            "peak_growth_mb": round((peak - self.baseline) / mb, 2),
+            "steady_growth_mb": round((steady - self.baseline) / mb, 2),
+            "samples": len(samples),
+        }
+
+
+def _has_ffmpeg():
+    return shutil.which(FFMPEG_BINARY) is not None
+
+
+def bench_image_upload(model, count, size, style):
+    """The upload view's image path: decode bytes, detect, blur, encode."""
+    uploads = []
+    for i in range(count):
+        _, buffer = cv2.imencode(".jpg", synthetic_frame(*size, t=i * 10, seed=i))
+        uploads.append(buffer.tobytes())
+
+    timer = StageTimer()
+    wall = time.perf_counter()
+    for data in uploads:
+        with timer("decode"):
+            frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        with timer("infer"):
+            results = model(frame, verbose=False)
+        with timer("postprocess"):
+            dets = detections_from_result(results[0], CONF_THRESHOLD)
+        with timer("blur"):
+            render_detections(frame, dets, model.names, blur=True, style=style)
+        with timer("encode"):
+            cv2.imencode(".jpg", frame)
+    return timer.report(count, time.perf_counter() - wall)
+
+
+def bench_video_upload(model, workdir, frames, size, style):
+    """The video job: per-stage costs frame by frame, the bare ffmpeg transcode, then process_video."""
+    from media_scanner.views import process_video
+
+    input_path = make_video(os.path.join(workdir, "input.mp4"), frames, *size)
+    profile = settings.VIDEO_OUTPUT_PROFILE
+    ext = get_profile(profile)["ext"]
+    ffmpeg = _has_ffmpeg()
+
+    timer = StageTimer()
+    cap = cv2.VideoCapture(input_path)
+    writer = FFmpegWriter(os.path.join(workdir, f"stages{ext}"), *size, 25, profile=profile) \
+        if ffmpeg else None
+    # Decoded into a reused buffer, like run_pipeline
+    frames = FramePool(1)
+    wall = time.perf_counter()
+    count = 0
+    while True:
+        with timer("decode"):
+            ok, frame = read_into(cap, frames)
+        if not ok:
+            timer.samples["decode"].pop()
+            break
+        with timer("infer"):
+            results = model(frame, verbose=False)
+        with timer("postprocess"):
+            dets = detections_from_result(results[0], CONF_THRESHOLD)
+        with timer("blur"):
+            render_detections(frame, dets, model.names, blur=True, style=style)
+        if writer is not None:
+            with timer("encode"):
+                writer.write(frame)
+        frames.release(frame)
+        count += 1
+    cap.release()
+    if writer is not None:
+        with timer("encode_flush"):
+            writer.release()
+    result = timer.report(count, time.perf_counter() - wall)
+
+    if not ffmpeg:
+        result["skipped"] = f"{FFMPEG_BINARY} not found: encode, ffmpeg_transcode and end_to_end not measured"
+        return result
+
+    # What ffmpeg alone needs to decode and re-encode the same file
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error", "-i", input_path, "-an",
+           "-pix_fmt", "yuv420p"] + get_profile(profile)["video"] + [os.path.join(workdir, f"transcode{ext}")]
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    result["stages"]["ffmpeg_transcode"] = {"count": 1, "total_s": round(time.perf_counter() - start, 4)}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        stats = process_video(input_path, os.path.join(workdir, f"pipeline{ext}"), model)
+        wall = time.perf_counter() - start
+    result["end_to_end"] = {
+        "wall_s": round(wall, 4),
+        "fps": round(stats["frames"] / wall, 2) if wall else None,
+        "stage_busy_s": {k: round(stats[k], 4) for k in ("decode", "process", "encode")},
+    }
+    return result
+
+
+def bench_folder(model, workdir, count, size, style):
+    """Folder mode: per-stage costs with batched inference, then run_folder_mode itself."""
+    import securevision_processor as processor
+
+    folder = os.path.join(workdir, "images")
+    paths = make_images(folder, count, *size)
+    batch_size = processor.FOLDER_BATCH_SIZE
+
+    timer = StageTimer()
+    wall = time.perf_counter()
+    for i in range(0, len(paths), batch_size):
+        batch = []
+        for path in paths[i:i + batch_size]:
+            with timer("decode"):
+                batch.append(cv2.imread(path))
+        start = time.perf_counter()
+        results = model(batch, verbose=False)
+        # One sample per image so the numbers line up with the other stages
+        for _ in batch:
+            timer.add("infer", (time.perf_counter() - start) / len(batch))
+        for j, (img, result) in enumerate(zip(batch, results)):
+            with timer("postprocess"):
+                dets = detections_from_result(result, CONF_THRESHOLD)
+            with timer("blur"):
+                render_detections(img, dets, model.names, blur=True, style=style)
+            with timer("encode"):
+                cv2.imwrite(os.path.join(workdir, f"out_{i + j:04d}.jpg"), img)
+    result = timer.report(len(paths), time.perf_counter() - wall)
+
+    overrides = {"IMAGE_FOLDER_PATH": folder, "OUTPUT_FOLDER_PATH": os.path.join(workdir, "output"),
+                 "SAVE_RESULTS": True, "BLUR_DETECTIONS": True, "REDACTION_STYLE": style}
+    saved = {name: getattr(processor, name) for name in overrides}
+    try:
+        for name, value in overrides.items():
+            setattr(processor, name, value)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            processor.run_folder_mode(model)
+            wall = time.perf_counter() - start
+    finally:
+        for name, value in saved.items():
+            setattr(processor, name, value)
+    result["end_to_end"] = {"wall_s": round(wall, 4), "images_per_s": round(len(paths) / wall, 2)}
+    return result
+
+
+def bench_livestream(model, frames, size, style):
+    """A client-sourced live frame: decode JPEG, detect every DETECT_EVERY frames, track, blur, encode."""
+    from livestream import consumers
+
+    uploads = []
+    for t in range(frames):
+        _, buffer = cv2.imencode(".jpg", synthetic_frame(*size, t=t), [cv2.IMWRITE_JPEG_QUALITY, 80])
+        uploads.append(buffer.tobytes())
+
+    timer = StageTimer()
+    tracker = Tracker()
+    stream = AdaptiveStream()
+    wall = time.perf_counter()
+    for i, data in enumerate(uploads):
+        now = i / LIVE_FPS
+        with timer("decode"):
+            frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        dets = np.empty((0, 6), np.float32)
+        if i % consumers.DETECT_EVERY == 0:
+            with timer("infer"):
+                results = model(frame, verbose=False)
+            with timer("postprocess"):
+                dets = detections_from_result(results[0], consumers.CONF_THRESHOLD)
+            with timer("track"):
+                tracker.update(dets, now)
+        else:
+            with timer("track"):
+                tracker.predict(now)
+        with timer("blur"):
+            boxes = np.concatenate([dets[:, :4], tracker.boxes(),
+                                    tracker.boxes(ahead=consumers.PREDICT_AHEAD)])
+            redact(frame, boxes, style=style)
+        with timer("encode"):
+            h, w = frame.shape[:2]
+            out_size = stream.output_size(w, h)
+            if out_size != (w, h):
+                frame = cv2.resize(frame, out_size, interpolation=cv2.INTER_AREA)
+            cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, stream.quality])
+    result = timer.report(frames, time.perf_counter() - wall)
+
+    # The consumer's own frame function, with inference going through the batch scheduler
+    scheduler = consumers.scheduler
+    consumers.scheduler = BatchScheduler(lambda: model, consumers.CONF_THRESHOLD,
+                                         max_batch=consumers.BATCH_MAX_SIZE,
+                                         max_wait=consumers.BATCH_MAX_WAIT)
+    try:
+        tracker, latencies = Tracker(), []
+        start = time.perf_counter()
+        for i, data in enumerate(uploads):
+            frame_start = time.perf_counter()
+            consumers._decode_process_encode(data, tracker, i % consumers.DETECT_EVERY == 0, stream)
+            latencies.append(time.perf_counter() - frame_start)
+        wall = time.perf_counter() - start
+        batching = consumers.scheduler.metrics()
+    finally:
+        consumers.scheduler = scheduler
+    latencies = np.asarray(latencies) * 1000
+    result["end_to_end"] = {
+        "wall_s": round(wall, 4),
+        "fps": round(frames / wall, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+        "avg_queue_wait_ms": batching["avg_queue_wait_ms"],
+    }
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing each stage's change against `baseline`, and whether any regressed."""
+    lines, regressed = [], False
+    for path, current in results["paths"].items():
+        previous = baseline.get("paths", {}).get(path)
+        if previous is None:
+            continue
+        for stage, timing in current["stages"].items():
+            before = previous["stages"].get(stage, {}).get("mean_ms")
+            after = timing.get("mean_ms")
+            if before is None or after is None or before < NOISE_FLOOR_MS:
+                continue
+            change = (after - before) / before
+            flag = ""
+            if change > tolerance:
+                flag, regressed = "  REGRESSION", True
+            lines.append(f"  {path:<11} {stage:<13} {before:9.3f} -> {after:9.3f} ms ({change:+.0%}){flag}")
+    return lines, regressed
+
+
+def print_summary(results):
+    for path, result in results["paths"].items():
+        print(f"{path}: {result['items']} items, {result['throughput_per_s']}/s in the stage loop")
+        for stage, timing in result["stages"].items():
+            if "mean_ms" in timing:
+                print(f"  {stage:<16} mean {timing['mean_ms']:9.3f} ms   p95 {timing['p95_ms']:9.3f} ms")
+            else:
+                print(f"  {stage:<16} total {timing['total_s']:8.3f} s")
+        if "end_to_end" in result:
+            print(f"  end to end       {result['end_to_end']}")
+        memory = result.get("memory", {})
+        if "peak_mb" in memory:
+            print(f"  memory           peak {memory['peak_mb']:.1f} MB (+{memory['peak_growth_mb']:.1f}), "
+                  f"steady {memory['steady_mb']:.1f} MB (+{memory['steady_growth_mb']:.1f})")
+        if "skipped" in result:
+            print(f"  [WARNING] {result['skipped']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", choices=["stub", "real"], default="stub")
+    parser.add_argument("--backend", default=None, help="inference backend for --model real")
+    parser.add_argument("--paths", default=",".join(PATHS), help="comma-separated subset of " + ",".join(PATHS))
+    parser.add_argument("--style", default=settings.REDACTION_STYLE)
+    parser.add_argument("--quick", action="store_true", help="a quarter of the media, for smoke runs")
+    parser.add_argument("--output", default="bench_stages.json")
+    parser.add_argument("--baseline", default=None, help="earlier JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative slowdown of a stage that counts as a regression")
+    args = parser.parse_args()
+
+    paths = [p.strip() for p in args.paths.split(",") if p.strip()]
+    unknown = set(paths) - set(PATHS)
+    if unknown:
+        parser.error(f"unknown paths: {', '.join(sorted(unknown))}")
+    scale = 4 if args.quick else 1
+
+    if args.model == "real":
+        from media_scanner.model_registry import get_model
+
+        model = get_model(backend=args.backend)
+    else:
+        model = StubModel()
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model": args.model if args.model == "stub" else (args.backend or settings.INFERENCE_BACKEND),
+            "style": args.style,
+            "quick": args.quick,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "ffmpeg": _has_ffmpeg(),
+        },
+        "paths": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="securevision-bench-") as workdir:
+        for path in paths:
+            print(f"[INFO] Benchmarking {path}...", file=sys.stderr)
+            subdir = os.path.join(workdir, path)
+            os.makedirs(subdir)
+            with MemoryProbe() as memory:
+                if path == "image":
+                    result = bench_image_upload(model, IMAGE_COUNT // scale, IMAGE_SIZE, args.style)
+                elif path == "video":
+                    result = bench_video_upload(model, subdir, VIDEO_FRAMES // scale, VIDEO_SIZE, args.style)
+                elif path == "folder":
+                    result = bench_folder(model, subdir, FOLDER_COUNT // scale, FOLDER_SIZE, args.style)
+                else:
+                    result = bench_livestream(model, LIVE_FRAMES // scale, LIVE_SIZE, args.style)
+            result["memory"] = memory.report()
+            results["paths"][path] = result
+
+    print_summary(results)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[✓] Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressed = compare(results, baseline, args.tolerance)
+        print(f"Compared with {args.baseline} (commit {baseline.get('meta', {}).get('commit')}):")
+        print("\n".join(lines) or "  nothing comparable")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Synthetic media and a deterministic stub model for the benchmarks.
+
+Everything here is generated from a seed, so two runs on the same machine
+process exactly the same pixels and boxes.
+"""
+import os
+
+import cv2
+import numpy as np
+
+from media_scanner.backends import Backend
+
+STUB_NAMES = {0: "id_card", 1: "credit_card", 2: "license_plate"}
+
+
+class StubModel(Backend):
+    """Stands in for the detector: a few boxes per frame, derived from the frame itself.
+
+    The boxes depend only on the frame's size and a coarse sample of its
+    pixels, so results are repeatable and the model costs next to nothing.
+    """
+
+    name = "stub"
+
+    def __init__(self, boxes_per_frame=4):
+        self.boxes_per_frame = boxes_per_frame
+        self.names = STUB_NAMES
+
+    def predict(self, frames):
+        return [self._boxes(frame) for frame in frames]
+
+    def _boxes(self, frame):
+        h, w = frame.shape[:2]
+        rng = np.random.default_rng(int(frame[::64, ::64].sum()) % 2 ** 32)
+        n = self.boxes_per_frame
+        bw = rng.uniform(0.05, 0.3, n) * w
+        bh = rng.uniform(0.05, 0.3, n) * h
+        x1 = rng.uniform(0, 1, n) * (w - bw)
+        y1 = rng.uniform(0, 1, n) * (h - bh)
+        conf = rng.uniform(0.3, 0.95, n)
+        cls = rng.integers(0, len(STUB_NAMES), n)
+        return np.stack([x1, y1, x1 + bw, y1 + bh, conf, cls], axis=1).astype(np.float32)
+
+
+def synthetic_frame(width, height, t=0, seed=0):
+    """A frame with a gradient background, noise and a few card-sized rectangles moving with `t`."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frame = np.empty((height, width, 3), np.uint8)
+    frame[..., 0] = (x * 0.6 + y * 0.4).astype(np.uint8)
+    frame[..., 1] = (255 - x * 0.5).astype(np.uint8) // 2 + (y * 0.3).astype(np.uint8)
+    frame[..., 2] = ((x + y) * 0.5).astype(np.uint8)
+    frame = cv2.add(frame, rng.integers(0, 24, frame.shape, dtype=np.uint8))
+
+    for i in range(4):
+        cw, ch = width // (5 + i), height // (7 + i)
+        cx = int((width - cw) * (0.5 + 0.4 * np.sin(0.05 * t + i * 1.7)))
+        cy = int((height - ch) * (0.5 + 0.4 * np.cos(0.04 * t + i * 2.3)))
+        color = tuple(int(c) for c in rng.integers(40, 220, 3))
+        cv2.rectangle(frame, (cx, cy), (cx + cw, cy + ch), color, -1)
+        cv2.putText(frame, f"ID {1000 + i * 37}", (cx + 5, cy + ch // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, max(ch / 80, 0.4), (255, 255, 255), 2)
+    return frame
+
+
+def make_images(folder, count, width, height, ext=".jpg", seed=0):
+    """Write `count` synthetic images to `folder`; returns their paths."""
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"synthetic_{i:04d}{ext}")
+        cv2.imwrite(path, synthetic_frame(width, height, t=i * 10, seed=seed + i))
+        paths.append(path)
+    return paths
+
+
+def make_video(path, frames, width, height, fps=25, seed=0):
+    """Write a synthetic MP4 (mp4v) of `frames` frames; returns `path`."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"OpenCV can't write {path}")
+    # Same seed every frame: static background and noise, only the rectangles move
+    for t in range(frames):
+        writer.write(synthetic_frame(width, height, t=t, seed=seed))
+    writer.release()
+    return path
@@ -38,20 +38,39 @@ const LivestreamComponent = () => {
         didOpen: () => Swal.showLoading(),
       });
 
-      socketRef.current = new WebSocket("ws://localhost:8000/ws/livestream/");
-      socketRef.current.onmessage = (event) => {
-        const img = new Image();
-        img.src = "data:image/jpeg;base64," + event.data;
-        img.onload = () => {
-          const ctx = canvasRef.current?.getContext("2d");
-          if (!ctx || !canvasRef.current) return;
-          canvasRef.current.width = img.width;
-          canvasRef.current.height = img.height;
-          ctx.drawImage(img, 0, 0);
-        };
+      const socket = new WebSocket("ws://localhost:8000/ws/livestream/");
+      socket.binaryType = "blob";
+      socketRef.current = socket;
+
+      // Frames arrive as binary JPEG; text messages are JSON control replies
+      socket.onmessage = async (event) => {
+        if (typeof event.data === "string") return;
+
+        const bitmap = await createImageBitmap(event.data as Blob);
+        const ctx = canvasRef.current?.getContext("2d");
+        if (ctx && canvasRef.current) {
+          canvasRef.current.width = bitmap.width;
+          canvasRef.current.height = bitmap.height;
+          ctx.drawImage(bitmap, 0, 0);
+        }
+        bitmap.close();
+
+        // Acknowledge so the server can adapt quality to how fast we keep up
+        if (socket.readyState === WebSocket.OPEN) {
+          socket.send(JSON.stringify({ type: "ack" }));
+        }
       };
 
-      socketRef.current.onopen = () => {
+      socket.onopen = () => {
+        socket.send(
+          JSON.stringify({
+            type: "config",
+            max_width: Math.round(window.innerWidth * window.devicePixelRatio),
+            quality: 80,
+            ack: true,
+          })
+        );
+
         Swal.fire({
           icon: "success",
           title: "Connected!",
@@ -63,7 +82,7 @@ const LivestreamComponent = () => {
         setIsDialogOpen(true);
       };
 
-      socketRef.current.onclose = () => {
+      socket.onclose = () => {
         setIsConnected(false);
         setIsDialogOpen(false);
       };
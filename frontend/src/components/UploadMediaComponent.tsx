@@ -1,5 +1,7 @@
-import React, { useState, useRef } from "react";
+import React, { useState, useRef, useEffect } from "react";
 import Swal from "sweetalert2";
+import Hls from "hls.js";
+import dashjs from "dashjs";
 import {
   Dialog,
   DialogContent,
@@ -16,6 +18,115 @@ type BlurredMedia = {
   filename: string;
 };
 
+type UploadResult = Partial<BlurredMedia> & {
+  filename: string;
+  job_id?: string;
+  progressive?: boolean;
+  error?: string;
+};
+
+type JobStatus = {
+  status: "queued" | "running" | "done" | "failed" | "cancelled";
+  frames_done: number;
+  frames_total: number;
+  eta_seconds: number | null;
+  error: string | null;
+};
+
+const JOB_POLL_INTERVAL_MS = 1000;
+
+// Video uploads are processed in the background; poll until the job finishes
+const waitForJob = async (
+  jobId: string,
+  onProgress: (job: JobStatus) => void
+): Promise<BlurredMedia> => {
+  for (;;) {
+    const res = await fetch(`http://localhost:8000/jobs/${jobId}/`);
+    if (!res.ok) throw new Error("Job lookup failed");
+    const job: JobStatus = await res.json();
+
+    if (job.status === "done") {
+      const result = await fetch(`http://localhost:8000/jobs/${jobId}/result/`);
+      if (!result.ok) throw new Error("Job result unavailable");
+      return result.json();
+    }
+    if (job.status === "failed" || job.status === "cancelled") {
+      throw new Error(job.error || `Job ${job.status}`);
+    }
+
+    onProgress(job);
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+};
+
+// Progressive (HLS / DASH) output: the playlist appears with the first segment
+// and grows while the job runs, so it can be played long before the job is done
+const waitForPlaylist = async (jobId: string, url: string): Promise<void> => {
+  for (;;) {
+    const res = await fetch(`http://localhost:8000${url}`, { cache: "no-store" });
+    if (res.ok) return;
+
+    const jobRes = await fetch(`http://localhost:8000/jobs/${jobId}/`);
+    if (!jobRes.ok) throw new Error("Job lookup failed");
+    const job: JobStatus = await jobRes.json();
+    if (job.status === "failed" || job.status === "cancelled") {
+      throw new Error(job.error || `Job ${job.status}`);
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+};
+
+const isPlaylist = (filename: string) =>
+  filename.endsWith(".m3u8") || filename.endsWith(".mpd");
+
+const isVideo = (filename: string) =>
+  filename.endsWith(".webm") || filename.endsWith(".mp4") || isPlaylist(filename);
+
+// mp4 / webm play directly; HLS goes through hls.js (or the browser's own
+// HLS support, e.g. Safari) and DASH through dash.js
+const VideoPlayer = ({ media }: { media: BlurredMedia }) => {
+  const videoRef = useRef<HTMLVideoElement>(null);
+  const src = `http://localhost:8000${media.url}`;
+
+  useEffect(() => {
+    const video = videoRef.current;
+    if (!video) return;
+
+    if (media.filename.endsWith(".mpd")) {
+      const player = dashjs.MediaPlayer().create();
+      player.initialize(video, src, false);
+      return () => player.reset();
+    }
+    if (media.filename.endsWith(".m3u8")) {
+      if (Hls.isSupported()) {
+        const hls = new Hls();
+        hls.loadSource(src);
+        hls.attachMedia(video);
+        return () => hls.destroy();
+      }
+      if (video.canPlayType("application/vnd.apple.mpegurl")) {
+        video.src = src;
+      }
+    }
+  }, [src, media.filename]);
+
+  return (
+    <video
+      ref={videoRef}
+      controls
+      className="rounded-lg shadow max-h-[300px] object-contain w-full"
+    >
+      {!isPlaylist(media.filename) && (
+        <source
+          src={`${src}?t=${Date.now()}`}
+          type={media.filename.endsWith(".webm") ? "video/webm" : "video/mp4"}
+        />
+      )}
+      Your browser does not support the video tag.
+    </video>
+  );
+};
+
 const UploadMediaComponent = () => {
   const fileInputRef = useRef<HTMLInputElement>(null);
   const [blurredMedia, setBlurredMedia] = useState<BlurredMedia[]>([]);
@@ -60,13 +171,41 @@ const UploadMediaComponent = () => {
         body: formData,
       });
 
-      Swal.close();
-
       if (!res.ok) throw new Error("Upload failed");
       const data = await res.json();
 
       if (data.results) {
-        setBlurredMedia(data.results);
+        const media: BlurredMedia[] = [];
+        for (const item of data.results as UploadResult[]) {
+          if (item.job_id && item.progressive && item.url) {
+            // Start playback with the first segment; the job keeps extending the playlist
+            Swal.update({ text: "Processing video: preparing stream..." });
+            await waitForPlaylist(item.job_id, item.url);
+            media.push({ url: item.url, filename: item.filename });
+            waitForJob(item.job_id, () => {}).catch((err) => {
+              console.error(`Processing ${item.filename} failed:`, err);
+              Swal.fire("Error", `Processing ${item.filename} failed.`, "error");
+            });
+          } else if (item.job_id) {
+            media.push(
+              await waitForJob(item.job_id, (job) => {
+                const percent = job.frames_total
+                  ? Math.round((100 * job.frames_done) / job.frames_total)
+                  : 0;
+                const eta =
+                  job.eta_seconds != null
+                    ? ` (about ${Math.ceil(job.eta_seconds)}s left)`
+                    : "";
+                Swal.update({ text: `Processing video: ${percent}%${eta}` });
+              })
+            );
+          } else if (item.url) {
+            media.push({ url: item.url, filename: item.filename });
+          }
+        }
+
+        Swal.close();
+        setBlurredMedia(media);
         setIsModalOpen(true);
 
         Swal.fire({
@@ -76,6 +215,8 @@ const UploadMediaComponent = () => {
           timer: 1200,
           showConfirmButton: false,
         });
+      } else {
+        Swal.close();
       }
     } catch (err) {
       console.error("Upload error:", err);
@@ -175,22 +316,8 @@ const UploadMediaComponent = () => {
                     blurredMedia.length <= 2 ? "w-full max-w-[500px]" : "w-[280px]"
                   }`}
                 >
-                  {media.filename.endsWith(".webm") ||
-                  media.filename.endsWith(".mp4") ? (
-                    <video
-                      controls
-                      className="rounded-lg shadow max-h-[300px] object-contain w-full"
-                    >
-                      <source
-                        src={`http://localhost:8000${media.url}?t=${Date.now()}`}
-                        type={
-                          media.filename.endsWith(".webm")
-                            ? "video/webm"
-                            : "video/mp4"
-                        }
-                      />
-                      Your browser does not support the video tag.
-                    </video>
+                  {isVideo(media.filename) ? (
+                    <VideoPlayer media={media} />
                   ) : (
                     <img
                       src={`http://localhost:8000${media.url}`}
@@ -0,0 +1,117 @@
+from urllib.parse import parse_qs
+
+# ─── CONFIG ──────────────────────────────
+DEFAULT_QUALITY = 80     # JPEG quality when the client doesn't ask for one
+MIN_QUALITY = 35         # quality floor before the frame rate is lowered
+QUALITY_STEP = 10
+DEFAULT_FPS = 20
+MIN_FPS = 4
+SLOW_SEND = 0.05         # a send() slower than this (s) means the viewer is congested
+RECOVER_AFTER = 30       # healthy frames before stepping quality/fps back up
+MAX_IN_FLIGHT = 2        # unacknowledged frames allowed when the client sends acks
+# ─────────────────────────────────────────
+
+
+def _clamp_int(value, low, high, default):
+    try:
+        return max(low, min(int(value), high))
+    except (TypeError, ValueError):
+        return default
+
+
+class AdaptiveStream:
+    """Negotiated output settings for one viewer plus backpressure-driven adaptation.
+
+    The client may ask for `max_width`, `max_height`, `quality` and `max_fps`
+    (query string or a {"type": "config"} message) and opt in to `ack`
+    messages. Slow sends or a full ack window lower the JPEG quality first,
+    then the frame rate; sustained healthy sends step them back up to what
+    the client asked for.
+    """
+
+    def __init__(self, max_width=0, max_height=0, quality=DEFAULT_QUALITY,
+                 max_fps=DEFAULT_FPS, ack=False):
+        self.max_width = self.max_height = 0
+        self.target_quality = self.quality = DEFAULT_QUALITY
+        self.target_fps = self.fps = DEFAULT_FPS
+        self.ack = False
+        self.in_flight = 0
+        self._healthy = 0
+        self.configure({"max_width": max_width, "max_height": max_height,
+                        "quality": quality, "max_fps": max_fps, "ack": ack})
+
+    @classmethod
+    def from_query_string(cls, query_string):
+        stream = cls()
+        stream.configure({k: v[-1] for k, v in parse_qs(query_string.decode("latin-1")).items()})
+        return stream
+
+    def configure(self, options):
+        """Apply client-requested settings; adaptation restarts from the new targets."""
+        if "max_width" in options:
+            self.max_width = _clamp_int(options["max_width"], 0, 7680, 0)
+        if "max_height" in options:
+            self.max_height = _clamp_int(options["max_height"], 0, 4320, 0)
+        if "quality" in options:
+            self.target_quality = self.quality = _clamp_int(
+                options["quality"], MIN_QUALITY, 100, DEFAULT_QUALITY)
+        if "max_fps" in options:
+            self.target_fps = self.fps = _clamp_int(options["max_fps"], MIN_FPS, 60, DEFAULT_FPS)
+        if "ack" in options:
+            self.ack = str(options["ack"]).lower() in ("1", "true")
+            self.in_flight = 0
+
+    def output_size(self, width, height):
+        """Largest size within the negotiated bounds that keeps the aspect ratio."""
+        scale = 1.0
+        if self.max_width and width > self.max_width:
+            scale = min(scale, self.max_width / width)
+        if self.max_height and height > self.max_height:
+            scale = min(scale, self.max_height / height)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def can_send(self):
+        return not self.ack or self.in_flight < MAX_IN_FLIGHT
+
+    def sent(self, send_time):
+        if self.ack:
+            self.in_flight += 1
+        if send_time > SLOW_SEND:
+            self._congested()
+        else:
+            self._healthy_frame()
+
+    def acked(self):
+        self.in_flight = max(self.in_flight - 1, 0)
+
+    def stalled(self):
+        """A new frame was dropped because the ack window is full."""
+        self._congested()
+
+    def _congested(self):
+        self._healthy = 0
+        if self.quality > MIN_QUALITY:
+            self.quality = max(self.quality - QUALITY_STEP, MIN_QUALITY)
+        else:
+            self.fps = max(self.fps * 0.75, MIN_FPS)
+
+    def _healthy_frame(self):
+        self._healthy += 1
+        if self._healthy < RECOVER_AFTER:
+            return
+        self._healthy = 0
+        if self.fps < self.target_fps:
+            self.fps = min(self.fps * 1.25, self.target_fps)
+        elif self.quality < self.target_quality:
+            self.quality = min(self.quality + QUALITY_STEP, self.target_quality)
+
+    def to_dict(self):
+        return {
+            "max_width": self.max_width,
+            "max_height": self.max_height,
+            "quality": self.quality,
+            "target_quality": self.target_quality,
+            "fps_limit": round(self.fps, 2),
+            "target_fps": self.target_fps,
+            "ack": self.ack,
+        }
@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from media_scanner.metrics import observe_stage
+from media_scanner.redaction import detections_from_result
+
+# ─── CONFIG ──────────────────────────────
+WINDOW = 500          # batches kept for the batch-size / queue-wait metrics
+RESULT_TIMEOUT = 10   # seconds detect() waits for its batch (after the model is loaded) before giving up
+# ─────────────────────────────────────────
+
+
+class BatchScheduler:
+    """Dynamic batching of live frames across all sessions.
+
+    Sessions call detect(frame) from their worker threads. A single
+    scheduler thread takes the first waiting frame, then keeps collecting
+    until it has `max_batch` frames or `max_wait` seconds have passed since
+    that first frame arrived, runs the model once on the whole batch and
+    hands each session its own detections. If anything goes wrong with a
+    batch, every frame in it gets the exception instead of waiting forever.
+    """
+
+    def __init__(self, get_model, conf_threshold, max_batch=8, max_wait=0.015, timeout=RESULT_TIMEOUT):
+        self.get_model = get_model
+        self.conf_threshold = conf_threshold
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=WINDOW)
+        self._queue_waits = deque(maxlen=WINDOW)
+        self._infer_times = deque(maxlen=WINDOW)
+        self.frames = 0
+        self.batches = 0
+
+    def detect(self, frame):
+        """Blocking: returns (detections N x 6, class names) for `frame`.
+
+        Raises concurrent.futures.TimeoutError if the result doesn't arrive
+        within `timeout` seconds.
+        """
+        # Loading the model (exporting and warming it up on first use) can take
+        # far longer than any batch, so it happens here, before the timeout starts
+        self.get_model()
+        future = Future()
+        self._start()
+        self._queue.put((frame, time.perf_counter(), future))
+        try:
+            return future.result(timeout=self.timeout)
+        finally:
+            # No-op once the batch has started; a frame still queued is skipped
+            future.cancel()
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def metrics(self):
+        with self._lock:
+            sizes, waits, infers = list(self._batch_sizes), sorted(self._queue_waits), list(self._infer_times)
+        ms = lambda v: round(v * 1000, 2)
+        return {
+            "frames": self.frames,
+            "batches": self.batches,
+            "queue_depth": self._queue.qsize(),
+            "max_batch": self.max_batch,
+            "max_wait_ms": ms(self.max_wait),
+            "avg_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else None,
+            "avg_queue_wait_ms": ms(sum(waits) / len(waits)) if waits else None,
+            "p95_queue_wait_ms": ms(waits[int(0.95 * (len(waits) - 1))]) if waits else None,
+            "avg_infer_ms": ms(sum(infers) / len(infers)) if infers else None,
+        }
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = []
+        while len(batch) < self.max_batch:
+            if not batch:
+                item = self._queue.get()
+            else:
+                remaining = batch[0][1] + self.max_wait - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            # False if the caller already gave up on it (detect() timed out)
+            if item[2].set_running_or_notify_cancel():
+                batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _run_batch(self, batch):
+        start = time.perf_counter()
+        model = self.get_model()
+        results = model([frame for frame, _, _ in batch], verbose=False)
+        if len(results) != len(batch):
+            raise RuntimeError(f"Model returned {len(results)} results for a batch of {len(batch)} frames")
+        infer_time = time.perf_counter() - start
+        observe_stage("livestream", "infer", infer_time)
+        for _, queued_at, _ in batch:
+            observe_stage("livestream", "batch_wait", start - queued_at)
+
+        for (_, _, future), result in zip(batch, results):
+            future.set_result((detections_from_result(result, self.conf_threshold), result.names))
+
+        with self._lock:
+            self.frames += len(batch)
+            self.batches += 1
+            self._batch_sizes.append(len(batch))
+            self._queue_waits.extend(start - queued_at for _, queued_at, _ in batch)
+            self._infer_times.append(infer_time)
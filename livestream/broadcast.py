@@ -0,0 +1,176 @@
+import asyncio
+import time
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import get_channel_layer
+
+from livestream.adaptation import AdaptiveStream
+from livestream.capture import get_grabber
+from livestream.consumers import DETECT_EVERY, IDLE_POLL, _process_and_encode, executor, motion_gate
+from livestream.stats import SessionStats, register, unregister
+from livestream.tracking import Tracker
+from media_scanner.frame_pool import FramePool
+from mediascanner import settings
+
+# ─── CONFIG ──────────────────────────────
+BROADCAST_QUALITY = 80   # JPEG quality of the shared stream
+BROADCAST_FPS = 20       # frames published per second at most
+RESTART_MAX_DELAY = 30   # seconds between producer restarts at most (external mode)
+# ─────────────────────────────────────────
+
+
+def group_name(source):
+    return f"livestream.broadcast.{source}"
+
+
+class BroadcastProducer:
+    """Captures, detects, blurs and encodes one source once for all viewers.
+
+    Each encoded frame is published to the source's channels group, so
+    viewers in any process sharing the channel layer receive the same bytes.
+    """
+
+    def __init__(self, source=0):
+        self.source = source
+        self.group = group_name(source)
+        self.viewers = 0
+        self.frames_published = 0
+        self.task = None
+        self._output = AdaptiveStream(quality=BROADCAST_QUALITY, max_fps=BROADCAST_FPS)
+
+    def add_viewer(self):
+        self.viewers += 1
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def remove_viewer(self):
+        self.viewers = max(self.viewers - 1, 0)
+        if not self.viewers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        layer = get_channel_layer()
+        grabber = get_grabber(self.source)
+        tracker = Tracker()
+        gate = motion_gate()
+        frames = FramePool(1)
+        frame_index = 0
+        last_seq = 0
+
+        grabber.acquire()
+        try:
+            while grabber.running:
+                seq, frame, captured_at = grabber.latest()
+                if seq == last_seq or frame is None:
+                    await asyncio.sleep(IDLE_POLL)
+                    continue
+                last_seq = seq
+
+                start = time.perf_counter()
+                private = frames.copy(frame)
+                try:
+                    data = await loop.run_in_executor(
+                        executor, _process_and_encode, private, tracker,
+                        frame_index % DETECT_EVERY == 0, self._output, gate,
+                    )
+                except Exception as e:
+                    # A failed or timed-out batch costs one frame, not the broadcast
+                    print(f"[WARNING] Broadcast frame failed: {e!r}")
+                    data = None
+                finally:
+                    frames.release(private)
+
+                if data is not None:
+                    frame_index += 1
+                    await layer.group_send(self.group, {
+                        "type": "broadcast.frame",
+                        "frame": data,
+                        "seq": seq,
+                        "captured_at": captured_at,
+                    })
+                    self.frames_published += 1
+
+                frame_interval = 1 / BROADCAST_FPS
+                await asyncio.sleep(max(frame_interval - (time.perf_counter() - start), 0))
+        finally:
+            await loop.run_in_executor(None, grabber.release)
+
+
+_producers = {}
+
+
+def get_producer(source=0):
+    if source not in _producers:
+        _producers[source] = BroadcastProducer(source)
+    return _producers[source]
+
+
+class BroadcastConsumer(AsyncWebsocketConsumer):
+    """Viewer of a shared, already-blurred stream.
+
+    Frames arrive from the channels group and are sent as binary JPEG. A
+    viewer that can't keep up only ever sends the newest frame; the ones it
+    missed are skipped. With BROADCAST_PRODUCER = "inline" the first viewer
+    in a process starts that process's producer; with "external" a separate
+    `manage.py broadcast_camera` process publishes over a shared (Redis)
+    channel layer.
+    """
+
+    async def connect(self):
+        self.source = int(self.scope["url_route"]["kwargs"].get("source", 0))
+        self.group = group_name(self.source)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+
+        self.stats = SessionStats()
+        register(self.channel_name, self.stats)
+        self.latest = None
+        self.frame_ready = asyncio.Event()
+        self.sender_task = asyncio.create_task(self.send_frames())
+
+        if settings.BROADCAST_PRODUCER == "inline":
+            get_producer(self.source).add_viewer()
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.group, self.channel_name)
+        self.sender_task.cancel()
+        unregister(self.channel_name)
+        if settings.BROADCAST_PRODUCER == "inline":
+            get_producer(self.source).remove_viewer()
+
+    async def broadcast_frame(self, event):
+        # Never block the channel inbox on a slow socket: keep only the newest frame
+        if self.latest is not None:
+            self.stats.record_drop()
+        self.latest = event
+        self.frame_ready.set()
+
+    async def send_frames(self):
+        while True:
+            await self.frame_ready.wait()
+            self.frame_ready.clear()
+            event, self.latest = self.latest, None
+            if event is None:
+                continue
+            await self.send(bytes_data=event["frame"])
+            self.stats.record(0.0, time.time() - event["captured_at"])
+
+
+def run_producer_forever(source=0):
+    """Entry point for a dedicated producer process (external mode)."""
+    async def main():
+        producer = get_producer(source)
+        failures = 0
+        while True:
+            try:
+                await producer.run()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print(f"[WARNING] Broadcast producer failed ({failures}x): {e!r}")
+            # Device closed or unplugged, or the producer crashed: try again, backing off on repeated failures
+            await asyncio.sleep(min(2 ** failures, RESTART_MAX_DELAY))
+
+    asyncio.run(main())
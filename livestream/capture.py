@@ -0,0 +1,105 @@
+import threading
+import time
+
+import cv2
+
+
+class FrameGrabber:
+    """Reads a capture device on its own thread, keeping only the newest frame.
+
+    Consumers call acquire()/release(); the device is opened for the first
+    user and closed after the last one leaves. Frames nobody picked up in
+    time are simply overwritten (latest frame wins).
+    """
+
+    def __init__(self, source=0):
+        self.source = source
+        self._lock = threading.Lock()
+        self._users = 0
+        self._thread = None
+        self._running = False
+        self._frame = None
+        self._seq = 0
+        self._captured_at = 0.0
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def users(self):
+        return self._users
+
+    def acquire(self):
+        with self._lock:
+            self._users += 1
+            if not self._running:
+                # Stopped, or still closing for the last user: don't hand out its last frame
+                self._frame = None
+                self._seq = 0
+                self._running = True
+            # A thread that is still closing sees _running again and keeps reading
+            if self._thread is None:
+                self._start()
+
+    def release(self):
+        with self._lock:
+            self._users = max(self._users - 1, 0)
+            if self._users:
+                return
+            self._running = False
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=2)
+
+    def stop(self):
+        """Close the device for every user."""
+        with self._lock:
+            self._users = 0
+            self._running = False
+
+    def latest(self):
+        """Return (seq, frame, captured_at) of the newest frame."""
+        with self._lock:
+            return self._seq, self._frame, self._captured_at
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        cap = cv2.VideoCapture(self.source)
+        stopped = False
+        try:
+            while cap.isOpened():
+                if not self._running:
+                    stopped = True
+                    break
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                with self._lock:
+                    self._frame = frame
+                    self._seq += 1
+                    self._captured_at = time.time()
+        finally:
+            cap.release()
+            with self._lock:
+                if stopped and self._running:
+                    # acquire() came in after the loop gave up: open the device again
+                    self._start()
+                else:
+                    self._running = False
+                    self._thread = None
+
+
+_grabbers = {}
+_grabbers_lock = threading.Lock()
+
+
+def get_grabber(source=0):
+    """The process-wide FrameGrabber for a capture device."""
+    with _grabbers_lock:
+        if source not in _grabbers:
+            _grabbers[source] = FrameGrabber(source)
+        return _grabbers[source]
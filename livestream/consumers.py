@@ -1,163 +1,253 @@
-import os
 import cv2
-import base64
-import torch
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from channels.generic.websocket import AsyncWebsocketConsumer
-from ultralytics import YOLO
 import asyncio
+from livestream.adaptation import AdaptiveStream
+from livestream.batching import BatchScheduler
+from livestream.capture import get_grabber
+from livestream.stats import SessionStats, register, unregister
+from livestream.tracking import Tracker
+from media_scanner.frame_pool import FramePool
+from media_scanner.metrics import QUEUE_DEPTH, record_detections, record_frames, timed
+from media_scanner.model_registry import get_model
+from media_scanner.motion import MotionGate
+from media_scanner.redaction import draw_detections, redact
 from mediascanner import settings
 
-
-from collections import deque
-import time
-
-# Store detection history as deque of (timestamp, (x1, y1, x2, y2))
-recent_blurs = deque()
-BLUR_DURATION = 0.5  # seconds
-
-from collections import defaultdict
-
-object_tracks = defaultdict(list)  # cls_id: list of (timestamp, (x1, y1, x2, y2))
-PREDICT_AHEAD = 0.2  # seconds to predict ahead
-
-
 # ─── CONFIG ──────────────────────────────
 CONF_THRESHOLD = 0.3  # ignore detections below this confidence
 BLUR_DETECTIONS = True
+PREDICT_AHEAD = 0.2   # seconds to predict ahead
+DETECT_EVERY = 2      # run YOLO on every Nth frame; the tracker covers the rest
+PROCESS_WORKERS = 16  # threads running inference + encoding off the event loop
+BATCH_MAX_SIZE = 8    # frames from different sessions sent to YOLO in one call
+BATCH_MAX_WAIT = 0.015  # seconds the first frame of a batch may wait for others
+IDLE_POLL = 0.005     # seconds to wait when no new frame has been captured yet
+MAX_PENDING_FRAMES = 1           # client mode: frames queued behind the one in progress
+MAX_FRAME_BYTES = 8 * 1024 * 1024  # client mode: larger uploaded frames are ignored
 # ─────────────────────────────────────────
 
 
-# Check for GPU
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"[INFO] Loading YOLO model on: {DEVICE.upper()}")
+# One capture thread per process; shared by all connections
+grabber = get_grabber(0)
+executor = ThreadPoolExecutor(max_workers=PROCESS_WORKERS, thread_name_prefix="livestream")
+scheduler = BatchScheduler(get_model, CONF_THRESHOLD, max_batch=BATCH_MAX_SIZE, max_wait=BATCH_MAX_WAIT)
+QUEUE_DEPTH.set_function(scheduler.depth, queue="livestream_batch")
 
-# Load model and move to correct device
-model_path = os.path.join(settings.BASE_DIR, "best.pt")
-model = YOLO(model_path).to(DEVICE)
 
-camera = None
+def motion_gate():
+    """A per-stream gate that reuses the last detections while the picture doesn't change (None if disabled)."""
+    if not settings.MOTION_GATE:
+        return None
+    # The gate only sees detection frames, so its interval is counted in those
+    return MotionGate(scheduler.detect, settings.MOTION_THRESHOLD,
+                      max(1, settings.MOTION_MAX_INTERVAL // DETECT_EVERY), metrics_path="livestream")
 
 
-def blur_region(img, x1, y1, x2, y2):
-    height, width = img.shape[:2]
+def predict_and_process(frame, tracker, detect=True, blur=True, gate=None):
+    current_time = time.time()
 
-    # Clamp coordinates to stay within frame
-    x1 = max(0, min(x1, width - 1))
-    x2 = max(0, min(x2, width - 1))
-    y1 = max(0, min(y1, height - 1))
-    y2 = max(0, min(y2, height - 1))
+    # Step 1: Run YOLO (on detection frames) and update the per-stream tracker
+    detected_now = np.empty((0, 6), np.float32)
+    if detect:
+        # Batched with the frames of every other live session; skipped by the
+        # motion gate when nothing changed, the previous detections keep the tracks alive
+        detected_now, names = (gate or scheduler.detect)(frame)
+        record_detections("livestream", len(detected_now))
+        tracker.update(detected_now, current_time)
+
+        # Optional: draw label
+        if not blur:
+            draw_detections(frame, detected_now, names)
+    else:
+        tracker.predict(current_time)
+
+    # Step 2: Blur current detections, tracked boxes and where they are heading
+    if blur:
+        boxes = np.concatenate([
+            detected_now[:, :4],
+            tracker.boxes(),
+            tracker.boxes(ahead=PREDICT_AHEAD),
+        ])
+        with timed("livestream", "blur"):
+            frame = redact(frame, boxes, style=settings.REDACTION_STYLE)
 
-    # Skip if box is too small or invalid
-    if x2 <= x1 or y2 <= y1:
-        return img
+    return frame
 
-    roi = img[y1:y2, x1:x2]
-    if roi.size == 0:
-        return img
 
-    blurred_roi = cv2.GaussianBlur(roi, (25, 25), 30)
-    img[y1:y2, x1:x2] = blurred_roi
-    return img
+def _process_and_encode(frame, tracker, detect, stream, gate=None):
+    processed_frame = predict_and_process(frame, tracker, detect=detect, blur=BLUR_DETECTIONS, gate=gate)
 
+    with timed("livestream", "encode"):
+        height, width = processed_frame.shape[:2]
+        size = stream.output_size(width, height)
+        if size != (width, height):
+            processed_frame = cv2.resize(processed_frame, size, interpolation=cv2.INTER_AREA)
 
-def predict_and_process(frame, blur=True):
-    current_time = time.time()
+        _, buffer = cv2.imencode(".jpg", processed_frame, [cv2.IMWRITE_JPEG_QUALITY, stream.quality])
+    record_frames("livestream")
+    return buffer.tobytes()
 
-    # Step 1: Run YOLO
-    results = model(frame, stream=True)
 
-    detected_now = []
+def _decode_process_encode(data, tracker, detect, stream, gate=None):
+    with timed("livestream", "decode"):
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return None
+    return _process_and_encode(frame, tracker, detect, stream, gate)
 
-    for r in results:
-        for box in r.boxes:
-            conf = float(box.conf[0])
-            if conf < CONF_THRESHOLD:
-                continue
 
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            cls_id = int(box.cls[0])
-            detected_now.append((cls_id, (x1, y1, x2, y2)))
-
-            # Store detection history
-            object_tracks[cls_id].append((current_time, (x1, y1, x2, y2)))
-
-            # Optional: draw label
-            if not blur:
-                label = f"{r.names[cls_id]} {conf:.2f}"
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, label, (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-    # Step 2: Predict future positions
-    future_blurs = []
-    for cls_id, track in object_tracks.items():
-        # Clean old history (>0.5s ago)
-        track = [(t, bbox) for t, bbox in track if current_time - t <= 0.5]
-        object_tracks[cls_id] = track
-
-        if len(track) >= 2:
-            (t1, box1), (t2, box2) = track[-2], track[-1]
-
-            # Compute motion vector
-            dt = t2 - t1
-            if dt == 0:
-                continue
+class _StreamSession(AsyncWebsocketConsumer):
+    """Per-connection state shared by both livestream modes.
 
-            dx1 = (box2[0] - box1[0]) / dt
-            dy1 = (box2[1] - box1[1]) / dt
-            dx2 = (box2[2] - box1[2]) / dt
-            dy2 = (box2[3] - box1[3]) / dt
-
-            dt_future = PREDICT_AHEAD
-            pred_box = (
-                int(box2[0] + dx1 * dt_future),
-                int(box2[1] + dy1 * dt_future),
-                int(box2[2] + dx2 * dt_future),
-                int(box2[3] + dy2 * dt_future),
-            )
-            future_blurs.append(pred_box)
+    Text messages from the client are JSON commands:
+    {"type": "config", "max_width", "max_height", "quality", "max_fps", "ack"}
+    negotiates the output (also accepted as query string parameters),
+    {"type": "ack"} acknowledges a received frame when acks are enabled,
+    and {"type": "stats"} asks for this connection's stats.
+    """
 
-    # Step 3: Apply blur to current and predicted
-    if blur:
-        for _, box in detected_now:
-            x1, y1, x2, y2 = box
-            frame = blur_region(frame, x1, y1, x2, y2)
+    async def connect(self):
+        await self.accept()
 
-        for x1, y1, x2, y2 in future_blurs:
-            frame = blur_region(frame, x1, y1, x2, y2)
+        self.tracker = Tracker()
+        self.gate = motion_gate()
+        self.stats = SessionStats()
+        self.output = AdaptiveStream.from_query_string(self.scope.get("query_string", b""))
+        self.frame_index = 0
+        register(self.channel_name, self.stats)
 
-    return frame
+    async def disconnect(self, close_code):
+        unregister(self.channel_name)
+
+    async def handle_command(self, text_data):
+        try:
+            message = json.loads(text_data)
+        except ValueError:
+            message = {"type": text_data}
+        if not isinstance(message, dict):
+            return
+
+        message_type = message.get("type")
+        if message_type == "ack":
+            self.output.acked()
+        elif message_type == "config":
+            self.output.configure(message)
+            await self.send(json.dumps({"type": "config", **self.output.to_dict()}))
+        elif message_type == "stats":
+            await self.send(json.dumps({"type": "stats", **self.stats.to_dict(),
+                                        **self.output.to_dict(),
+                                        "motion_gate": self.gate.to_dict() if self.gate else None}))
+
+    async def process_and_send(self, work, *args, captured_at, dropped=0):
+        """Run `work(*args, tracker, detect, output, gate)` off the loop and send the JPEG it returns."""
+        start = time.perf_counter()
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(
+                executor, work, *args, self.tracker,
+                self.frame_index % DETECT_EVERY == 0, self.output, self.gate,
+            )
+        except Exception as e:
+            # A failed or timed-out batch costs this frame, not the whole stream
+            print(f"[WARNING] Livestream frame failed: {e!r}")
+            self.stats.record_drop()
+            return
+        process_time = time.perf_counter() - start
+        if data is None:
+            return
+        self.frame_index += 1
 
+        send_start = time.perf_counter()
+        await self.send(bytes_data=data)
+        self.output.sent(time.perf_counter() - send_start)
+        self.stats.record(process_time, time.time() - captured_at, dropped)
 
-class LivestreamConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        global camera
-        await self.accept()
 
-        if camera is None or not camera.isOpened():
-            camera = cv2.VideoCapture(0)
+class LivestreamConsumer(_StreamSession):
+    """Streams the server's camera, blurred, as binary JPEG messages."""
 
-        asyncio.create_task(self.stream_video())
+    async def connect(self):
+        await super().connect()
+        grabber.acquire()
+        # Frames are processed one at a time, so one reused buffer is enough
+        self.frames = FramePool(1)
+        self.stream_task = asyncio.create_task(self.stream_video())
 
     async def disconnect(self, close_code):
-        global camera
-        if camera and camera.isOpened():
-            camera.release()
+        self.stream_task.cancel()
+        await super().disconnect(close_code)
+        await asyncio.get_running_loop().run_in_executor(None, grabber.release)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if text_data is not None:
+            await self.handle_command(text_data)
 
     async def stream_video(self):
-        global camera
-        while True:
-            if camera is None or not camera.isOpened():
-                break
+        last_seq = 0
+        while grabber.running:
+            seq, frame, captured_at = grabber.latest()
+            if seq == last_seq or frame is None:
+                await asyncio.sleep(IDLE_POLL)
+                continue
+            # Only the newest frame is processed; anything in between is dropped
+            dropped = max(seq - last_seq - 1, 0) if last_seq else 0
+            last_seq = seq
+
+            # Viewer hasn't acknowledged enough frames: skip this one and back off
+            if not self.output.can_send():
+                self.output.stalled()
+                self.stats.record_drop()
+                continue
+
+            # The captured frame is shared by every connection, so blur a private copy
+            start = time.perf_counter()
+            private = self.frames.copy(frame)
+            try:
+                await self.process_and_send(_process_and_encode, private,
+                                            captured_at=captured_at, dropped=dropped)
+            finally:
+                self.frames.release(private)
+
+            # Pace to the measured processing time and the adapted frame rate
+            frame_interval = max(1 / self.output.fps, self.stats.process_ema or 0)
+            await asyncio.sleep(max(frame_interval - (time.perf_counter() - start), 0))
 
-            ret, frame = camera.read()
-            if not ret:
-                break
 
-            processed_frame = predict_and_process(frame, blur=BLUR_DETECTIONS)
+class ClientFrameConsumer(_StreamSession):
+    """Blurs frames the client uploads itself, so no server camera is involved.
 
-            # Encode and send
-            _, buffer = cv2.imencode(".jpg", processed_frame)
-            await self.send(base64.b64encode(buffer).decode("utf-8"))
+    The client sends each frame as a binary JPEG/PNG message and gets the
+    blurred frame back as binary JPEG. Each session has its own tracker and
+    processes frames in order; at most MAX_PENDING_FRAMES wait behind the
+    one being processed, older ones are dropped.
+    """
 
-            await asyncio.sleep(0.05)  # ~20 FPS
+    async def connect(self):
+        await super().connect()
+        self.pending = asyncio.Queue(maxsize=MAX_PENDING_FRAMES)
+        self.worker_task = asyncio.create_task(self.process_frames())
+
+    async def disconnect(self, close_code):
+        self.worker_task.cancel()
+        await super().disconnect(close_code)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if text_data is not None:
+            await self.handle_command(text_data)
+            return
+        if not bytes_data or len(bytes_data) > MAX_FRAME_BYTES:
+            return
+
+        # Latest frame wins: make room by dropping the oldest waiting frame
+        if self.pending.full():
+            self.pending.get_nowait()
+            self.stats.record_drop()
+        self.pending.put_nowait((bytes_data, time.time()))
+
+    async def process_frames(self):
+        while True:
+            data, received_at = await self.pending.get()
+            await self.process_and_send(_decode_process_encode, data, captured_at=received_at)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from livestream.broadcast import group_name, run_producer_forever
+
+
+class Command(BaseCommand):
+    help = "Capture, blur and encode a camera once and publish it to its broadcast group."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", type=int, default=0, help="capture device index")
+
+    def handle(self, *args, **options):
+        source = options["source"]
+        self.stdout.write(f"[INFO] Broadcasting camera {source} to group {group_name(source)}")
+        run_producer_forever(source)
@@ -1,6 +1,10 @@
 from django.urls import re_path
-from .consumers import LivestreamConsumer
+from .broadcast import BroadcastConsumer
+from .consumers import ClientFrameConsumer, LivestreamConsumer
 
 websocket_urlpatterns = [
     re_path(r"ws/livestream/$", LivestreamConsumer.as_asgi()),
+    re_path(r"ws/livestream/client/$", ClientFrameConsumer.as_asgi()),
+    re_path(r"ws/livestream/broadcast/$", BroadcastConsumer.as_asgi()),
+    re_path(r"ws/livestream/broadcast/(?P<source>\d+)/$", BroadcastConsumer.as_asgi()),
 ]
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import deque
+
+from media_scanner.metrics import WEBSOCKET_SESSIONS
+
+# ─── CONFIG ──────────────────────────────
+WINDOW = 120        # frames kept for latency percentiles
+EMA_ALPHA = 0.2     # smoothing of the processing-time estimate
+# ─────────────────────────────────────────
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class SessionStats:
+    """Per-connection latency and frame counters."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.process_ema = None
+        self._latency = deque(maxlen=WINDOW)
+        self._process = deque(maxlen=WINDOW)
+
+    def record(self, process_time, latency, dropped=0):
+        """`latency` is capture-to-send time; `dropped` counts frames skipped since the last one."""
+        self.frames_sent += 1
+        self.frames_dropped += dropped
+        self._process.append(process_time)
+        self._latency.append(latency)
+        if self.process_ema is None:
+            self.process_ema = process_time
+        else:
+            self.process_ema += EMA_ALPHA * (process_time - self.process_ema)
+
+    def record_drop(self):
+        self.frames_dropped += 1
+
+    def to_dict(self):
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        ms = lambda v: None if v is None else round(v * 1000, 1)
+        return {
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "fps": round(self.frames_sent / elapsed, 2),
+            "process_ms_ema": ms(self.process_ema),
+            "process_ms_p50": ms(_percentile(self._process, 0.5)),
+            "latency_ms_p50": ms(_percentile(self._latency, 0.5)),
+            "latency_ms_p95": ms(_percentile(self._latency, 0.95)),
+        }
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+WEBSOCKET_SESSIONS.set_function(lambda: len(_sessions))
+
+
+def register(session_id, stats):
+    with _sessions_lock:
+        _sessions[session_id] = stats
+
+
+def unregister(session_id):
+    with _sessions_lock:
+        _sessions.pop(session_id, None)
+
+
+def snapshot():
+    with _sessions_lock:
+        return {session_id: stats.to_dict() for session_id, stats in _sessions.items()}
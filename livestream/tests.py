@@ -1,3 +1,308 @@
-from django.test import TestCase
+import threading
+import time
+from concurrent import futures
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+
+from livestream import broadcast, consumers
+from livestream.batching import BatchScheduler
+from livestream.capture import FrameGrabber
+from livestream.routing import websocket_urlpatterns
+from livestream.tracking import MAX_AGE, Tracker
+
+IN_MEMORY_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+def _frame_event(data, seq):
+    return {"type": "broadcast.frame", "frame": data, "seq": seq, "captured_at": time.time()}
+
+
+class _FakeGrabber:
+    """A capture that yields `frames` new frames, then stops."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.seq = 0
+
+    @property
+    def running(self):
+        return self.seq < self.frames
+
+    def latest(self):
+        self.seq += 1
+        return self.seq, np.zeros((8, 8, 3), np.uint8), time.time()
+
+    def acquire(self):
+        pass
+
+    def release(self):
+        pass
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+class BroadcastFanOutTests(SimpleTestCase):
+    def setUp(self):
+        # The test publishes the frames itself, like an external producer process
+        patcher = mock.patch.object(broadcast.settings, "BROADCAST_PRODUCER", "external")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _viewer(self):
+        viewer = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/livestream/broadcast/")
+        connected, _ = await viewer.connect()
+        self.assertTrue(connected)
+        return viewer
+
+    async def test_one_producer_reaches_every_viewer(self):
+        layer = get_channel_layer()
+        first, second = await self._viewer(), await self._viewer()
+
+        await layer.group_send(broadcast.group_name(0), _frame_event(b"frame-1", 1))
+
+        self.assertEqual(await first.receive_from(), b"frame-1")
+        self.assertEqual(await second.receive_from(), b"frame-1")
+        await first.disconnect()
+        await second.disconnect()
+
+    async def test_producer_skips_a_failed_frame_and_keeps_publishing(self):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(broadcast.group_name(0), channel)
+        work = mock.Mock(side_effect=[futures.TimeoutError(), b"frame-2"])
+
+        with mock.patch.object(broadcast, "get_grabber", lambda source: _FakeGrabber(frames=2)), \
+                mock.patch.object(broadcast, "_process_and_encode", work):
+            await broadcast.BroadcastProducer(0).run()
+
+        message = await layer.receive(channel)
+        self.assertEqual((message["frame"], message["seq"]), (b"frame-2", 2))
+        self.assertEqual(work.call_count, 2)
+
+    async def test_disconnected_viewer_leaves_the_group(self):
+        layer = get_channel_layer()
+        group = broadcast.group_name(0)
+        leaving, staying = await self._viewer(), await self._viewer()
+        self.assertEqual(len(layer.groups[group]), 2)
+
+        await leaving.disconnect()
+        self.assertEqual(len(layer.groups[group]), 1)
+
+        await layer.group_send(group, _frame_event(b"frame-2", 2))
+        self.assertEqual(await staying.receive_from(), b"frame-2")
+        self.assertTrue(await leaving.receive_nothing())
+        await staying.disconnect()
+
+
+def _dets(*boxes):
+    """Detections (x1, y1, x2, y2, conf, cls) from (x1, y1, cls) of 40x40 boxes."""
+    return np.array([[x, y, x + 40, y + 40, 0.9, cls] for x, y, cls in boxes], np.float32)
+
+
+class TrackerTests(SimpleTestCase):
+    def test_moving_objects_keep_their_ids(self):
+        tracker = Tracker()
+        tracker.update(_dets((0, 0, 0), (200, 100, 0)), now=0.0)
+        ids = list(tracker.ids)
+
+        # Both move 5 px per frame; the detector reports them in the other order
+        for i in range(1, 10):
+            tracker.update(_dets((200 - 5 * i, 100, 0), (5 * i, 0, 0)), now=i / 10)
+
+        self.assertEqual(list(tracker.ids), ids)
+        np.testing.assert_allclose(tracker.boxes()[:, 0], [45, 155], atol=2)
+
+    def test_detection_of_another_class_starts_a_new_track(self):
+        tracker = Tracker()
+        tracker.update(_dets((0, 0, 0)), now=0.0)
+        tracker.update(_dets((0, 0, 1)), now=0.1)
+
+        self.assertEqual(len(tracker), 2)
+        self.assertEqual(sorted(tracker.cls), [0, 1])
+
+    def test_unmatched_track_expires_after_max_age(self):
+        tracker = Tracker()
+        tracker.update(_dets((0, 0, 0)), now=0.0)
+
+        tracker.update(_dets(), now=MAX_AGE / 2)
+        self.assertEqual(len(tracker), 1)
+        tracker.update(_dets(), now=MAX_AGE * 2)
+        self.assertEqual(len(tracker), 0)
+
+    def test_boxes_extrapolate_along_the_velocity(self):
+        tracker = Tracker()
+        for i in range(10):
+            tracker.update(_dets((10 * i, 0, 0)), now=i / 10)
+
+        now = tracker.boxes()[0, 0]
+        ahead = tracker.boxes(ahead=0.1)[0, 0]
+        self.assertGreater(ahead, now + 5)
+
+
+class _FrameIdModel:
+    """Fake model: one box per frame whose class is the frame's first pixel value."""
+
+    def __init__(self, drop=0, fail=None, delay=0.0):
+        self.drop = drop
+        self.fail = fail
+        self.delay = delay
+        self.batches = []
+
+    def __call__(self, frames, verbose=False):
+        self.batches.append(len(frames))
+        time.sleep(self.delay)
+        if self.fail is not None:
+            raise self.fail
+        results = [SimpleNamespace(dets=np.array([[0, 0, 10, 10, 0.9, f[0, 0, 0]]], np.float32),
+                                   names={}) for f in frames]
+        return results[:len(results) - self.drop]
+
+
+def _frame(value):
+    return np.full((8, 8, 3), value, np.uint8)
+
+
+class BatchSchedulerTests(SimpleTestCase):
+    def _detect_all(self, scheduler, count):
+        """detect() from `count` threads at once; returns each one's result or exception."""
+        outcomes = [None] * count
+
+        def call(i):
+            try:
+                outcomes[i] = scheduler.detect(_frame(i))
+            except Exception as e:
+                outcomes[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+        return outcomes
+
+    def test_concurrent_frames_share_a_batch_and_get_their_own_result(self):
+        model = _FrameIdModel()
+        scheduler = BatchScheduler(lambda: model, 0.5, max_batch=4, max_wait=0.2)
+
+        outcomes = self._detect_all(scheduler, 4)
+
+        self.assertEqual([int(dets[0, 5]) for dets, _ in outcomes], [0, 1, 2, 3])
+        self.assertLess(len(model.batches), 4)
+
+    def test_missing_results_fail_every_frame_of_the_batch(self):
+        model = _FrameIdModel(drop=1)
+        scheduler = BatchScheduler(lambda: model, 0.5, max_batch=3, max_wait=0.2, timeout=2)
+
+        outcomes = self._detect_all(scheduler, 3)
+
+        self.assertTrue(all(isinstance(o, RuntimeError) for o in outcomes), outcomes)
+
+    def test_model_error_reaches_callers_and_scheduler_keeps_running(self):
+        model = _FrameIdModel(fail=ValueError("bad batch"))
+        scheduler = BatchScheduler(lambda: model, 0.5, max_batch=1, timeout=2)
+
+        with self.assertRaises(ValueError):
+            scheduler.detect(_frame(1))
+        model.fail = None
+        dets, _ = scheduler.detect(_frame(7))
+        self.assertEqual(int(dets[0, 5]), 7)
+
+    def test_model_load_does_not_count_against_the_timeout(self):
+        model = _FrameIdModel()
+        loaded = []
+
+        def slow_load():
+            # Like get_model(): slow the first time only
+            if not loaded:
+                time.sleep(0.2)
+                loaded.append(model)
+            return model
+
+        scheduler = BatchScheduler(slow_load, 0.5, max_batch=1, timeout=0.1)
+
+        dets, _ = scheduler.detect(_frame(3))
+        self.assertEqual(int(dets[0, 5]), 3)
+
+    def test_detect_times_out_on_a_stuck_model(self):
+        model = _FrameIdModel(delay=0.5)
+        scheduler = BatchScheduler(lambda: model, 0.5, max_batch=1, timeout=0.05)
+
+        with self.assertRaises(futures.TimeoutError):
+            scheduler.detect(_frame(1))
+
+
+class ClientFrameConsumerTests(SimpleTestCase):
+    async def test_failed_frame_is_dropped_and_the_stream_goes_on(self):
+        work = mock.Mock(side_effect=[futures.TimeoutError(), b"blurred"])
+        with mock.patch.object(consumers, "_decode_process_encode", work):
+            client = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/livestream/client/")
+            connected, _ = await client.connect()
+            self.assertTrue(connected)
+
+            await client.send_to(bytes_data=b"frame-1")
+            self.assertTrue(await client.receive_nothing(timeout=0.2))
+            await client.send_to(bytes_data=b"frame-2")
+            self.assertEqual(await client.receive_from(), b"blurred")
+            await client.disconnect()
+
+
+class _FakeCapture:
+    """cv2.VideoCapture stand-in: a new frame every 20 ms."""
+
+    def __init__(self, source):
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        time.sleep(0.02)
+        return True, np.zeros((8, 8, 3), np.uint8)
+
+    def release(self):
+        self.opened = False
+
+
+@mock.patch("livestream.capture.cv2.VideoCapture", _FakeCapture)
+class FrameGrabberTests(SimpleTestCase):
+    def _wait_for_frame(self, grabber, after=0):
+        for _ in range(100):
+            seq, frame, _ = grabber.latest()
+            if seq > after and frame is not None:
+                return seq
+            time.sleep(0.01)
+        self.fail("no frame captured")
+
+    def test_reconnect_while_closing_keeps_the_device_running(self):
+        grabber = FrameGrabber()
+        grabber.acquire()
+        self._wait_for_frame(grabber)
+
+        # The last viewer leaves and a new one arrives before the thread has exited
+        grabber.stop()
+        grabber.acquire()
+        self.addCleanup(grabber.stop)
+
+        self.assertEqual(grabber.latest()[:2], (0, None))
+        seq = self._wait_for_frame(grabber)
+        time.sleep(0.1)
+        self.assertTrue(grabber.running)
+        self.assertGreater(grabber.latest()[0], seq)
+
+    def test_device_reopens_after_release(self):
+        grabber = FrameGrabber()
+        grabber.acquire()
+        self._wait_for_frame(grabber)
+        grabber.release()
+        self.assertFalse(grabber.running)
+
+        grabber.acquire()
+        self.addCleanup(grabber.stop)
+        self.assertEqual(grabber.latest()[:2], (0, None))
+        self._wait_for_frame(grabber)
+        self.assertTrue(grabber.running)
@@ -0,0 +1,134 @@
+import itertools
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+# ─── CONFIG ──────────────────────────────
+IOU_THRESHOLD = 0.2    # minimum IoU to associate a detection with a track
+MAX_AGE = 0.5          # seconds a track survives without a matching detection
+POS_NOISE = 0.05       # process noise on position, as a fraction of box height per second
+VEL_NOISE = 0.5        # process noise on velocity, as a fraction of box height per second
+MEAS_NOISE = 0.05      # detector noise, as a fraction of box height
+# ─────────────────────────────────────────
+
+_H = np.hstack([np.eye(4), np.zeros((4, 4))]).astype(np.float32)
+
+
+def _to_state(boxes):
+    """x1, y1, x2, y2 -> cx, cy, w, h"""
+    w = boxes[:, 2] - boxes[:, 0]
+    h = boxes[:, 3] - boxes[:, 1]
+    return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w, h], axis=1)
+
+
+def _to_boxes(state):
+    cx, cy, w, h = state[:, 0], state[:, 1], np.maximum(state[:, 2], 1), np.maximum(state[:, 3], 1)
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+
+def iou_matrix(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class Tracker:
+    """Multi-object tracker with one constant-velocity Kalman filter per object.
+
+    All track state lives in compact arrays (T x 8 states, T x 8 x 8
+    covariances) and every step is vectorised over tracks. Detections are
+    associated to predicted tracks of the same class by IoU with the
+    Hungarian algorithm. One Tracker per stream; it is not thread-safe.
+    """
+
+    def __init__(self):
+        self.x = np.zeros((0, 8), np.float32)
+        self.P = np.zeros((0, 8, 8), np.float32)
+        self.cls = np.zeros(0, np.int32)
+        self.ids = np.zeros(0, np.int64)
+        self.last_seen = np.zeros(0, np.float64)
+        self.time = None
+        self._next_id = itertools.count(1)
+
+    def __len__(self):
+        return len(self.x)
+
+    def predict(self, now):
+        """Advance every track to time `now` (seconds)."""
+        if self.time is None:
+            self.time = now
+        dt = max(now - self.time, 0.0)
+        self.time = now
+        if dt == 0 or len(self) == 0:
+            return
+
+        F = np.eye(8, dtype=np.float32)
+        F[:4, 4:] = np.eye(4) * dt
+        self.x = self.x @ F.T
+
+        scale = np.maximum(self.x[:, 3], 1.0) ** 2
+        q = np.concatenate([np.full(4, POS_NOISE ** 2), np.full(4, VEL_NOISE ** 2)]) * dt
+        self.P = F @ self.P @ F.T + scale[:, None, None] * np.diag(q).astype(np.float32)
+
+    def update(self, dets, now):
+        """Predict to `now`, then correct with detections (N x 6: x1, y1, x2, y2, conf, cls)."""
+        self.predict(now)
+        dets = np.asarray(dets, np.float32).reshape(-1, 6)
+        det_cls = dets[:, 5].astype(np.int32)
+
+        matched_t, matched_d = np.zeros(0, int), np.zeros(0, int)
+        if len(self) and len(dets):
+            iou = iou_matrix(_to_boxes(self.x), dets[:, :4])
+            iou[self.cls[:, None] != det_cls[None, :]] = 0
+            rows, cols = linear_sum_assignment(-iou)
+            keep = iou[rows, cols] >= IOU_THRESHOLD
+            matched_t, matched_d = rows[keep], cols[keep]
+
+        if len(matched_t):
+            self._correct(matched_t, _to_state(dets[matched_d, :4]))
+            self.last_seen[matched_t] = now
+
+        alive = now - self.last_seen <= MAX_AGE
+        self._keep(alive)
+
+        new = np.setdiff1d(np.arange(len(dets)), matched_d)
+        if len(new):
+            self._spawn(dets[new], now)
+
+    def boxes(self, ahead=0.0):
+        """Track boxes (x1, y1, x2, y2), optionally extrapolated `ahead` seconds."""
+        state = self.x[:, :4] + self.x[:, 4:] * ahead
+        return _to_boxes(state)
+
+    def _correct(self, idx, z):
+        x, P = self.x[idx], self.P[idx]
+        r = (MEAS_NOISE * np.maximum(x[:, 3], 1.0)) ** 2
+        S = P[:, :4, :4] + r[:, None, None] * np.eye(4, dtype=np.float32)
+        K = P[:, :, :4] @ np.linalg.inv(S)
+        self.x[idx] = x + (K @ (z - x[:, :4])[:, :, None])[:, :, 0]
+        self.P[idx] = P - K @ P[:, :4, :]
+
+    def _keep(self, mask):
+        self.x, self.P = self.x[mask], self.P[mask]
+        self.cls, self.ids, self.last_seen = self.cls[mask], self.ids[mask], self.last_seen[mask]
+
+    def _spawn(self, dets, now):
+        n = len(dets)
+        x = np.zeros((n, 8), np.float32)
+        x[:, :4] = _to_state(dets[:, :4])
+        h2 = np.maximum(x[:, 3], 1.0) ** 2
+        P = np.zeros((n, 8, 8), np.float32)
+        P[:, range(4), range(4)] = (MEAS_NOISE ** 2) * h2[:, None]
+        # Unknown initial velocity: allow about one box height per second
+        P[:, range(4, 8), range(4, 8)] = h2[:, None]
+
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, P])
+        self.cls = np.concatenate([self.cls, dets[:, 5].astype(np.int32)])
+        self.ids = np.concatenate([self.ids, [next(self._next_id) for _ in range(n)]])
+        self.last_seen = np.concatenate([self.last_seen, np.full(n, now)])
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("livestream/stats/", views.livestream_stats, name="livestream_stats"),
+]
@@ -1,3 +1,14 @@
-from django.shortcuts import render
+from django.http import JsonResponse
 
-# Create your views here.
+from livestream.consumers import scheduler
+from livestream.stats import snapshot
+
+
+def livestream_stats(request):
+    """Latency stats of every active livestream connection and the batch scheduler"""
+    sessions = snapshot()
+    return JsonResponse({
+        "active_sessions": len(sessions),
+        "sessions": sessions,
+        "batching": scheduler.metrics(),
+    })
@@ -1,3 +1,15 @@
 from django.contrib import admin
 
-# Register your models here.
+from media_scanner.models import Detection, MediaItem
+
+
+@admin.register(MediaItem)
+class MediaItemAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "name", "output", "frame_count", "created_at")
+    list_filter = ("kind",)
+
+
+@admin.register(Detection)
+class DetectionAdmin(admin.ModelAdmin):
+    list_display = ("media", "frame", "cls", "confidence")
+    list_filter = ("cls",)
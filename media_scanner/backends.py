@@ -0,0 +1,188 @@
+import glob
+import json
+import os
+
+import cv2
+import numpy as np
+
+# ─── CONFIG ──────────────────────────────
+IMGSZ = 640              # square input size of exported models
+MIN_CONF = 0.25          # candidates below this are dropped before NMS (ultralytics default)
+IOU_THRESHOLD = 0.45     # NMS overlap threshold
+MAX_DETECTIONS = 300     # per frame, after NMS
+PAD_VALUE = 114
+# ─────────────────────────────────────────
+
+
+class Detections:
+    """Result for one frame: `dets` is an (N, 6) float32 array of x1, y1, x2, y2, conf, cls."""
+
+    def __init__(self, dets, names):
+        self.dets = dets
+        self.names = names
+
+
+class Backend:
+    """One loaded model. Calling it with a frame or a list of BGR frames returns one Detections per frame."""
+
+    name = None
+    device = "cpu"
+    names = {}
+
+    def __call__(self, source, **kwargs):
+        frames = source if isinstance(source, (list, tuple)) else [source]
+        if not frames:
+            return []
+        return [Detections(dets, self.names) for dets in self.predict(list(frames))]
+
+    def predict(self, frames):
+        raise NotImplementedError
+
+
+class TorchBackend(Backend):
+    """The .pt weights through ultralytics/PyTorch (GPU when available)."""
+
+    name = "torch"
+
+    def __init__(self, model_path, threads=0):
+        import torch
+        from ultralytics import YOLO
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = YOLO(model_path).to(self.device)
+        self.names = self.model.names
+
+    def predict(self, frames):
+        results = self.model(frames, verbose=False, conf=MIN_CONF, iou=IOU_THRESHOLD,
+                             max_det=MAX_DETECTIONS)
+        return [r.boxes.data.cpu().numpy()[:, :6].astype(np.float32) for r in results]
+
+
+def letterbox(frame, size=IMGSZ):
+    """Resize keeping the aspect ratio and pad to size x size; returns (image, scale, (pad_x, pad_y))."""
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = round(w * scale), round(h * scale)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    out = np.full((size, size, 3), PAD_VALUE, np.uint8)
+    out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(
+        frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    return out, scale, (pad_x, pad_y)
+
+
+def preprocess(frames, size=IMGSZ):
+    """BGR frames -> (B, 3, size, size) float32 RGB tensor in [0, 1] plus per-frame letterbox params."""
+    batch = np.empty((len(frames), 3, size, size), np.float32)
+    params = []
+    for i, frame in enumerate(frames):
+        img, scale, pad = letterbox(frame, size)
+        batch[i] = img[:, :, ::-1].transpose(2, 0, 1) * (1 / 255.0)
+        params.append((scale, pad, frame.shape[:2]))
+    return batch, params
+
+
+def postprocess(output, params):
+    """Raw YOLOv8 head output (B, 4 + classes, anchors) -> list of (N, 6) arrays in frame coordinates."""
+    results = []
+    for pred, (scale, (pad_x, pad_y), (h, w)) in zip(output, params):
+        pred = pred.T
+        scores = pred[:, 4:]
+        cls = scores.argmax(1)
+        conf = scores[np.arange(len(scores)), cls]
+        keep = conf >= MIN_CONF
+        if not keep.any():
+            results.append(np.empty((0, 6), np.float32))
+            continue
+        pred, cls, conf = pred[keep], cls[keep], conf[keep]
+
+        # cx, cy, w, h in letterbox space -> x1, y1, x2, y2 in the frame
+        boxes = np.empty((len(pred), 4), np.float32)
+        boxes[:, :2] = pred[:, :2] - pred[:, 2:4] / 2
+        boxes[:, 2:] = pred[:, :2] + pred[:, 2:4] / 2
+        boxes -= (pad_x, pad_y, pad_x, pad_y)
+        boxes /= scale
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+
+        xywh = np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1)
+        idx = cv2.dnn.NMSBoxesBatched(xywh.tolist(), conf.tolist(), cls.tolist(), MIN_CONF, IOU_THRESHOLD)
+        idx = np.asarray(idx, np.int64).reshape(-1)[:MAX_DETECTIONS]
+        results.append(np.concatenate(
+            [boxes[idx], conf[idx, None], cls[idx, None].astype(np.float32)], axis=1
+        ).astype(np.float32))
+    return results
+
+
+def read_metadata(export_path):
+    """Class names and input size saved next to an exported model."""
+    with open(f"{export_path.rstrip(os.sep)}.json") as f:
+        meta = json.load(f)
+    meta["names"] = {int(k): v for k, v in meta["names"].items()}
+    return meta
+
+
+class OnnxBackend(Backend):
+    """An exported .onnx model on ONNX Runtime."""
+
+    name = "onnx"
+
+    def __init__(self, export_path, threads=0):
+        import onnxruntime as ort
+
+        meta = read_metadata(export_path)
+        self.names, self.imgsz = meta["names"], meta["imgsz"]
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider")
+                     if p in ort.get_available_providers()]
+        self.session = ort.InferenceSession(export_path, options, providers=providers)
+        self.device = "cuda" if self.session.get_providers()[0] == "CUDAExecutionProvider" else "cpu"
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, frames):
+        batch, params = preprocess(frames, self.imgsz)
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return postprocess(output, params)
+
+
+class OpenVINOBackend(Backend):
+    """An exported OpenVINO IR model (directory with the .xml/.bin pair) on the OpenVINO runtime."""
+
+    name = "openvino"
+
+    def __init__(self, export_path, threads=0, device="CPU"):
+        import openvino as ov
+
+        meta = read_metadata(export_path)
+        self.names, self.imgsz = meta["names"], meta["imgsz"]
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        core = ov.Core()
+        model = core.read_model(glob.glob(os.path.join(export_path, "*.xml"))[0])
+        self.compiled = core.compile_model(model, device, config)
+        self.device = device.lower()
+
+    def predict(self, frames):
+        batch, params = preprocess(frames, self.imgsz)
+        output = self.compiled(batch)[0]
+        return postprocess(np.asarray(output), params)
+
+
+BACKENDS = {
+    "torch": TorchBackend,
+    "onnx": OnnxBackend,
+    "openvino": OpenVINOBackend,
+}
+
+
+def get_backend(name):
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {sorted(BACKENDS)}")
@@ -0,0 +1,45 @@
+import numpy as np
+
+from media_scanner.models import Detection
+
+# ─── CONFIG ──────────────────────────────
+BULK_SIZE = 2000   # detections buffered per bulk INSERT
+# ─────────────────────────────────────────
+
+
+class DetectionWriter:
+    """Buffers the detections of one media item and writes them with bulk inserts."""
+
+    def __init__(self, media, bulk_size=BULK_SIZE):
+        self.media = media
+        self.bulk_size = bulk_size
+        self.count = 0
+        self._pending = []
+
+    def add(self, frame_index, dets):
+        for x1, y1, x2, y2, conf, cls_id in np.asarray(dets, np.float32).reshape(-1, 6).tolist():
+            self._pending.append(Detection(
+                media=self.media, frame=frame_index, cls=int(cls_id), confidence=conf,
+                x1=x1, y1=y1, x2=x2, y2=y2,
+            ))
+        if len(self._pending) >= self.bulk_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            Detection.objects.bulk_create(self._pending, batch_size=self.bulk_size)
+            self.count += len(self._pending)
+            self._pending = []
+
+
+def load_detections(media):
+    """Stored detections of `media` as {frame index: (N, 6) array of x1, y1, x2, y2, conf, cls}."""
+    rows = np.array(
+        media.detections.order_by("frame", "id")
+        .values_list("frame", "x1", "y1", "x2", "y2", "confidence", "cls"),
+        np.float64,
+    ).reshape(-1, 7)
+    if not len(rows):
+        return {}
+    frames, starts = np.unique(rows[:, 0].astype(np.int64), return_index=True)
+    return {int(f): dets for f, dets in zip(frames, np.split(rows[:, 1:].astype(np.float32), starts[1:]))}
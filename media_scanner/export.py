@@ -0,0 +1,131 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import cv2
+
+from media_scanner.backends import IMGSZ, get_backend, preprocess
+from mediascanner import settings
+
+# ─── CONFIG ──────────────────────────────
+CALIBRATION_SIZE = 300   # images used at most for INT8 calibration
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+# ─────────────────────────────────────────
+
+_lock = threading.Lock()
+
+
+def export_path(backend, model_path=None, int8=False, imgsz=IMGSZ):
+    """Where the converted model for these options is cached.
+
+    The name includes a hash of the source weights' identity (path, size,
+    mtime), so retrained weights get a fresh export.
+    """
+    from media_scanner.model_registry import weights_version
+
+    model_path = os.path.abspath(model_path or settings.MODEL_PATH)
+    digest = hashlib.sha1(weights_version(model_path).encode("utf-8")).hexdigest()[:10]
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    name = f"{stem}-{digest}-{backend}-{imgsz}{'-int8' if int8 else ''}"
+    if backend == "onnx":
+        name += ".onnx"
+    return os.path.join(str(settings.EXPORTED_MODELS_DIR), name)
+
+
+def calibration_images(calibration_dir, imgsz=IMGSZ, limit=CALIBRATION_SIZE):
+    """Preprocessed (1, 3, imgsz, imgsz) tensors from the images in `calibration_dir`."""
+    paths = sorted(p for p in glob.glob(os.path.join(str(calibration_dir), "**", "*"), recursive=True)
+                   if p.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    batches = []
+    for path in paths:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is not None:
+            batches.append(preprocess([img], imgsz)[0])
+    if not batches:
+        raise ValueError(f"INT8 quantization needs calibration images in {calibration_dir}")
+    return batches
+
+
+def _quantize_onnx(src, dst, batches):
+    import onnxruntime as ort
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_static)
+
+    input_name = ort.InferenceSession(src, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(batches)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {input_name: batch}
+
+    quantize_static(src, dst, Reader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+
+def _quantize_openvino(src_dir, dst_dir, batches):
+    import nncf
+    import openvino as ov
+
+    model = ov.Core().read_model(glob.glob(os.path.join(src_dir, "*.xml"))[0])
+    quantized = nncf.quantize(model, nncf.Dataset(batches), subset_size=len(batches),
+                              preset=nncf.QuantizationPreset.MIXED)
+    os.makedirs(dst_dir, exist_ok=True)
+    ov.save_model(quantized, os.path.join(dst_dir, "model.xml"))
+
+
+def export_model(backend, model_path=None, int8=False, calibration_dir=None, imgsz=IMGSZ, force=False):
+    """Convert the .pt weights for `backend` ("onnx" or "openvino") and return the cached export.
+
+    Reuses an existing export unless `force`. With `int8`, weights and
+    activations are quantized using the images in `calibration_dir`.
+    """
+    get_backend(backend)
+    if backend == "torch":
+        raise ValueError("The torch backend runs the .pt weights directly; nothing to export")
+
+    model_path = os.path.abspath(model_path or settings.MODEL_PATH)
+    target = export_path(backend, model_path, int8=int8, imgsz=imgsz)
+
+    with _lock:
+        if os.path.exists(target) and os.path.exists(f"{target}.json") and not force:
+            return target
+
+        from ultralytics import YOLO
+
+        batches = calibration_images(calibration_dir or settings.INFERENCE_CALIBRATION_DIR, imgsz) \
+            if int8 else None
+        os.makedirs(str(settings.EXPORTED_MODELS_DIR), exist_ok=True)
+        yolo = YOLO(model_path)
+        print(f"[INFO] Exporting {model_path} to {backend}{' (INT8)' if int8 else ''}...")
+        # Dynamic axes so the batch size can vary (shared batched inference)
+        exported = yolo.export(format=backend, imgsz=imgsz, dynamic=True, verbose=False)
+
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+
+        if backend == "onnx" and int8:
+            _quantize_onnx(exported, target, batches)
+            os.remove(exported)
+        elif backend == "openvino" and int8:
+            _quantize_openvino(exported, target, batches)
+            shutil.rmtree(exported)
+        else:
+            shutil.move(exported, target)
+
+        with open(f"{target}.json", "w") as f:
+            json.dump({
+                "names": {int(k): v for k, v in yolo.names.items()},
+                "imgsz": imgsz,
+                "int8": int8,
+                "source": model_path,
+            }, f)
+        print(f"[✓] Exported model saved to {target}")
+    return target
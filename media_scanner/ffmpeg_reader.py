@@ -0,0 +1,172 @@
+import json
+import subprocess
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+from media_scanner.ffmpeg_writer import FFMPEG_BINARY, read_log
+
+# ─── CONFIG ──────────────────────────────
+FFPROBE_BINARY = "ffprobe"
+DEFAULT_FPS = 25
+# ─────────────────────────────────────────
+
+
+def _feed(proc, open_chunks, stop):
+    """Copy the byte stream into proc's stdin; returns the error that ended it, if any."""
+    try:
+        for chunk in open_chunks(stop):
+            proc.stdin.write(chunk)
+    except (BrokenPipeError, OSError, ValueError):
+        # The process stopped reading (done, failed or killed)
+        return None
+    except Exception as e:
+        return e
+    finally:
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+    return None
+
+
+def _rate(value):
+    try:
+        num, den = value.split("/")
+        return float(num) / float(den) if float(den) else 0.0
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+def probe_stream(open_chunks):
+    """Read a stream's header with ffprobe, consuming only as much as it needs.
+
+    `open_chunks(stop)` must return a fresh iterator over the stream's bytes
+    that ends early once `stop` is set. Returns a dict with width, height,
+    fps and has_audio, or None if ffprobe can't make sense of the stream
+    from a pipe (e.g. an MP4 whose index is at the end of the file).
+    """
+    cmd = [
+        FFPROBE_BINARY, "-v", "error",
+        "-show_entries", "stream=codec_type,width,height,avg_frame_rate,r_frame_rate"
+                         ":stream_tags=rotate:stream_side_data=rotation",
+        "-of", "json", "-i", "pipe:0",
+    ]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    stop = threading.Event()
+    feeder = threading.Thread(target=_feed, args=(proc, open_chunks, stop), daemon=True)
+    feeder.start()
+    try:
+        output = proc.stdout.read()
+        returncode = proc.wait()
+    finally:
+        stop.set()
+    if returncode != 0:
+        return None
+
+    try:
+        streams = json.loads(output or b"{}").get("streams", [])
+    except ValueError:
+        return None
+    video = next((s for s in streams if s.get("codec_type") == "video" and s.get("width")), None)
+    if video is None:
+        return None
+
+    width, height = int(video["width"]), int(video["height"])
+    rotation = video.get("tags", {}).get("rotate", 0)
+    for side_data in video.get("side_data_list", []):
+        rotation = side_data.get("rotation", rotation)
+    # ffmpeg auto-rotates while decoding, so a portrait phone video comes out transposed
+    if abs(int(float(rotation))) % 180 == 90:
+        width, height = height, width
+
+    fps = _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate")) or DEFAULT_FPS
+    return {
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "has_audio": any(s.get("codec_type") == "audio" for s in streams),
+    }
+
+
+class FFmpegReader:
+    """cv2.VideoCapture stand-in that decodes a byte stream piped into ffmpeg.
+
+    Decoding starts as soon as the first bytes arrive, so frames come out
+    while the rest of the stream (e.g. an upload) is still being received.
+    Only read(), get(), isOpened() and release() are provided.
+    """
+
+    def __init__(self, open_chunks, width, height, fps=DEFAULT_FPS):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_size = width * height * 3
+        cmd = [
+            FFMPEG_BINARY, "-loglevel", "error", "-nostats",
+            "-i", "pipe:0", "-map", "0:v:0",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1",
+        ]
+        # stderr to a file so a stream full of decode errors can't fill the pipe and stall ffmpeg
+        self._log = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=self._log)
+        self._released = False
+        self._done = threading.Event()   # tells the feeder to stop waiting for more input
+        self._error = None
+        self._feeder = threading.Thread(target=self._run_feeder, args=(open_chunks,), daemon=True)
+        self._feeder.start()
+
+    def _run_feeder(self, open_chunks):
+        self._error = _feed(self.proc, open_chunks, self._done)
+
+    def isOpened(self):
+        return not self._released
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        # Frame count and anything else is unknown until the stream has ended
+        return 0
+
+    def read(self, image=None):
+        """Next frame, decoded into `image` when it has the frame's size (like cv2.VideoCapture.read)."""
+        frame = image
+        if (frame is None or frame.shape != (self.height, self.width, 3) or frame.dtype != np.uint8
+                or not frame.flags.c_contiguous):
+            frame = np.empty((self.height, self.width, 3), np.uint8)
+        view = memoryview(frame).cast("B")
+        filled = 0
+        while filled < self.frame_size:
+            n = self.proc.stdout.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+        if filled == self.frame_size:
+            return True, frame
+
+        # End of stream: make sure it ended because the input did, not because it failed
+        self._done.set()
+        self._feeder.join()
+        if self._error is not None:
+            raise RuntimeError(f"Input stream failed: {self._error}")
+        if self.proc.wait() != 0 and not self._released:
+            raise RuntimeError(f"ffmpeg failed to decode the stream: "
+                               f"{read_log(self._log)}")
+        return False, None
+
+    def release(self):
+        self._released = True
+        self._done.set()
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        self.proc.stdout.close()
+        self._log.close()
@@ -0,0 +1,200 @@
+import contextlib
+import glob
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+
+# ─── CONFIG ──────────────────────────────
+FFMPEG_BINARY = "ffmpeg"
+DEFAULT_PROFILE = "vp9"
+SEGMENT_SECONDS = 2        # length of one HLS / DASH segment (and keyframe interval)
+# ─────────────────────────────────────────
+
+# Encoder profiles: output extension, video codec args, audio codec args and
+# container (muxer) args.
+# Audio is re-encoded (cheap) to a codec the container can hold: WebM only
+# takes Opus/Vorbis and MP4 can't hold e.g. the PCM of an AVI or the Vorbis
+# of an MKV, so the H.264 profiles use AAC.
+# The HLS and DASH profiles are progressive: ffmpeg writes fragmented MP4
+# segments next to the playlist as it encodes and keeps the playlist up to
+# date, so the beginning can be played before the rest is processed.
+# "{stem}" / "{dir}" in their container args stand for the playlist's name
+# without extension and its directory; segments are named "<stem>.<...>".
+PROFILES = {
+    "vp9": {
+        "ext": ".webm",
+        "video": [
+            "-c:v", "libvpx-vp9", "-b:v", "1M",
+            "-deadline", "realtime", "-cpu-used", "5", "-row-mt", "1",
+        ],
+        "audio": ["-c:a", "libopus"],
+        "container": [],
+    },
+    "h264": {
+        "ext": ".mp4",
+        "video": [
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+        ],
+        "audio": ["-c:a", "aac"],
+        "container": ["-movflags", "+faststart"],
+    },
+    "hls": {
+        "ext": ".m3u8",
+        "video": [
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+            "-force_key_frames", f"expr:gte(t,n_forced*{SEGMENT_SECONDS})",
+        ],
+        "audio": ["-c:a", "aac"],
+        "container": [
+            "-f", "hls", "-hls_time", str(SEGMENT_SECONDS), "-hls_playlist_type", "event",
+            "-hls_segment_type", "fmp4", "-hls_flags", "independent_segments+temp_file",
+            "-hls_fmp4_init_filename", "{stem}.init.mp4",
+            "-hls_segment_filename", "{dir}/{stem}.%05d.m4s",
+        ],
+        "segmented": True,
+    },
+    "dash": {
+        "ext": ".mpd",
+        "video": [
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+            "-force_key_frames", f"expr:gte(t,n_forced*{SEGMENT_SECONDS})",
+        ],
+        "audio": ["-c:a", "aac"],
+        "container": [
+            "-f", "dash", "-seg_duration", str(SEGMENT_SECONDS), "-streaming", "1",
+            "-use_template", "1", "-use_timeline", "1",
+            "-init_seg_name", "{stem}.init-$RepresentationID$.m4s",
+            "-media_seg_name", "{stem}.$RepresentationID$-$Number%05d$.m4s",
+        ],
+        "segmented": True,
+    },
+}
+
+
+def get_profile(name):
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown encoder profile '{name}', expected one of {sorted(PROFILES)}")
+
+
+def is_segmented(name):
+    return get_profile(name).get("segmented", False)
+
+
+def container_args(profile, output_path):
+    stem = os.path.splitext(os.path.basename(output_path))[0]
+    directory = os.path.dirname(os.path.abspath(output_path))
+    return [arg.replace("{stem}", stem).replace("{dir}", directory) for arg in profile["container"]]
+
+
+def output_files(output_path):
+    """Every file an encode to `output_path` wrote: the file itself plus, for a playlist, its segments."""
+    files = [output_path] if os.path.exists(output_path) else []
+    root, ext = os.path.splitext(output_path)
+    if any(p.get("segmented") and p["ext"] == ext for p in PROFILES.values()):
+        files += sorted(f for f in glob.glob(glob.escape(root) + ".*") if f != output_path)
+    return files
+
+
+def remove_output(output_path):
+    for path in output_files(output_path):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def read_log(log):
+    """Contents of an ffmpeg stderr temp file (see FFmpegWriter)."""
+    log.seek(0)
+    return log.read().decode("utf-8", "replace").strip()
+
+
+class FFmpegWriter:
+    """Drop-in replacement for cv2.VideoWriter that pipes raw BGR frames into ffmpeg.
+
+    Frames are encoded once, straight into the final container. When
+    `audio_source` is given, its first audio track (if any) is muxed in.
+    """
+
+    def __init__(self, output_path, width, height, fps, audio_source=None, profile=DEFAULT_PROFILE):
+        profile = get_profile(profile)
+
+        cmd = [
+            FFMPEG_BINARY, "-y", "-loglevel", "error", "-nostats",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "pipe:0",
+        ]
+        if audio_source:
+            cmd += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?"]
+        # yuv420p needs even dimensions
+        cmd += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p"]
+        cmd += profile["video"]
+        if audio_source:
+            cmd += profile["audio"] + ["-shortest"]
+        cmd += container_args(profile, output_path)
+        cmd.append(output_path)
+
+        self.output_path = output_path
+        self.frame_count = 0
+        # stderr goes to a file, not a pipe: nothing reads it until ffmpeg has
+        # exited, and a full pipe would block ffmpeg (and so write()) mid-encode
+        self._log = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self._log)
+
+    def write(self, frame):
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self.proc.wait()
+            raise RuntimeError(f"ffmpeg exited early: {self._stderr()}")
+        self.frame_count += 1
+
+    def release(self):
+        if self.proc.stdin and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        try:
+            if self.proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed on {self.output_path}: {self._stderr()}")
+        finally:
+            self._log.close()
+
+    def abort(self):
+        """Stop encoding and discard the partial output."""
+        self.proc.kill()
+        self.proc.wait()
+        self._log.close()
+        remove_output(self.output_path)
+
+    def _stderr(self):
+        return read_log(self._log)
+
+
+def mux_audio(video_path, audio_source, profile=DEFAULT_PROFILE):
+    """Add the first audio track of `audio_source` (if any) to an encoded video.
+
+    The video stream is copied and only the audio re-encoded, so this costs
+    little more than reading both files.
+    No -shortest: with a stream-copied video it drops the last seconds of frames.
+    """
+    profile = get_profile(profile)
+    root, ext = os.path.splitext(video_path)
+    muxed_path = f"{root}.mux{ext}"
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error", "-nostats",
+        "-i", video_path, "-i", audio_source,
+        "-map", "0:v:0", "-map", "1:a:0?", "-c:v", "copy",
+    ] + profile["audio"] + profile["container"] + [muxed_path]
+
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        if os.path.exists(muxed_path):
+            os.remove(muxed_path)
+        raise RuntimeError(f"ffmpeg failed to mux audio into {video_path}: "
+                           f"{proc.stderr.decode('utf-8', 'replace').strip()}")
+    os.replace(muxed_path, video_path)
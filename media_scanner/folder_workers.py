@@ -0,0 +1,105 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+from media_scanner.manifest import DONE, FAILED, file_digest
+from media_scanner.model_registry import get_model
+from media_scanner.redaction import detections_from_result, render_detections
+
+# Set once per worker process by init_worker
+_model = None
+_options = None
+
+
+def init_worker(model_path, backend, threads, options):
+    """Pool initializer: give this process its own model, limited to `threads` threads.
+
+    `options` holds output_dir, conf, blur, style and save.
+    """
+    global _model, _options
+    cv2.setNumThreads(threads)
+    _model = get_model(model_path, backend=backend, threads=threads)
+    _options = options
+
+
+def output_path(path, options):
+    return os.path.join(options["output_dir"], os.path.basename(path))
+
+
+def _row(path, stat, digest, status, output=None, error=None, unchanged=False):
+    return {
+        "path": path,
+        "size": stat.st_size if stat else None,
+        "mtime_ns": stat.st_mtime_ns if stat else None,
+        "hash": digest,
+        "status": status,
+        "output": output,
+        "error": error,
+        "unchanged": unchanged,
+    }
+
+
+def _add(stage_stats, stage, start, count=1):
+    stage_stats[stage][0] += count
+    stage_stats[stage][1] += time.perf_counter() - start
+
+
+def process_batch(items):
+    """Hash, decode, detect, blur and write a batch of (path, previous hash) items.
+
+    Returns (rows, stage_stats): one manifest row per item, and per stage
+    (read + hash + decode, infer, blur, write) the number of images and the
+    seconds spent on them. A file whose content hash matches its previous
+    hash is not processed again. Errors are reported per file and never stop
+    the pool.
+    """
+    stage_stats = {"decode": [0, 0.0], "infer": [0, 0.0], "blur": [0, 0.0], "write": [0, 0.0]}
+    rows, batch = [], []
+    for path, previous_hash in items:
+        start = time.perf_counter()
+        try:
+            stat = os.stat(path)
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            rows.append(_row(path, None, None, FAILED, error=str(e)))
+            continue
+
+        digest = file_digest(data)
+        output = output_path(path, _options) if _options["save"] else None
+        if digest == previous_hash:
+            rows.append(_row(path, stat, digest, DONE, output, unchanged=True))
+            continue
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        _add(stage_stats, "decode", start)
+        if img is None:
+            rows.append(_row(path, stat, digest, FAILED, error="Unreadable image"))
+            continue
+        batch.append((path, stat, digest, img, output))
+
+    if not batch:
+        return rows, stage_stats
+    start = time.perf_counter()
+    try:
+        results = _model([img for _, _, _, img, _ in batch], verbose=False)
+    except Exception as e:
+        failed = [_row(path, stat, digest, FAILED, error=str(e)) for path, stat, digest, _, _ in batch]
+        return rows + failed, stage_stats
+    _add(stage_stats, "infer", start, len(batch))
+
+    for (path, stat, digest, img, output), result in zip(batch, results):
+        start = time.perf_counter()
+        dets = detections_from_result(result, _options["conf"])
+        img = render_detections(img, dets, result.names, blur=_options["blur"], style=_options["style"])
+        _add(stage_stats, "blur", start)
+        if output is not None:
+            start = time.perf_counter()
+            written = cv2.imwrite(output, img)
+            _add(stage_stats, "write", start)
+            if not written:
+                rows.append(_row(path, stat, digest, FAILED, error=f"Could not write {output}"))
+                continue
+        rows.append(_row(path, stat, digest, DONE, output))
+    return rows, stage_stats
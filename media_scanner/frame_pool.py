@@ -0,0 +1,95 @@
+import queue
+import threading
+
+import numpy as np
+
+
+class FramePool:
+    """A fixed set of preallocated frame buffers, reused by a frame loop.
+
+    acquire() hands out a free buffer, allocating up to `size` of them on
+    first use, and blocks while all are in use; release() gives one back once
+    its frame was written or sent. `size` must cover every frame in flight
+    (queued between stages plus one per stage). The pool resizes itself when
+    the frame shape changes; buffers of the old shape are dropped on release.
+    """
+
+    def __init__(self, size, shape=None, dtype=np.uint8):
+        self.size = max(1, size)
+        self.shape = tuple(shape) if shape is not None else None
+        self.dtype = dtype
+        self._buffers = []
+        self._free = queue.SimpleQueue()
+        self._lock = threading.Lock()
+
+    @property
+    def allocated(self):
+        return len(self._buffers)
+
+    def _reset(self, shape):
+        self.shape = tuple(shape)
+        self._buffers = []
+        self._free = queue.SimpleQueue()
+
+    def resize(self, shape):
+        with self._lock:
+            if tuple(shape) != self.shape:
+                self._reset(shape)
+
+    def acquire(self, shape=None, timeout=None):
+        """A free buffer of `shape` (default: the pool's); raises queue.Empty after `timeout`."""
+        with self._lock:
+            if shape is not None and tuple(shape) != self.shape:
+                self._reset(shape)
+            if self.shape is None:
+                raise ValueError("FramePool needs a frame shape")
+            free = self._free
+            try:
+                return free.get_nowait()
+            except queue.Empty:
+                pass
+            if len(self._buffers) < self.size:
+                buf = np.empty(self.shape, self.dtype)
+                self._buffers.append(buf)
+                return buf
+        return free.get(timeout=timeout)
+
+    def release(self, buf):
+        """Return a buffer; arrays that aren't (or are no longer) from the pool are ignored."""
+        if buf is None:
+            return
+        with self._lock:
+            if any(b is buf for b in self._buffers):
+                self._free.put(buf)
+
+    def copy(self, frame, timeout=None):
+        """`frame` copied into a pool buffer (the frame.copy() of a loop that reuses memory)."""
+        buf = self.acquire(frame.shape, timeout)
+        np.copyto(buf, frame)
+        return buf
+
+
+def read_into(cap, pool, stop=None):
+    """cap.read() decoding straight into a free buffer of `pool`; returns (ret, frame).
+
+    Without a known shape the capture allocates the first frame and sizes
+    the pool. A frame the capture had to allocate itself (its size changed)
+    is returned as is and resizes the pool for the next read. With `stop`
+    (a threading.Event) waiting for a free buffer gives up once it is set,
+    returning (False, None).
+    """
+    buf = None
+    if pool.shape is not None:
+        while buf is None:
+            if stop is not None and stop.is_set():
+                return False, None
+            try:
+                buf = pool.acquire(timeout=0.1)
+            except queue.Empty:
+                continue
+    ret, frame = cap.read(buf)
+    if frame is not buf:
+        pool.release(buf)
+        if ret and frame is not None:
+            pool.resize(frame.shape)
+    return ret, frame
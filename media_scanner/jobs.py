@@ -0,0 +1,214 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+
+from django.db import close_old_connections
+
+from media_scanner.metrics import QUEUE_DEPTH
+from mediascanner import settings
+
+# ─── CONFIG ──────────────────────────────
+PRIORITY_HIGH = 0      # quick jobs (images)
+PRIORITY_NORMAL = 10   # long jobs (videos)
+JOB_TTL = 60 * 60      # seconds a finished job stays queryable
+# ─────────────────────────────────────────
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, fn, args, kind, priority, on_cancel=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.priority = priority
+        self.status = QUEUED
+        self.frames_done = 0
+        self.frames_total = 0
+        self.result = None
+        self.error = None
+        self.timings = {}   # stage -> seconds, filled in by job functions that time their stages
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._fn = fn
+        self._args = args
+        self._on_cancel = on_cancel
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def update_progress(self, frames_done, frames_total=None):
+        """Called by the job function; raises JobCancelled once cancel() was requested."""
+        self.frames_done = frames_done
+        if frames_total is not None:
+            self.frames_total = frames_total
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def eta(self):
+        if self.status != RUNNING or not self.frames_done or not self.frames_total:
+            return None
+        elapsed = time.time() - self.started_at
+        remaining = max(self.frames_total - self.frames_done, 0)
+        return remaining * elapsed / self.frames_done
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "frames_done": self.frames_done,
+            "frames_total": self.frames_total,
+            "eta_seconds": self.eta(),
+            "error": self.error,
+        }
+
+    def _run(self):
+        if self._cancel.is_set():
+            self._skip()
+            return
+        self.status = RUNNING
+        self.started_at = time.time()
+        try:
+            self.result = self._fn(self, *self._args)
+        except JobCancelled:
+            self._finish(CANCELLED)
+        except Exception as e:
+            self.error = str(e)
+            self._finish(FAILED)
+        else:
+            self._finish(DONE)
+
+    def _skip(self):
+        """Finish a job cancelled before it started, running its on_cancel cleanup."""
+        try:
+            if self._on_cancel is not None:
+                self._on_cancel(self, *self._args)
+        except Exception as e:
+            self.error = str(e)
+        self._finish(CANCELLED)
+
+    def _finish(self, status):
+        self.status = status
+        self.finished_at = time.time()
+        self._done.set()
+
+
+class JobQueue:
+    """In-process priority job queue backed by a pool of worker threads.
+
+    `express_workers` of the workers only take PRIORITY_HIGH jobs, so quick
+    image jobs never wait behind long-running videos.
+    """
+
+    def __init__(self, workers=2, express_workers=1):
+        self.workers = max(workers, express_workers + 1)
+        self.express_workers = express_workers
+        self._heap = []
+        self._jobs = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def submit(self, fn, *args, kind="job", priority=PRIORITY_NORMAL, on_cancel=None):
+        """Queue `fn(job, *args)` and return the Job right away.
+
+        If the job is cancelled before a worker starts it, `on_cancel(job, *args)`
+        is called instead, to release whatever was set up for it.
+        """
+        job = Job(fn, args, kind, priority, on_cancel)
+        with self._cond:
+            self._prune()
+            self._start_workers()
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (priority, next(self._seq), job))
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel()
+        with self._cond:
+            # Queued jobs are finished right away instead of waiting for a worker
+            queued = any(entry[2] is job for entry in self._heap)
+            if queued:
+                self._heap = [entry for entry in self._heap if entry[2] is not job]
+                heapq.heapify(self._heap)
+        if queued:
+            job._skip()
+        return job
+
+    def depth(self):
+        with self._cond:
+            return len(self._heap)
+
+    def _start_workers(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            express = i < self.express_workers
+            thread = threading.Thread(target=self._work, args=(express,),
+                                      name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_job(self, express):
+        with self._cond:
+            while not self._heap or (express and self._heap[0][0] > PRIORITY_HIGH):
+                self._cond.wait()
+            return heapq.heappop(self._heap)[2]
+
+    def _work(self, express):
+        while True:
+            job = self._next_job(express)
+            # Like a request: drop database connections that went stale or broke
+            close_old_connections()
+            try:
+                job._run()
+            finally:
+                close_old_connections()
+
+    def _prune(self):
+        cutoff = time.time() - JOB_TTL
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(workers=settings.JOB_WORKERS,
+                              express_workers=settings.JOB_EXPRESS_WORKERS)
+            QUEUE_DEPTH.set_function(_queue.depth, queue="jobs")
+        return _queue
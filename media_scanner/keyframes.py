@@ -0,0 +1,137 @@
+import cv2
+import numpy as np
+
+from media_scanner.motion import MotionGate
+from mediascanner import settings
+
+# ─── CONFIG ──────────────────────────────
+MIN_INTERVAL = 1           # frames between detector runs when boxes move fast
+MAX_INTERVAL = 8           # frames between detector runs on a slow/static scene
+MOTION_BUDGET = 0.25       # how far (in box sizes) a box may drift before re-detecting
+SCENE_CHANGE = 30.0        # mean abs grey-level difference that forces a re-detect
+TRACK_MARGIN = 0.1         # padding (fraction of box size) around propagated boxes
+FLOW_WIDTH = 320           # optical flow runs on frames downscaled to this width
+MAX_CORNERS = 20           # feature points tracked per box
+# ─────────────────────────────────────────
+
+_LK_PARAMS = dict(winSize=(15, 15), maxLevel=2,
+                  criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+
+class KeyframeDetector:
+    """Run `detect(frame)` on keyframes only and propagate boxes in between.
+
+    Between keyframes each box is moved by the median Lucas-Kanade flow of
+    feature points inside it and padded by a safety margin. A keyframe is
+    forced after a scene change, and the keyframe interval adapts to how fast
+    boxes move: fast motion shortens it, a static scene stretches it to
+    `max_interval`. Frames must be fed in order.
+    """
+
+    def __init__(self, detect, max_interval=MAX_INTERVAL, min_interval=MIN_INTERVAL):
+        self.detect = detect
+        self.max_interval = max(1, max_interval)
+        self.min_interval = max(1, min(min_interval, self.max_interval))
+        self.interval = self.min_interval
+        self.frames = 0
+        self.keyframes = 0
+        self._since_key = 0
+        self._key_grey = None
+        self._prev_grey = None
+        self._dets = np.empty((0, 6), np.float32)
+        self._scale = 1.0
+
+    def __call__(self, frame):
+        grey = self._small_grey(frame)
+        self.frames += 1
+
+        if (self._prev_grey is None or self._since_key >= self.interval
+                or self._scene_changed(grey)):
+            # A copy: boxes are shifted in place between keyframes
+            self._dets = np.array(self.detect(frame), np.float32).reshape(-1, 6)
+            self._key_grey = grey
+            self._since_key = 0
+            self.keyframes += 1
+            # Callers may hold on to it (e.g. a seam buffer) while later frames shift self._dets
+            dets = self._dets.copy()
+        else:
+            self._since_key += 1
+            speed = self._propagate(grey)
+            self._adapt_interval(speed)
+            dets = self._padded(frame.shape[1], frame.shape[0])
+
+        self._prev_grey = grey
+        return dets
+
+    def _small_grey(self, frame):
+        h, w = frame.shape[:2]
+        self._scale = min(1.0, FLOW_WIDTH / w)
+        grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self._scale < 1.0:
+            grey = cv2.resize(grey, (round(w * self._scale), round(h * self._scale)),
+                              interpolation=cv2.INTER_AREA)
+        return grey
+
+    def _scene_changed(self, grey):
+        return float(cv2.absdiff(grey, self._key_grey).mean()) > SCENE_CHANGE
+
+    def _propagate(self, grey):
+        """Shift every box by its median flow; return the largest move in box sizes."""
+        speed = 0.0
+        s = self._scale
+        for det in self._dets:
+            x1, y1, x2, y2 = (det[:4] * s).astype(int)
+            mask = np.zeros_like(self._prev_grey)
+            mask[max(y1, 0):max(y2, 0), max(x1, 0):max(x2, 0)] = 255
+            points = cv2.goodFeaturesToTrack(self._prev_grey, MAX_CORNERS, 0.01, 3, mask=mask)
+            if points is None:
+                continue
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_grey, grey, points, None, **_LK_PARAMS)
+            ok = status.ravel() == 1
+            if not ok.any():
+                continue
+            dx, dy = np.median((moved[ok] - points[ok]).reshape(-1, 2), axis=0) / s
+            det[[0, 2]] += dx
+            det[[1, 3]] += dy
+            size = max(det[2] - det[0], det[3] - det[1], 1.0)
+            speed = max(speed, float(np.hypot(dx, dy)) / size)
+        return speed
+
+    def _adapt_interval(self, speed):
+        if speed <= 0:
+            self.interval = min(self.interval + 1, self.max_interval)
+            return
+        target = int(MOTION_BUDGET / speed)
+        self.interval = int(np.clip(target, self.min_interval, self.max_interval))
+
+    def _padded(self, width, height):
+        dets = self._dets.copy()
+        if len(dets) == 0:
+            return dets
+        grow = TRACK_MARGIN * (1 + self._since_key / self.max_interval)
+        pad_x = (dets[:, 2] - dets[:, 0]) * grow
+        pad_y = (dets[:, 3] - dets[:, 1]) * grow
+        dets[:, 0] = np.clip(dets[:, 0] - pad_x, 0, width)
+        dets[:, 1] = np.clip(dets[:, 1] - pad_y, 0, height)
+        dets[:, 2] = np.clip(dets[:, 2] + pad_x, 0, width)
+        dets[:, 3] = np.clip(dets[:, 3] + pad_y, 0, height)
+        return dets
+
+
+def detector_chain(detect, max_interval=None, metrics_path=None):
+    """Wrap `detect(frame)` in the motion gate and keyframe detector configured in settings.
+
+    Returns (find, keyframes, gate); `keyframes` is None when
+    KEYFRAME_MAX_INTERVAL (or `max_interval`) is 1, `gate` when MOTION_GATE is off.
+    """
+    if max_interval is None:
+        max_interval = settings.KEYFRAME_MAX_INTERVAL
+    find, keyframes, gate = detect, None, None
+    if settings.MOTION_GATE:
+        # Wraps the detector itself; on a static scene keyframes come every max_interval frames
+        find = gate = MotionGate(find, settings.MOTION_THRESHOLD,
+                                 max(1, settings.MOTION_MAX_INTERVAL // max(max_interval, 1)),
+                                 metrics_path=metrics_path)
+    if max_interval > 1:
+        keyframes = find = KeyframeDetector(find, max_interval=max_interval)
+    return find, keyframes, gate
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from media_scanner.export import export_model
+from mediascanner import settings
+
+
+class Command(BaseCommand):
+    help = "Export the detection model for the ONNX Runtime or OpenVINO backend and cache it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=["onnx", "openvino"],
+                            default=settings.INFERENCE_BACKEND if settings.INFERENCE_BACKEND != "torch" else "onnx")
+        parser.add_argument("--model", default=None, help="weights to convert (default: MODEL_PATH)")
+        parser.add_argument("--int8", action="store_true", default=settings.INFERENCE_INT8,
+                            help="quantize to INT8 using a calibration set")
+        parser.add_argument("--calibration", default=None,
+                            help="directory of calibration images (default: INFERENCE_CALIBRATION_DIR)")
+        parser.add_argument("--force", action="store_true", help="re-export even if a cached copy exists")
+
+    def handle(self, *args, **options):
+        try:
+            path = export_model(options["backend"], options["model"], int8=options["int8"],
+                                calibration_dir=options["calibration"], force=options["force"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"[✓] {options['backend']} model ready: {path}")
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+def file_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class Manifest:
+    """On-disk record of the files a folder run has seen: path, size, mtime, content hash and status.
+
+    A rerun skips files that were processed and haven't changed since, so an
+    interrupted run picks up where it stopped and a rescan only processes new
+    or modified files. A file whose size or mtime changed is handed back with
+    its previous hash, so a worker can still skip it when the content is the
+    same. `version` identifies the settings that produced the outputs (model,
+    threshold, style); when it changes every file is processed again.
+
+    Backed by SQLite; only one process (the folder-mode parent) writes to it.
+    """
+
+    def __init__(self, path, version=""):
+        self.path = path
+        self.version = version
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT,"
+            " status TEXT, output TEXT, error TEXT, version TEXT, updated_at REAL)"
+        )
+        self.db.commit()
+
+    def plan(self, paths):
+        """Split `paths` into (todo, skipped): `todo` holds (path, previous hash or None) pairs."""
+        known = {row[0]: row[1:] for row in self.db.execute(
+            "SELECT path, size, mtime_ns, hash, status, output, version FROM files")}
+        todo, skipped = [], 0
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = known.get(path)
+            if entry is not None:
+                size, mtime_ns, digest, status, output, version = entry
+                if status == DONE and version == self.version and (not output or os.path.exists(output)):
+                    if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+                        skipped += 1
+                        continue
+                    todo.append((path, digest))
+                    continue
+            todo.append((path, None))
+        return todo, skipped
+
+    def record(self, rows):
+        """Store worker results: dicts with path, size, mtime_ns, hash, status, output and error."""
+        now = time.time()
+        self.db.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(row["path"], row["size"], row["mtime_ns"], row["hash"], row["status"],
+              row["output"], row["error"], self.version, now) for row in rows],
+        )
+        self.db.commit()
+
+    def counts(self):
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM files GROUP BY status"))
+
+    def close(self):
+        self.db.close()
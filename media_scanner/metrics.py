@@ -0,0 +1,255 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ─── CONFIG ──────────────────────────────
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DETECTION_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+FPS_WINDOW = 10.0        # seconds of recent frames the fps gauge averages over
+# ─────────────────────────────────────────
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A named metric with a fixed set of label names, rendered in the Prometheus text format."""
+
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, label pairs, value) for every series."""
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield "", list(zip(self.labelnames, key)), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, pairs, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(pairs)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; `set_function` makes a series read its value at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        for key, value in sorted(values.items()):
+            yield "", list(zip(self.labelnames, key)), value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield "_bucket", pairs + [("le", _format_value(float(bound)))], cumulative
+            yield "_sum", pairs, total
+            yield "_count", pairs, count
+
+
+class _FrameRate:
+    """Frames per second per path over the last FPS_WINDOW seconds."""
+
+    def __init__(self):
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def add(self, path, count=1):
+        now = time.monotonic()
+        with self._lock:
+            frames = self._frames.setdefault(path, deque())
+            frames.append((now, count))
+            self._prune(frames, now - FPS_WINDOW)
+
+    def rates(self):
+        cutoff = time.monotonic() - FPS_WINDOW
+        with self._lock:
+            rates = {}
+            for path, frames in self._frames.items():
+                self._prune(frames, cutoff)
+                rates[path] = sum(count for _, count in frames) / FPS_WINDOW
+            return rates
+
+    @staticmethod
+    def _prune(frames, cutoff):
+        while frames and frames[0][0] < cutoff:
+            frames.popleft()
+
+
+STAGE_SECONDS = Histogram("securevision_stage_seconds",
+                          "Time spent in one processing stage (decode, infer, blur, encode, transcode, ...)",
+                          ("path", "stage"))
+FRAMES = Counter("securevision_frames_total", "Frames or images processed", ("path",))
+FPS = Gauge("securevision_fps", f"Frames processed per second over the last {FPS_WINDOW:g}s", ("path",))
+DETECTIONS = Histogram("securevision_detections_per_frame", "Detections above the confidence threshold per frame",
+                       ("path",), buckets=DETECTION_BUCKETS)
+QUEUE_DEPTH = Gauge("securevision_queue_depth", "Items waiting in an internal queue", ("queue",))
+WEBSOCKET_SESSIONS = Gauge("securevision_websocket_sessions", "Open livestream websocket connections")
+
+_frame_rate = _FrameRate()
+
+
+def _render_fps():
+    for path, rate in _frame_rate.rates().items():
+        FPS.set(round(rate, 3), path=path)
+
+
+def observe_stage(path, stage, seconds, timings=None):
+    """Record one stage duration; also added to the `timings` dict (stage -> seconds) when given."""
+    STAGE_SECONDS.observe(seconds, path=path, stage=stage)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(path, stage, timings=None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(path, stage, time.perf_counter() - start, timings)
+
+
+def record_frames(path, count=1):
+    FRAMES.inc(count, path=path)
+    _frame_rate.add(path, count)
+
+
+def record_detections(path, count):
+    """Number of detections in one frame that went through the detector."""
+    DETECTIONS.observe(count, path=path)
+
+
+def render():
+    _render_fps()
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(timings):
+    """A Server-Timing header value from a stage -> seconds dict."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="0.0.0.0"):
+    """Serve /metrics on `port` from a background thread, for processes without the Django server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"[INFO] Metrics available at http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media_scanner', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('image', 'Image'), ('video', 'Video')], max_length=10)),
+                ('name', models.CharField(max_length=255)),
+                ('source', models.CharField(max_length=500)),
+                ('output', models.CharField(blank=True, max_length=255)),
+                ('fps', models.FloatField(default=0)),
+                ('frame_count', models.PositiveIntegerField(default=0)),
+                ('model_version', models.CharField(blank=True, max_length=500)),
+                ('conf_threshold', models.FloatField()),
+                ('class_names', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Detection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frame', models.PositiveIntegerField(default=0)),
+                ('cls', models.PositiveSmallIntegerField()),
+                ('confidence', models.FloatField()),
+                ('x1', models.FloatField()),
+                ('y1', models.FloatField()),
+                ('x2', models.FloatField()),
+                ('y2', models.FloatField()),
+                ('media', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detections', to='media_scanner.mediaitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['media', 'frame'], name='detection_media_frame')],
+            },
+        ),
+    ]
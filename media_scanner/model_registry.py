@@ -0,0 +1,97 @@
+import os
+import threading
+
+import numpy as np
+
+from media_scanner.backends import get_backend
+from mediascanner import settings
+
+# ─── CONFIG ──────────────────────────────
+WARMUP_SIZE = 640  # square frame used for the warm-up inference
+# ─────────────────────────────────────────
+
+_models = {}
+_lock = threading.Lock()
+
+
+class SharedModel:
+    """One loaded model shared by every caller in the process.
+
+    Predictors are not guaranteed to be thread-safe, so calls are serialised
+    with a per-model lock; attribute access (e.g. `names`) goes to the
+    wrapped backend.
+    """
+
+    def __init__(self, model, path, device):
+        self.model = model
+        self.path = path
+        self.device = device
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            results = self.model(*args, **kwargs)
+            if kwargs.get("stream"):
+                results = list(results)
+        return results
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def get_model(model_path=None, warmup=None, backend=None, threads=None):
+    """Return the model at `model_path` (default settings.MODEL_PATH), loading it on first use.
+
+    `backend` (default settings.INFERENCE_BACKEND) is "torch", "onnx" or
+    "openvino"; the latter two run a converted copy of the weights, which is
+    exported (and cached) on first use if `manage.py export_model` hasn't
+    been run. `threads` (default settings.INFERENCE_THREADS) applies when the
+    model is first loaded. Inference libraries are only imported here, so processes that
+    never run inference (e.g. `manage.py migrate`) don't pay for them.
+    """
+    path = os.path.abspath(model_path or settings.MODEL_PATH)
+    backend = backend or settings.INFERENCE_BACKEND
+    if warmup is None:
+        warmup = settings.MODEL_WARMUP
+    if threads is None:
+        threads = settings.INFERENCE_THREADS
+
+    with _lock:
+        shared = _models.get((path, backend))
+        if shared is None:
+            backend_cls = get_backend(backend)
+            source = path
+            if backend != "torch":
+                from media_scanner.export import export_model
+
+                source = export_model(backend, path, int8=settings.INFERENCE_INT8)
+            model = backend_cls(source, threads=threads)
+            print(f"[INFO] Loading {backend} model on: {model.device.upper()}")
+            shared = SharedModel(model, source, model.device)
+            if warmup:
+                shared(np.zeros((WARMUP_SIZE, WARMUP_SIZE, 3), np.uint8), verbose=False)
+            _models[(path, backend)] = shared
+    return shared
+
+
+def weights_version(model_path=None):
+    """Cheap identifier of the weights at `model_path`: changes whenever the file does."""
+    path = os.path.abspath(model_path or settings.MODEL_PATH)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return path
+    return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def model_version(model_path=None, backend=None):
+    """Identifies what produced a detection: the weights plus the backend that ran them."""
+    backend = backend or settings.INFERENCE_BACKEND
+    if backend != "torch" and settings.INFERENCE_INT8:
+        backend += "-int8"
+    return f"{weights_version(model_path)}:{backend}"
+
+
+def loaded_models():
+    with _lock:
+        return [f"{path} ({backend})" for path, backend in _models]
@@ -5,3 +5,47 @@ class UploadedImage(models.Model):
     image = models.ImageField(upload_to='uploads/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+
+class MediaItem(models.Model):
+    """One processed upload. The original is kept so it can be re-rendered from its stored detections."""
+
+    IMAGE = "image"
+    VIDEO = "video"
+    KIND_CHOICES = [(IMAGE, "Image"), (VIDEO, "Video")]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    name = models.CharField(max_length=255)
+    source = models.CharField(max_length=500)            # original file in ORIGINALS_ROOT
+    output = models.CharField(max_length=255, blank=True)  # latest render in MEDIA_ROOT/blurred
+    fps = models.FloatField(default=0)                   # videos only
+    frame_count = models.PositiveIntegerField(default=0)
+    model_version = models.CharField(max_length=500, blank=True)
+    conf_threshold = models.FloatField()
+    class_names = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "name": self.name,
+            "output": self.output,
+            "frame_count": self.frame_count,
+            "fps": self.fps,
+            "conf_threshold": self.conf_threshold,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+class Detection(models.Model):
+    media = models.ForeignKey(MediaItem, on_delete=models.CASCADE, related_name="detections")
+    frame = models.PositiveIntegerField(default=0)
+    cls = models.PositiveSmallIntegerField()
+    confidence = models.FloatField()
+    x1 = models.FloatField()
+    y1 = models.FloatField()
+    x2 = models.FloatField()
+    y2 = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=["media", "frame"], name="detection_media_frame")]
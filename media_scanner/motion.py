@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+
+from media_scanner.metrics import Counter
+
+# ─── CONFIG ──────────────────────────────
+THUMB_WIDTH = 160          # frames are compared at this width
+PIXEL_DELTA = 12           # grey-level difference that counts a thumbnail pixel as changed
+CHANGED_FRACTION = 0.002   # share of changed pixels above which the detector runs again
+MAX_INTERVAL = 30          # frames a result may be reused before the detector runs regardless
+# ─────────────────────────────────────────
+
+INFERENCE_RUNS = Counter("securevision_inference_runs_total",
+                         "Detector calls that went through the motion gate", ("path",))
+INFERENCE_SKIPPED = Counter("securevision_inference_skipped_total",
+                            "Detector calls saved by reusing the last result on an unchanged frame", ("path",))
+
+
+def thumbnail(frame, width=THUMB_WIDTH):
+    """Small blurred greyscale copy of `frame`; the blur keeps sensor noise from counting as change."""
+    h, w = frame.shape[:2]
+    scale = min(1.0, width / w)
+    grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    if scale < 1.0:
+        grey = cv2.resize(grey, (max(round(w * scale), 1), max(round(h * scale), 1)),
+                          interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(grey, (5, 5), 0)
+
+
+class MotionGate:
+    """Call `detect(frame)` only when the frame changed since the last call that ran it.
+
+    Each frame's thumbnail is compared with the one of the last detected
+    frame (not the previous frame, so slow drift still adds up); if fewer
+    than `threshold` of its pixels changed by more than PIXEL_DELTA, the
+    last result is returned again. The detector runs at least every
+    `max_interval` frames, and whenever the frame size changes. Frames must
+    be fed in order.
+    """
+
+    def __init__(self, detect, threshold=CHANGED_FRACTION, max_interval=MAX_INTERVAL, metrics_path=None):
+        self.detect = detect
+        self.threshold = threshold
+        self.max_interval = max(1, max_interval)
+        self.metrics_path = metrics_path
+        self.frames = 0
+        self.skipped = 0
+        self._reference = None
+        self._result = None
+        self._since_detect = 0
+
+    def __call__(self, frame):
+        thumb = thumbnail(frame)
+        self.frames += 1
+        if self._unchanged(thumb):
+            self._since_detect += 1
+            self.skipped += 1
+            if self.metrics_path:
+                INFERENCE_SKIPPED.inc(path=self.metrics_path)
+            return self._result
+
+        self._result = self.detect(frame)
+        self._reference = thumb
+        self._since_detect = 0
+        if self.metrics_path:
+            INFERENCE_RUNS.inc(path=self.metrics_path)
+        return self._result
+
+    def _unchanged(self, thumb):
+        if self._reference is None or self._since_detect + 1 >= self.max_interval:
+            return False
+        if thumb.shape != self._reference.shape:
+            return False
+        changed = cv2.absdiff(thumb, self._reference) > PIXEL_DELTA
+        return float(np.count_nonzero(changed)) / changed.size <= self.threshold
+
+    def to_dict(self):
+        return {
+            "frames": self.frames,
+            "inference_skipped": self.skipped,
+            "skip_ratio": round(self.skipped / self.frames, 3) if self.frames else None,
+        }
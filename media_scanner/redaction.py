@@ -0,0 +1,135 @@
+import functools
+
+import cv2
+import numpy as np
+
+# ─── CONFIG ──────────────────────────────
+DEFAULT_STYLE = "blur"      # "blur", "pixelate" or "fill"
+MERGE_GAP = 8               # boxes closer than this (px) are redacted as one region
+BLUR_STRENGTH = 0.25        # Gaussian kernel size as a fraction of the region's long side
+BLUR_WORK_SIZE = 96         # regions are blurred at most this large, then scaled back up
+PIXELATE_BLOCKS = 12        # blocks along the region's long side
+FILL_COLOR = (0, 0, 0)
+BOX_COLOR = (0, 255, 0)
+# ─────────────────────────────────────────
+
+STYLES = ("blur", "pixelate", "fill")
+
+
+def detections_from_result(result, conf_threshold):
+    """Detections of one backend result above `conf_threshold`, as an (N, 6) array of x1, y1, x2, y2, conf, cls."""
+    dets = result.dets
+    return dets[dets[:, 4] >= conf_threshold]
+
+
+def detect(model, frame, conf_threshold):
+    """Run `model` on one frame and return its detections as an (N, 6) array."""
+    results = model(frame, verbose=False)
+    return detections_from_result(results[0], conf_threshold)
+
+
+def clamp_boxes(boxes, width, height):
+    """Round boxes to ints inside the frame and drop empty ones."""
+    boxes = np.asarray(boxes, np.float32).reshape(-1, 4)
+    boxes = np.rint(boxes).astype(np.int32)
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+    keep = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+    return boxes[keep]
+
+
+def merge_boxes(boxes, gap=MERGE_GAP):
+    """Merge overlapping or adjacent (within `gap` px) boxes into their union."""
+    regions = [list(b) for b in boxes]
+    merged = True
+    while merged and len(regions) > 1:
+        merged = False
+        out = []
+        for b in regions:
+            for o in out:
+                if (b[0] <= o[2] + gap and o[0] <= b[2] + gap
+                        and b[1] <= o[3] + gap and o[1] <= b[3] + gap):
+                    o[0], o[1] = min(o[0], b[0]), min(o[1], b[1])
+                    o[2], o[3] = max(o[2], b[2]), max(o[3], b[3])
+                    merged = True
+                    break
+            else:
+                out.append(b)
+        regions = out
+    return regions
+
+
+def blur_kernel(width, height, strength=BLUR_STRENGTH):
+    return max(3, int(max(width, height) * strength) | 1)
+
+
+# Redactors write straight into the region (a view of the frame) through dst=
+def _blur(roi, strength=BLUR_STRENGTH):
+    h, w = roi.shape[:2]
+    k = blur_kernel(w, h, strength)
+    scale = min(1.0, BLUR_WORK_SIZE / max(w, h))
+    if scale == 1.0:
+        cv2.GaussianBlur(roi, (k, k), 0, dst=roi)
+        return
+    # Blur a downscaled copy; the upscale smooths it further for free. A linear
+    # (not area) downscale is enough here since the result is blurred anyway.
+    small = cv2.resize(roi, (max(1, round(w * scale)), max(1, round(h * scale))),
+                       interpolation=cv2.INTER_LINEAR)
+    ks = max(3, int(k * scale) | 1)
+    cv2.GaussianBlur(small, (ks, ks), 0, dst=small)
+    cv2.resize(small, (w, h), dst=roi, interpolation=cv2.INTER_LINEAR)
+
+
+def _pixelate(roi):
+    h, w = roi.shape[:2]
+    scale = PIXELATE_BLOCKS / max(w, h)
+    # Blocks are at least 2 px, so a region smaller than PIXELATE_BLOCKS still loses its detail
+    small = cv2.resize(roi, (max(1, min(round(w * scale), w // 2)), max(1, min(round(h * scale), h // 2))),
+                       interpolation=cv2.INTER_LINEAR)
+    cv2.resize(small, (w, h), dst=roi, interpolation=cv2.INTER_NEAREST)
+
+
+def _fill(roi):
+    # cv2 fills in place on the view; numpy broadcasting a tuple is ~30x slower
+    cv2.rectangle(roi, (0, 0), (roi.shape[1] - 1, roi.shape[0] - 1), FILL_COLOR, -1)
+
+
+_REDACTORS = {"blur": _blur, "pixelate": _pixelate, "fill": _fill}
+
+
+def redact(img, boxes, style=DEFAULT_STYLE, strength=None):
+    """Redact every box in `img` in place, in one pass over merged regions.
+
+    `strength` overrides BLUR_STRENGTH for the "blur" style.
+    """
+    try:
+        redactor = _REDACTORS[style]
+    except KeyError:
+        raise ValueError(f"Unknown redaction style '{style}', expected one of {STYLES}")
+    if style == "blur" and strength is not None:
+        redactor = functools.partial(_blur, strength=strength)
+
+    height, width = img.shape[:2]
+    boxes = clamp_boxes(boxes, width, height)
+    if len(boxes) == 0:
+        return img
+    for x1, y1, x2, y2 in merge_boxes(boxes):
+        redactor(img[y1:y2, x1:x2])
+    return img
+
+
+def draw_detections(img, dets, names):
+    for x1, y1, x2, y2, conf, cls_id in dets:
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        label = f"{names[int(cls_id)]} {conf:.2f}"
+        cv2.rectangle(img, (x1, y1), (x2, y2), BOX_COLOR, 2)
+        cv2.putText(img, label, (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, BOX_COLOR, 2)
+    return img
+
+
+def render_detections(img, dets, names, blur=True, style=DEFAULT_STYLE, strength=None):
+    """Blur (or, with blur=False, outline and label) the detections in `img`."""
+    if blur:
+        return redact(img, dets[:, :4], style=style, strength=strength)
+    return draw_detections(img, dets, names)
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from mediascanner import settings
+
+
+def cache_key(data, *params):
+    """Content address: hash of the uploaded bytes plus every setting that affects the output."""
+    digest = hashlib.sha256(data)
+    for param in params:
+        digest.update(b"\0" + str(param).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Two-level LRU cache of rendered uploads and their detections.
+
+    Entries live in memory up to `memory_bytes` and on disk (one .bin with
+    the rendered file plus one .json with the detections and class names) up
+    to `disk_bytes`; the least recently used entries are evicted first.
+    """
+
+    def __init__(self, cache_dir, memory_bytes, disk_bytes):
+        self.cache_dir = str(cache_dir)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self._memory = OrderedDict()   # key -> (output bytes, detections, class names)
+        self._memory_size = 0
+        self._disk = None              # key -> entry size on disk, LRU order
+        self._disk_size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (output bytes, detections N x 6, class names) or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return entry
+
+            self._load_disk_index()
+            if key in self._disk:
+                try:
+                    entry = self._read(key)
+                except (OSError, ValueError, KeyError):
+                    # Unreadable, or written by an older version without class names
+                    self._drop_disk(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self.hits_disk += 1
+                    self._remember(key, entry)
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def put(self, key, output, detections, names):
+        detections = np.asarray(detections, np.float32).reshape(-1, 6)
+        names = {int(k): v for k, v in dict(names).items()}
+        with self._lock:
+            self._remember(key, (output, detections, names))
+            self._load_disk_index()
+            if self.disk_bytes <= 0:
+                return
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(self._path(key, ".bin"), "wb") as f:
+                    f.write(output)
+                with open(self._path(key, ".json"), "w") as f:
+                    json.dump({"detections": detections.tolist(), "names": names}, f)
+            except OSError as e:
+                print(f"[WARNING] Result cache write failed: {e}")
+                return
+            self._drop_disk(key, remove=False)
+            self._disk[key] = self._entry_size(key)
+            self._disk_size += self._disk[key]
+            while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+                self._drop_disk(next(iter(self._disk)))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": round((lookups - self.misses) / lookups, 3) if lookups else None,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_entries": len(self._disk or ()),
+                "disk_bytes": self._disk_size,
+            }
+
+    def _remember(self, key, entry):
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key)[0])
+        size = len(entry[0])
+        if size > self.memory_bytes:
+            return
+        self._memory[key] = entry
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, (output, _, _) = self._memory.popitem(last=False)
+            self._memory_size -= len(output)
+
+    def _path(self, key, ext):
+        return os.path.join(self.cache_dir, key + ext)
+
+    def _read(self, key):
+        with open(self._path(key, ".bin"), "rb") as f:
+            output = f.read()
+        with open(self._path(key, ".json")) as f:
+            meta = json.load(f)
+        if not isinstance(meta, dict):
+            raise ValueError(f"Cache entry {key} has no class names")
+        detections = np.asarray(meta["detections"], np.float32).reshape(-1, 6)
+        # JSON object keys are strings; class ids are ints everywhere else
+        names = {int(k): v for k, v in meta["names"].items()}
+        return output, detections, names
+
+    def _entry_size(self, key):
+        return sum(os.path.getsize(self._path(key, ext)) for ext in (".bin", ".json"))
+
+    def _load_disk_index(self):
+        if self._disk is not None:
+            return
+        self._disk = OrderedDict()
+        if not os.path.isdir(self.cache_dir):
+            return
+        # Rebuild LRU order from modification times left by a previous process
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(name)
+            if ext == ".bin" and os.path.exists(self._path(key, ".json")):
+                entries.append((os.path.getmtime(self._path(key, ".bin")), key))
+        for _, key in sorted(entries):
+            self._disk[key] = self._entry_size(key)
+            self._disk_size += self._disk[key]
+
+    def _drop_disk(self, key, remove=True):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_size -= size
+        if remove:
+            for ext in (".bin", ".json"):
+                try:
+                    os.remove(self._path(key, ext))
+                except OSError:
+                    pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(settings.RESULT_CACHE_DIR,
+                                 memory_bytes=settings.RESULT_CACHE_MEMORY_BYTES,
+                                 disk_bytes=settings.RESULT_CACHE_DISK_BYTES)
+        return _cache
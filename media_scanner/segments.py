@@ -0,0 +1,278 @@
+import bisect
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from media_scanner.ffmpeg_reader import FFPROBE_BINARY
+from media_scanner.ffmpeg_writer import FFMPEG_BINARY, FFmpegWriter, get_profile
+from media_scanner.frame_pool import FramePool, read_into
+from media_scanner.keyframes import detector_chain
+from media_scanner.model_registry import get_model
+from media_scanner.redaction import detect, render_detections
+from media_scanner.video_pipeline import open_video
+from mediascanner import settings
+
+# ─── CONFIG ──────────────────────────────
+SEGMENTS_PER_WORKER = 2    # more segments than workers, so one slow segment doesn't leave cores idle
+MIN_SEGMENT_SECONDS = 10   # segments are never cut shorter than this
+WORKER_THREADS = 4         # cores per worker when VIDEO_SEGMENT_WORKERS = 0
+SEAM_FRAMES = 5            # last frames of a segment that also get the next segment's first detections
+CUT_EPSILON = 0.001        # seconds; keeps rounded keyframe timestamps on the right side of a cut
+POLL_INTERVAL = 0.5        # seconds between progress / cancellation checks
+# ─────────────────────────────────────────
+
+# Set once per worker process by _init_worker
+_model = None
+
+
+def worker_count():
+    if settings.VIDEO_SEGMENT_WORKERS:
+        return settings.VIDEO_SEGMENT_WORKERS
+    return max(1, (os.cpu_count() or 1) // WORKER_THREADS)
+
+
+def enabled():
+    return worker_count() > 1
+
+
+def _run(cmd, what):
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{what} failed: {proc.stderr.decode('utf-8', 'replace').strip()}")
+    return proc.stdout
+
+
+def probe_frames(path):
+    """(frame timestamps, keyframe timestamps) of the first video stream, sorted, read from its packets."""
+    output = _run([FFPROBE_BINARY, "-v", "error", "-select_streams", "v:0",
+                   "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path], "ffprobe")
+    times, keyframes = [], []
+    for line in output.decode("utf-8", "replace").splitlines():
+        pts, _, flags = line.partition(",")
+        try:
+            t = float(pts)
+        except ValueError:
+            continue
+        times.append(t)
+        if "K" in flags:
+            keyframes.append(t)
+    return sorted(times), sorted(keyframes)
+
+
+def _rotated(path):
+    output = _run([FFPROBE_BINARY, "-v", "error", "-select_streams", "v:0",
+                   "-show_entries", "stream_tags=rotate:stream_side_data=rotation", "-of", "json", path],
+                  "ffprobe")
+    for stream in json.loads(output or b"{}").get("streams", []):
+        if int(float(stream.get("tags", {}).get("rotate", 0) or 0)) % 360:
+            return True
+        if any(int(float(s.get("rotation", 0) or 0)) % 360 for s in stream.get("side_data_list", [])):
+            return True
+    return False
+
+
+def plan_cuts(keyframes, start, end, segments):
+    """Keyframe timestamps that cut [start, end] into up to `segments` pieces of similar length."""
+    cuts = []
+    for i in range(1, segments):
+        target = start + (end - start) * i / segments
+        idx = bisect.bisect_left(keyframes, target)
+        if idx == len(keyframes):
+            break
+        cut = keyframes[idx]
+        if cut - (cuts[-1] if cuts else start) < MIN_SEGMENT_SECONDS:
+            continue
+        if end - cut < MIN_SEGMENT_SECONDS:
+            break
+        cuts.append(cut)
+    return cuts
+
+
+def plan(input_path):
+    """How to split `input_path`: a dict with cuts, estimated frames per segment and total, or None.
+
+    None means the video is better processed in one piece: too short, too
+    few keyframes, rotated (stream copies may drop the rotation), or
+    segmenting is disabled.
+    """
+    workers = worker_count()
+    if workers <= 1:
+        return None
+    times, keyframes = probe_frames(input_path)
+    if len(times) < 2 or times[-1] - times[0] < settings.VIDEO_SEGMENT_MIN_SECONDS:
+        return None
+    cuts = plan_cuts(keyframes, times[0], times[-1], workers * SEGMENTS_PER_WORKER)
+    if not cuts or _rotated(input_path):
+        return None
+    bounds = [0] + [bisect.bisect_left(times, cut - CUT_EPSILON) for cut in cuts] + [len(times)]
+    return {
+        "cuts": cuts,
+        "frames": [b - a for a, b in zip(bounds, bounds[1:])],
+        "total": len(times),
+        "workers": min(workers, len(cuts) + 1),
+    }
+
+
+def split(input_path, cuts, workdir):
+    """Stream-copy the video track into one file per segment (no re-encoding); returns their paths."""
+    pattern = os.path.join(workdir, "chunk_%04d.mkv")
+    _run([FFMPEG_BINARY, "-y", "-loglevel", "error", "-nostats", "-i", input_path,
+          "-map", "0:v:0", "-c", "copy", "-f", "segment",
+          "-segment_times", ",".join(f"{cut - CUT_EPSILON:.6f}" for cut in cuts),
+          "-reset_timestamps", "1", pattern], "ffmpeg split")
+    return sorted(glob.glob(os.path.join(workdir, "chunk_*.mkv")))
+
+
+def concat(segment_paths, output_path, audio_source=None, profile=None):
+    """Join encoded segments without re-encoding the video, muxing in the first audio track of `audio_source`."""
+    profile = get_profile(profile or settings.VIDEO_OUTPUT_PROFILE)
+    list_path = f"{output_path}.segments.txt"
+    with open(list_path, "w") as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error", "-nostats",
+           "-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_source:
+        cmd += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?"]
+    cmd += ["-c:v", "copy"]
+    if audio_source:
+        # Both tracks come from the same file; -shortest would cut stream-copied video short
+        cmd += profile["audio"]
+    cmd += profile["container"] + [output_path]
+    try:
+        _run(cmd, "ffmpeg concat")
+    finally:
+        os.remove(list_path)
+
+
+def _init_worker(model_path, backend, threads):
+    global _model
+    cv2.setNumThreads(threads)
+    _model = get_model(model_path, backend=backend, threads=threads)
+
+
+def _next_head(next_chunk, conf):
+    """Detections on the first frame of the next segment (what its own worker finds there first)."""
+    if next_chunk is None:
+        return None
+    cap = cv2.VideoCapture(next_chunk)
+    ok, frame = cap.read()
+    cap.release()
+    return detect(_model, frame, conf) if ok else None
+
+
+def _process_segment(chunk, next_chunk, output_path, fps, options):
+    """Detect, redact and encode one segment; returns its detections per frame.
+
+    Every segment starts with a fresh detection. Boxes that the next segment
+    finds on its first frame are also redacted on this segment's last
+    SEAM_FRAMES frames, so nothing that is about to appear at a seam is
+    left to the propagated boxes of an older keyframe.
+    """
+    conf = options["conf"]
+    find, _, _ = detector_chain(lambda frame: detect(_model, frame, conf))
+    head = _next_head(next_chunk, conf)
+
+    cap, width, height, _ = open_video(chunk)
+    writer = FFmpegWriter(output_path, width, height, fps, profile=options["profile"])
+    pending = deque()
+    frames = FramePool(SEAM_FRAMES + 2)
+    detections = []
+
+    def emit(frame, dets):
+        detections.append(dets)
+        writer.write(render_detections(frame, dets, _model.names, blur=options["blur"],
+                                       style=options["style"]))
+        frames.release(frame)
+
+    try:
+        while True:
+            ok, frame = read_into(cap, frames)
+            if not ok:
+                break
+            pending.append((frame, find(frame)))
+            if len(pending) > SEAM_FRAMES:
+                emit(*pending.popleft())
+        while pending:
+            frame, dets = pending.popleft()
+            if head is not None and len(head):
+                dets = np.concatenate([dets, head])
+            emit(frame, dets)
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        cap.release()
+    writer.release()
+    return detections
+
+
+def process_video_segments(input_path, output_path, video_plan, options, job=None):
+    """Process a complete video file in parallel segments and join them into `output_path`.
+
+    `video_plan` comes from plan(); `options` holds conf, blur, style and
+    profile. Each worker process loads its own model. Returns
+    (stats, detections per frame in order).
+    """
+    wall_start = time.perf_counter()
+    workers = video_plan["workers"]
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    cap, _, _, fps = open_video(input_path)
+    cap.release()
+    workdir = tempfile.mkdtemp(prefix="segments-", dir=os.path.dirname(os.path.abspath(output_path)))
+    ext = get_profile(options["profile"])["ext"]
+
+    pool = multiprocessing.get_context("spawn").Pool(
+        workers, initializer=_init_worker,
+        initargs=(os.path.abspath(settings.MODEL_PATH), settings.INFERENCE_BACKEND, threads))
+    try:
+        chunks = split(input_path, video_plan["cuts"], workdir)
+        print(f"[INFO] Processing {len(chunks)} segments on {workers} worker processes x {threads} threads...")
+        outputs = [os.path.join(workdir, f"segment_{i:04d}{ext}") for i in range(len(chunks))]
+        results = [
+            pool.apply_async(_process_segment, (chunk, chunks[i + 1] if i + 1 < len(chunks) else None,
+                                                outputs[i], fps, options))
+            for i, chunk in enumerate(chunks)
+        ]
+        # Frame counts from the plan are estimates; they only drive progress
+        estimated = video_plan["frames"] + [0] * max(len(chunks) - len(video_plan["frames"]), 0)
+        while True:
+            ready = [r.ready() for r in results]
+            if job is not None:
+                job.update_progress(sum(n for n, done in zip(estimated, ready) if done), video_plan["total"])
+            if all(ready):
+                break
+            results[ready.index(False)].wait(POLL_INTERVAL)
+
+        detections = []
+        for r in results:
+            detections.extend(r.get())
+        pool.close()
+
+        concat_start = time.perf_counter()
+        concat(outputs, output_path, audio_source=input_path, profile=options["profile"])
+        concat_time = time.perf_counter() - concat_start
+    finally:
+        pool.terminate()
+        pool.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stats = {
+        "frames": len(detections),
+        "segments": len(results),
+        "workers": workers,
+        "concat": concat_time,
+        "wall": time.perf_counter() - wall_start,
+        "fps": fps,
+    }
+    return stats, detections
@@ -1,3 +1,447 @@
-from django.test import TestCase
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from media_scanner import ffmpeg_writer, folder_workers, views
+from media_scanner.jobs import CANCELLED, DONE, FAILED, PRIORITY_HIGH, RUNNING, JobQueue
+from media_scanner.keyframes import KeyframeDetector
+from media_scanner.manifest import Manifest, file_digest
+from media_scanner.models import MediaItem
+from media_scanner.redaction import redact
+from media_scanner.result_cache import ResultCache
+from media_scanner.uploads import UploadConflict, create_session
+from media_scanner.views import _upload_status
+
+
+def _moving_patch_frames(count, step=3):
+    """Frames of a textured square sliding right by `step` px per frame."""
+    texture = np.random.default_rng(0).integers(0, 255, (50, 50, 3), np.uint8)
+    frames = []
+    for i in range(count):
+        frame = np.full((240, 320, 3), 90, np.uint8)
+        x = 50 + i * step
+        frame[50:100, x:x + 50] = texture
+        frames.append(frame)
+    return frames
+
+
+class KeyframeDetectorTests(SimpleTestCase):
+    def test_keyframe_output_is_not_shifted_by_later_frames(self):
+        box = np.array([[50, 50, 100, 100, 0.9, 0]], np.float32)
+        keyframes = KeyframeDetector(lambda frame: box, max_interval=8)
+        frames = _moving_patch_frames(4)
+
+        first = keyframes(frames[0])
+        expected = first.copy()
+        for frame in frames[1:]:
+            keyframes(frame)
+
+        np.testing.assert_array_equal(first, expected)
+        self.assertEqual(keyframes.keyframes, 1)
+
+
+class UploadSessionTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def _session(self, size=None):
+        session = create_session(os.path.join(self.tmp, "clip.mp4"), "clip.mp4", size)
+        self.addCleanup(session.abort)
+        return session
+
+    def test_out_of_order_chunk_is_rejected_and_upload_resumes(self):
+        session = self._session(size=10)
+        session.append(0, b"abcd")
+
+        with self.assertRaises(UploadConflict):
+            session.append(6, b"ghij")
+        with self.assertRaises(UploadConflict):
+            session.append(0, b"abcd")
+        self.assertEqual(session.offset, 4)
+
+        session.append(4, b"efghij")
+        self.assertTrue(session.complete)
+        with open(session.path, "rb") as f:
+            self.assertEqual(f.read(), b"abcdefghij")
+
+    def test_chunk_past_declared_size_is_rejected(self):
+        session = self._session(size=4)
+        with self.assertRaises(UploadConflict):
+            session.append(0, b"abcde")
+        self.assertEqual(session.offset, 0)
+        self.assertFalse(session.complete)
+
+    def test_reader_follows_a_growing_upload(self):
+        session = self._session()
+        session.append(0, b"abc")
+        received = []
+        reader = threading.Thread(target=lambda: received.extend(session.iter_chunks()))
+        reader.start()
+
+        session.append(3, b"def")
+        session.finish()
+        reader.join(timeout=5)
+
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(b"".join(received), b"abcdef")
+        self.assertEqual(session.size, 6)
+
+    def test_status_keeps_uploaded_and_output_names_apart(self):
+        session = self._session(size=10)
+        session.info = {"filename": "blurred_20240101_000000.webm", "job_id": "unknown"}
+
+        status = _upload_status(session)
+
+        self.assertEqual(status["upload_filename"], "clip.mp4")
+        self.assertEqual(status["filename"], "blurred_20240101_000000.webm")
+        self.assertEqual(status["upload_url"], f"/uploads/{session.id}/")
+
+
+def _blocking_job(job, release):
+    release.wait(5)
+    return "released"
+
+
+class JobQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.queue = JobQueue(workers=2, express_workers=1)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def _occupy_normal_worker(self):
+        job = self.queue.submit(_blocking_job, self.release)
+        for _ in range(100):
+            if job.status == RUNNING:
+                return job
+            time.sleep(0.01)
+        self.fail("blocking job never started")
+
+    def test_quick_job_does_not_wait_behind_a_long_one(self):
+        long_job = self._occupy_normal_worker()
+        quick = self.queue.submit(lambda job: 42, kind="image", priority=PRIORITY_HIGH)
+
+        self.assertTrue(quick.wait(5))
+        self.assertEqual((quick.status, quick.result), (DONE, 42))
+        self.assertEqual(long_job.status, RUNNING)
+
+    def test_cancelling_a_queued_job_runs_on_cancel_instead(self):
+        self._occupy_normal_worker()
+        ran, cleaned = [], []
+        job = self.queue.submit(lambda job, arg: ran.append(arg), "x",
+                                on_cancel=lambda job, arg: cleaned.append(arg))
+
+        self.queue.cancel(job.id)
+        self.release.set()
+
+        self.assertEqual(job.status, CANCELLED)
+        self.assertEqual(cleaned, ["x"])
+        self.assertEqual(self.queue.depth(), 0)
+        self.assertEqual(ran, [])
+
+    def test_running_job_stops_at_its_next_progress_update(self):
+        started = threading.Event()
+
+        def loop(job):
+            started.set()
+            for i in range(500):
+                job.update_progress(i, 500)
+                time.sleep(0.01)
+
+        job = self.queue.submit(loop)
+        self.assertTrue(started.wait(5))
+        self.queue.cancel(job.id)
+
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.status, CANCELLED)
+
+    def test_failing_job_reports_its_error(self):
+        def fail(job):
+            raise ValueError("broken input")
+
+        job = self.queue.submit(fail)
+
+        self.assertTrue(job.wait(5))
+        self.assertEqual((job.status, job.error), (FAILED, "broken input"))
+
+
+class CancelledVideoJobTests(TestCase):
+    def test_cancelled_queued_video_drops_its_media_original_and_upload(self):
+        originals = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, originals, ignore_errors=True)
+        patcher = mock.patch.object(views.settings, "ORIGINALS_ROOT", originals)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        session = create_session(os.path.join(originals, "clip.mp4"), "clip.mp4", 100)
+        session.append(0, b"partial")
+        media = MediaItem.objects.create(kind=MediaItem.VIDEO, name="clip.mp4", source="clip.mp4",
+                                         conf_threshold=0.5)
+        queue = JobQueue(workers=2, express_workers=1)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        queue.submit(_blocking_job, release)
+        queue.submit(_blocking_job, release)
+
+        job = queue.submit(views._video_job, media.id, os.path.join(originals, "out.webm"), session,
+                           on_cancel=views._video_job_cancelled)
+        queue.cancel(job.id)
+
+        self.assertEqual(job.status, CANCELLED)
+        self.assertIsNone(job.error)
+        self.assertFalse(MediaItem.objects.filter(pk=media.id).exists())
+        self.assertFalse(os.path.exists(session.path))
+        self.assertTrue(session.aborted)
+
+    def test_failed_video_keeps_its_error_when_the_original_is_gone(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        output_path = os.path.join(tmp, "out.mp4")
+        media = MediaItem.objects.create(kind=MediaItem.VIDEO, name="clip.mp4", source="clip.mp4",
+                                         conf_threshold=0.5)
+
+        def broken_video(input_path, output_path, *args, **kwargs):
+            with open(output_path, "wb") as f:
+                f.write(b"partial")
+            raise ValueError("corrupt stream")
+
+        with mock.patch.object(views.settings, "ORIGINALS_ROOT", tmp), \
+                mock.patch.object(views, "get_model", mock.Mock()), \
+                mock.patch.object(views, "process_video", broken_video):
+            with self.assertRaisesMessage(ValueError, "corrupt stream"):
+                views._video_job(mock.Mock(), media.id, output_path)
+
+        self.assertFalse(os.path.exists(output_path))
+        self.assertFalse(MediaItem.objects.filter(pk=media.id).exists())
+
+
+class ManifestTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.tmp, f"{i}.jpg")
+            with open(path, "wb") as f:
+                f.write(bytes([i]) * 10)
+            self.paths.append(path)
+
+    def _manifest(self, version="v1"):
+        manifest = Manifest(os.path.join(self.tmp, "manifest.sqlite3"), version=version)
+        self.addCleanup(manifest.close)
+        return manifest
+
+    def _record(self, manifest, path, status="done"):
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            digest = file_digest(f.read())
+        manifest.record([{"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": digest,
+                          "status": status, "output": None, "error": None}])
+        return digest
+
+    def test_rerun_resumes_after_the_last_recorded_file(self):
+        manifest = self._manifest()
+        self._record(manifest, self.paths[0])
+        self._record(manifest, self.paths[1], status="failed")
+
+        todo, skipped = self._manifest().plan(self.paths)
+
+        self.assertEqual(skipped, 1)
+        self.assertEqual(todo, [(self.paths[1], None), (self.paths[2], None)])
+
+    def test_touched_file_comes_back_with_its_previous_hash(self):
+        manifest = self._manifest()
+        digest = self._record(manifest, self.paths[0])
+        stat = os.stat(self.paths[0])
+        os.utime(self.paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        todo, skipped = manifest.plan(self.paths[:1])
+
+        self.assertEqual((todo, skipped), ([(self.paths[0], digest)], 0))
+
+    def test_new_version_processes_everything_again(self):
+        for path in self.paths:
+            self._record(self._manifest(), path)
+
+        todo, skipped = self._manifest(version="v2").plan(self.paths)
+
+        self.assertEqual((len(todo), skipped), (3, 0))
+
+    def test_worker_skips_unchanged_content_and_reports_stage_counts(self):
+        images = []
+        for i in range(2):
+            path = os.path.join(self.tmp, f"img{i}.png")
+            cv2.imwrite(path, np.full((16, 16, 3), i * 100, np.uint8))
+            images.append(path)
+        with open(images[0], "rb") as f:
+            unchanged_hash = file_digest(f.read())
+
+        def model(frames, verbose=False):
+            return [mock.Mock(dets=np.empty((0, 6), np.float32), names={}) for _ in frames]
+
+        options = {"output_dir": self.tmp, "conf": 0.5, "blur": True, "style": "blur", "save": False}
+        with mock.patch.object(folder_workers, "_model", model), \
+                mock.patch.object(folder_workers, "_options", options):
+            rows, stage_stats = folder_workers.process_batch(
+                [(images[0], unchanged_hash), (images[1], None), (os.path.join(self.tmp, "gone.png"), None)])
+
+        self.assertEqual([(row["status"], row["unchanged"]) for row in rows],
+                         [("done", True), ("failed", False), ("done", False)])
+        self.assertEqual(stage_stats["infer"][0], 1)
+        self.assertEqual(stage_stats["decode"][0], 1)
+
+
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.dets = np.array([[1, 2, 3, 4, 0.9, 1]], np.float32)
+
+    def test_entry_round_trips_through_memory_and_disk(self):
+        ResultCache(self.tmp, 1024, 1024).put("k", b"output", self.dets, {0: "card", 1: "face"})
+
+        # A new process only has the disk tier
+        output, dets, names = ResultCache(self.tmp, 1024, 1024).get("k")
+
+        self.assertEqual(output, b"output")
+        np.testing.assert_array_equal(dets, self.dets)
+        self.assertEqual(names, {0: "card", 1: "face"})
+
+    def test_least_recently_used_entry_leaves_memory_first(self):
+        cache = ResultCache(self.tmp, memory_bytes=10, disk_bytes=0)
+        cache.put("a", b"aaaa", self.dets, {})
+        cache.put("b", b"bbbb", self.dets, {})
+        cache.get("a")
+        cache.put("c", b"cccc", self.dets, {})
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual(cache.stats()["memory_entries"], 2)
+
+    def test_entry_without_class_names_is_a_miss(self):
+        with open(os.path.join(self.tmp, "old.bin"), "wb") as f:
+            f.write(b"output")
+        with open(os.path.join(self.tmp, "old.json"), "w") as f:
+            f.write("[[1, 2, 3, 4, 0.9, 1]]")
+
+        cache = ResultCache(self.tmp, 1024, 1024)
+
+        self.assertIsNone(cache.get("old"))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "old.bin")))
+
+
+class CachedUploadTests(TransactionTestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        cache = ResultCache(os.path.join(tmp, "cache"), 1024 * 1024, 1024 * 1024)
+        model = mock.Mock(side_effect=lambda frames, verbose=False: [
+            mock.Mock(dets=np.array([[1, 1, 8, 8, 0.9, 1]], np.float32), names={1: "card"}) for _ in frames])
+        model.names = {1: "card"}
+        for patcher in (mock.patch.object(views.settings, "MEDIA_ROOT", os.path.join(tmp, "media")),
+                        mock.patch.object(views.settings, "ORIGINALS_ROOT", os.path.join(tmp, "originals")),
+                        mock.patch.object(views, "get_cache", lambda: cache),
+                        mock.patch.object(views, "get_model", lambda *a, **k: model)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_cache_hit_keeps_the_class_names(self):
+        ok, png = cv2.imencode(".png", np.full((16, 16, 3), 128, np.uint8))
+
+        for _ in range(2):
+            response = self.client.post("/upload/", {"images": SimpleUploadedFile("a.png", png.tobytes())})
+        result = response.json()["results"][0]
+
+        self.assertTrue(result["cached"])
+        self.assertEqual(MediaItem.objects.get(pk=result["media_id"]).class_names, {"1": "card"})
+
+
+class PixelateTests(SimpleTestCase):
+    def test_small_region_is_pixelated_not_copied(self):
+        img = np.random.default_rng(0).integers(0, 255, (40, 40, 3), np.uint8)
+        original = img.copy()
+
+        redact(img, np.array([[10, 10, 20, 20]]), style="pixelate")
+
+        region = img[10:20, 10:20]
+        self.assertFalse(np.array_equal(region, original[10:20, 10:20]))
+        # 2x2 px blocks at least: every block is one colour
+        blocks = region.reshape(5, 2, 5, 2, 3)
+        self.assertTrue((blocks == blocks[:, :1, :, :1]).all())
+        np.testing.assert_array_equal(img[:10], original[:10])
+
+    def test_large_region_gets_pixelate_blocks(self):
+        img = np.random.default_rng(0).integers(0, 255, (240, 240, 3), np.uint8)
+
+        redact(img, np.array([[0, 0, 240, 240]]), style="pixelate")
+
+        self.assertEqual(len(np.unique(img.reshape(-1, 3), axis=0)), 12 * 12)
+
+
+class VideoUploadNamingTests(TestCase):
+    def test_same_name_in_the_same_second_gets_its_own_files(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        job_queue = mock.Mock()
+        job_queue.submit.return_value.id = "job"
+        for patcher in (mock.patch.object(views.settings, "MEDIA_ROOT", os.path.join(tmp, "media")),
+                        mock.patch.object(views.settings, "ORIGINALS_ROOT", os.path.join(tmp, "originals")),
+                        mock.patch.object(views, "get_queue", lambda: job_queue)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        first = views._start_video_upload("clip.mp4", 10)
+        second = views._start_video_upload("clip.mp4", 10)
+        self.addCleanup(first.abort)
+        self.addCleanup(second.abort)
+
+        self.assertNotEqual(first.path, second.path)
+        self.assertNotEqual(first.info["filename"], second.info["filename"])
+        outputs = MediaItem.objects.values_list("output", flat=True)
+        self.assertEqual(len(set(outputs)), 2)
+
+
+# Logs more than a pipe buffer holds before it reads any input, then fails
+_CHATTY_FFMPEG = """import sys
+sys.stderr.write("x" * 1_000_000 + "\\nbad encode\\n")
+sys.stderr.flush()
+sys.stdin.buffer.read()
+sys.exit(1)
+"""
+
+
+class FFmpegWriterTests(SimpleTestCase):
+    def test_long_stderr_does_not_block_writes(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        fake = os.path.join(tmp, "ffmpeg")
+        with open(fake, "w") as f:
+            f.write(f"#!{sys.executable}\n" + _CHATTY_FFMPEG)
+        os.chmod(fake, 0o755)
+        outcome = []
+
+        def encode():
+            writer = ffmpeg_writer.FFmpegWriter(os.path.join(tmp, "out.webm"), 64, 64, 25)
+            for _ in range(100):
+                writer.write(np.zeros((64, 64, 3), np.uint8))
+            try:
+                writer.release()
+            except RuntimeError as e:
+                outcome.append(e)
+
+        with mock.patch.object(ffmpeg_writer, "FFMPEG_BINARY", fake):
+            thread = threading.Thread(target=encode, daemon=True)
+            thread.start()
+            thread.join(timeout=10)
+
+        self.assertFalse(thread.is_alive(), "write() blocked on ffmpeg's stderr")
+        self.assertIn("bad encode", str(outcome[0]))
@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+import uuid
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+# ─── CONFIG ──────────────────────────────
+READ_SIZE = 1024 * 1024   # bytes handed to a reader at a time
+UPLOAD_TTL = 3600         # seconds without new data before an unfinished upload is dropped
+POLL_INTERVAL = 0.5
+# ─────────────────────────────────────────
+
+
+class UploadAborted(Exception):
+    pass
+
+
+class UploadConflict(Exception):
+    pass
+
+
+class UploadSession:
+    """A file that is written chunk by chunk and can be read while it grows.
+
+    Chunks must arrive in order (`append(offset, data)` rejects anything but
+    the current offset), so an interrupted client can ask for the offset and
+    resume from there. Readers iterate over the bytes received so far and
+    then wait for more until the upload is complete.
+    """
+
+    def __init__(self, path, filename, size=None):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.filename = filename
+        self.size = size
+        # The size, or an upper bound on it (the request body) while it isn't known
+        self.expected_size = size
+        self.offset = 0
+        self.complete = False
+        self.aborted = False
+        self.info = {}
+        self.updated_at = time.time()
+        self._file = open(path, "wb")
+        self._cond = threading.Condition()
+
+    def append(self, offset, data):
+        with self._cond:
+            if self.complete or self.aborted:
+                raise UploadConflict("Upload is already closed")
+            if offset != self.offset:
+                raise UploadConflict(f"Expected offset {self.offset}, got {offset}")
+            if self.size is not None and offset + len(data) > self.size:
+                raise UploadConflict(f"Data runs past the declared size of {self.size} bytes")
+            self._file.write(data)
+            self._file.flush()
+            self.offset += len(data)
+            self.updated_at = time.time()
+            if self.size is not None and self.offset == self.size:
+                self._close(complete=True)
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            if not self.complete and not self.aborted:
+                self.size = self.offset
+                self._close(complete=True)
+            self._cond.notify_all()
+
+    def abort(self):
+        with self._cond:
+            if not self.complete:
+                self._close(complete=False)
+            self._cond.notify_all()
+
+    def wait_complete(self):
+        with self._cond:
+            while not self.complete:
+                self._wait()
+
+    def iter_chunks(self, stop=None):
+        """Yield the file's bytes from the start, waiting for new data until the upload completes.
+
+        Raises UploadAborted if the upload is abandoned; returns early once `stop` is set.
+        """
+        with open(self.path, "rb") as f:
+            pos = 0
+            while True:
+                with self._cond:
+                    while pos >= self.offset and not self.complete:
+                        if stop is not None and stop.is_set():
+                            return
+                        self._wait()
+                    end = self.offset
+                if pos >= end:
+                    return
+                while pos < end:
+                    if stop is not None and stop.is_set():
+                        return
+                    data = f.read(min(READ_SIZE, end - pos))
+                    pos += len(data)
+                    yield data
+
+    def to_dict(self):
+        return {
+            "upload_id": self.id,
+            "upload_filename": self.filename,
+            "size": self.size,
+            "offset": self.offset,
+            "complete": self.complete,
+            "aborted": self.aborted,
+        }
+
+    def _wait(self):
+        if self.aborted:
+            raise UploadAborted(f"Upload of {self.filename} was aborted")
+        if time.time() - self.updated_at > UPLOAD_TTL:
+            self._close(complete=False)
+            raise UploadAborted(f"Upload of {self.filename} timed out")
+        self._cond.wait(POLL_INTERVAL)
+
+    def _close(self, complete):
+        self.complete = complete
+        self.aborted = not complete
+        self._file.close()
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def create_session(path, filename, size=None):
+    session = UploadSession(path, filename, size)
+    now = time.time()
+    with _sessions_lock:
+        for upload_id, old in list(_sessions.items()):
+            if now - old.updated_at > UPLOAD_TTL:
+                old.abort()
+                del _sessions[upload_id]
+        _sessions[session.id] = session
+    return session
+
+
+def get_session(upload_id):
+    with _sessions_lock:
+        return _sessions.get(upload_id)
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """Multipart upload handler that streams matching files into an UploadSession.
+
+    For a file whose extension is in `extensions`, `start(file_name)` is
+    called as soon as its part begins and must return a new UploadSession;
+    every chunk then goes into it instead of a temp file. Other files fall
+    through to Django's default handlers. The resulting entry in
+    request.FILES carries the session as `upload_session`.
+
+    This only overlaps processing with the upload when the server hands the
+    body over while it is still arriving (WSGI). Under ASGI (daphne) Django
+    spools the whole request body before the view runs, so a multipart
+    upload is complete before the first chunk gets here; large videos should
+    go through the chunked /uploads/ API instead.
+    """
+
+    def __init__(self, request, extensions, start):
+        super().__init__(request)
+        self.extensions = extensions
+        self.start = start
+        self.session = None
+        self.content_length = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.content_length = content_length
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.session = None
+        if os.path.splitext(file_name)[1].lower() in self.extensions:
+            self.session = self.start(file_name)
+            if self.session.expected_size is None:
+                self.session.expected_size = self.content_length
+            raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.session is None:
+            return raw_data
+        self.session.append(start, raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.session is None:
+            return None
+        self.session.finish()
+        uploaded = UploadedFile(name=self.file_name, content_type=self.content_type, size=file_size)
+        uploaded.upload_session = self.session
+        self.session = None
+        return uploaded
+
+    def upload_interrupted(self):
+        if self.session is not None:
+            self.session.abort()
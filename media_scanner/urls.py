@@ -1,8 +1,19 @@
 from django.urls import path
 from . import views
+from mediascanner import settings
 
 urlpatterns = [
-    path("upload/", views.upload, name="upload"),
+    path("upload/", views.upload_async if settings.ASYNC_UPLOAD_VIEW else views.upload, name="upload"),
+    path("uploads/", views.create_upload, name="create_upload"),
+    path("uploads/<str:upload_id>/", views.upload_chunk, name="upload_chunk"),
     path("livestream/disconnect/", views.disconnect_livestream, name="disconnect_livestream"),
     path('delete-file/', views.delete_file, name='delete_file'),
+    path("jobs/<str:job_id>/", views.job_status, name="job_status"),
+    path("jobs/<str:job_id>/cancel/", views.job_cancel, name="job_cancel"),
+    path("jobs/<str:job_id>/result/", views.job_result, name="job_result"),
+    path("cache/stats/", views.cache_stats, name="cache_stats"),
+    path("metrics", views.prometheus_metrics, name="metrics"),
+    path("media-items/<int:media_id>/", views.media_detail, name="media_detail"),
+    path("media-items/<int:media_id>/detections/", views.media_detections, name="media_detections"),
+    path("media-items/<int:media_id>/render/", views.render_media, name="render_media"),
 ]
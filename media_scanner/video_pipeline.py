@@ -0,0 +1,175 @@
+import queue
+import threading
+import time
+
+import cv2
+
+from media_scanner.frame_pool import FramePool, read_into
+from media_scanner.metrics import QUEUE_DEPTH, observe_stage, record_frames
+
+# ─── CONFIG ──────────────────────────────
+QUEUE_SIZE = 8       # frames buffered between stages (bounds memory)
+DEFAULT_FPS = 25     # used when the container does not report a frame rate
+# ─────────────────────────────────────────
+
+_END = object()
+
+# Queues of the pipelines currently running, summed into the queue depth gauge
+_active_queues = {"video_decoded": set(), "video_processed": set()}
+_active_lock = threading.Lock()
+
+
+def _queued(name):
+    with _active_lock:
+        return sum(q.qsize() for q in _active_queues[name])
+
+
+for _name in _active_queues:
+    QUEUE_DEPTH.set_function(lambda name=_name: _queued(name), queue=_name)
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def open_video(input_path):
+    """Open a video file and return (cap, width, height, fps)."""
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Video not found: {input_path}")
+
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not fps or fps != fps:
+        fps = DEFAULT_FPS
+    return cap, width, height, fps
+
+
+def run_pipeline(cap, process_frame, writer, queue_size=QUEUE_SIZE, progress=None, metrics_path="video"):
+    """Decode frames from `cap`, run `process_frame` on each, write them to `writer`.
+
+    Decoding and encoding run on their own threads and are connected to the
+    processing stage (the calling thread) by bounded queues, so the total time
+    approaches that of the slowest stage while at most `queue_size` frames wait
+    between any two stages. Frames are written in the order they were read.
+
+    `progress(frames_done)` is called after every processed frame; an
+    exception raised from it aborts the pipeline and is re-raised.
+
+    Per-frame decode and encode times and the frame count are recorded
+    under `metrics_path`.
+
+    Frames are decoded into a pool of buffers that are reused once written,
+    so `process_frame` should work in place and return its input (a new
+    array is fine, it just isn't pooled).
+
+    Returns a dict with the frame count, wall time and busy time per stage.
+    """
+    decoded = queue.Queue(queue_size)
+    processed = queue.Queue(queue_size)
+    stop = threading.Event()
+    errors = []
+    stats = {"frames": 0, "decode": 0.0, "process": 0.0, "encode": 0.0, "wall": 0.0}
+    # Both queues full plus one frame in each stage
+    frames = FramePool(2 * queue_size + 3)
+
+    def decode():
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                ret, frame = read_into(cap, frames, stop)
+                elapsed = time.perf_counter() - start
+                stats["decode"] += elapsed
+                if not ret:
+                    break
+                observe_stage(metrics_path, "decode", elapsed)
+                if not _put(decoded, frame, stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        _put(decoded, _END, stop)
+
+    def encode():
+        try:
+            while True:
+                frame = _get(processed, stop)
+                if frame is _END:
+                    break
+                start = time.perf_counter()
+                writer.write(frame)
+                elapsed = time.perf_counter() - start
+                frames.release(frame)
+                stats["encode"] += elapsed
+                observe_stage(metrics_path, "encode", elapsed)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    decoder = threading.Thread(target=decode, name="video-decode", daemon=True)
+    encoder = threading.Thread(target=encode, name="video-encode", daemon=True)
+    wall_start = time.perf_counter()
+    with _active_lock:
+        _active_queues["video_decoded"].add(decoded)
+        _active_queues["video_processed"].add(processed)
+    decoder.start()
+    encoder.start()
+
+    try:
+        while True:
+            frame = _get(decoded, stop)
+            if frame is _END:
+                break
+            start = time.perf_counter()
+            output = process_frame(frame)
+            if output is not frame:
+                frames.release(frame)
+            frame = output
+            stats["process"] += time.perf_counter() - start
+            stats["frames"] += 1
+            record_frames(metrics_path)
+            if not _put(processed, frame, stop):
+                break
+            if progress is not None:
+                progress(stats["frames"])
+        _put(processed, _END, stop)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        decoder.join()
+        encoder.join()
+        with _active_lock:
+            _active_queues["video_decoded"].discard(decoded)
+            _active_queues["video_processed"].discard(processed)
+
+    if errors:
+        raise errors[0]
+
+    stats["wall"] = time.perf_counter() - wall_start
+    return stats
+
+
+def format_stats(stats):
+    frames = stats["frames"]
+    wall = stats["wall"] or 1e-6
+    parts = [f"{frames} frames in {stats['wall']:.2f}s ({frames / wall:.2f} fps)"]
+    for stage in ("decode", "process", "encode"):
+        parts.append(f"{stage} {stats[stage]:.2f}s")
+    return ", ".join(parts)
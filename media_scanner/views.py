@@ -1,55 +1,47 @@
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
 from datetime import datetime
+import itertools
+import json
+import time
+import uuid
 import numpy as np
-import torch
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import cv2
 import os
 
-from ultralytics import YOLO
-
+from livestream.consumers import grabber
+from media_scanner.detection_store import DetectionWriter, load_detections
 from mediascanner import settings
-
-# Global camera instance
-camera = None
-
-# Check for GPU
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"[INFO] Loading YOLO model on: {DEVICE.upper()}")
-
-# Load model and move to correct device
-model_path = os.path.join(settings.BASE_DIR, "best.pt")
-model = YOLO(model_path).to(DEVICE)
+from media_scanner.ffmpeg_reader import FFmpegReader, probe_stream
+from media_scanner.ffmpeg_writer import FFmpegWriter, get_profile, is_segmented, mux_audio, remove_output
+from media_scanner.jobs import DONE, PRIORITY_HIGH, PRIORITY_NORMAL, get_queue
+from media_scanner.metrics import (CONTENT_TYPE, observe_stage, record_detections, record_frames,
+                                   render as render_metrics, server_timing, timed)
+from media_scanner.models import MediaItem
+from media_scanner.model_registry import get_model, model_version
+from media_scanner.keyframes import detector_chain
+from media_scanner.redaction import STYLES, detect, detections_from_result, render_detections
+from media_scanner.result_cache import cache_key, get_cache
+from media_scanner.segments import enabled as segments_enabled, plan as plan_segments, process_video_segments
+from media_scanner.uploads import (READ_SIZE, StreamingUploadHandler, UploadConflict,
+                                   create_session, get_session)
+from media_scanner.video_pipeline import format_stats, open_video, run_pipeline
 
 CONF_THRESHOLD = 0.5
 BLUR_DETECTIONS = True
-
-
-def blur_region(img, x, y, w, h):
-    roi = img[y:y + h, x:x + w]
-    blurred_roi = cv2.GaussianBlur(roi, (25, 25), 30)
-    img[y:y + h, x:x + w] = blurred_roi
-    return img
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv")
+IMAGE_BATCH_SIZE = 8   # images per model call when several are uploaded at once
+IMAGE_THREADS = 4      # threads decoding and blurring / encoding / writing those images
 
 
 def draw_or_blur_predictions(img, results, blur=False):
     for r in results:
-        for box in r.boxes:
-            cls_id = int(box.cls[0])
-            conf = float(box.conf[0])
-            if conf < CONF_THRESHOLD:
-                continue
-
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            label = f"{r.names[cls_id]} {conf:.2f}"
-
-            if blur:
-                img = blur_region(img, x1, y1, x2 - x1, y2 - y1)
-            else:
-                cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(img, label, (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        dets = detections_from_result(r, CONF_THRESHOLD)
+        img = render_detections(img, dets, r.names, blur=blur, style=settings.REDACTION_STYLE)
     return img
 
 
@@ -58,16 +50,42 @@ def predict_and_process(model, frame, blur=True):
     return draw_or_blur_predictions(frame, results, blur=blur)
 
 
-def run_video_mode(model, input_path, output_path):
-    cap = cv2.VideoCapture(input_path)
-    if not cap.isOpened():
-        raise FileNotFoundError(f"Video not found: {input_path}")
+def video_frame_processor(model, max_interval=None, on_detections=None, metrics_path="video"):
+    """Return (process_frame, keyframes, gate) for the video pipeline.
 
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps == 0:  # fallback to safe fps
-        fps = 25
+    With KEYFRAME_MAX_INTERVAL > 1 the detector only runs on keyframes and
+    boxes are propagated by optical flow in between; `keyframes` is None otherwise.
+    With MOTION_GATE the detector's last result is reused on frames that
+    barely changed since it ran; `gate` is None otherwise.
+    `on_detections` is called with each frame's detections, in frame order.
+    """
+    find, keyframes, gate = detector_chain(lambda frame: detect(model, frame, CONF_THRESHOLD),
+                                           max_interval, metrics_path)
+
+    def process_frame(frame):
+        with timed(metrics_path, "infer"):
+            dets = find(frame)
+        record_detections(metrics_path, len(dets))
+        if on_detections is not None:
+            on_detections(dets)
+        with timed(metrics_path, "blur"):
+            return render_detections(frame, dets, model.names,
+                                     blur=BLUR_DETECTIONS, style=settings.REDACTION_STYLE)
+
+    return process_frame, keyframes, gate
+
+
+def _report_detector_runs(keyframes, gate):
+    if gate is not None:
+        frames = keyframes.frames if keyframes is not None else gate.frames
+        print(f"[INFO] Detector ran on {gate.frames - gate.skipped}/{frames} frames "
+              f"({gate.skipped} runs skipped on unchanged frames)")
+    elif keyframes is not None:
+        print(f"[INFO] Detector ran on {keyframes.keyframes}/{keyframes.frames} frames")
+
+
+def run_video_mode(model, input_path, output_path):
+    cap, width, height, fps = open_video(input_path)
 
     # Use H.264 if supported
     out = cv2.VideoWriter(
@@ -79,134 +97,654 @@ def run_video_mode(model, input_path, output_path):
 
     print("[INFO] Processing video...")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    try:
+        stats = run_pipeline(
+            cap, lambda frame: predict_and_process(model, frame, blur=BLUR_DETECTIONS), out
+        )
+    finally:
+        cap.release()
+        out.release()
+    print(f"[✓] Done. Output saved to {output_path} ({format_stats(stats)})")
+
+
+def _open_upload(upload):
+    """Decoder for a video that is still being uploaded, or None once waiting is the only option.
+
+    The stream is piped into ffmpeg as chunks arrive. Containers that can't
+    be decoded from a pipe (e.g. MP4 with its index at the end) are only
+    opened after the last byte has arrived.
+    """
+    if upload.complete:
+        return None
+    info = probe_stream(upload.iter_chunks)
+    if info is None or upload.complete:
+        upload.wait_complete()
+        return None
+    cap = FFmpegReader(upload.iter_chunks, info["width"], info["height"], info["fps"])
+    return cap, info
+
+
+# Frames are piped straight into one ffmpeg encode. With `upload` (an
+# UploadSession) decoding overlaps with the upload itself.
+def _encode_video(input_path, output_path, process_frame, profile=None, job=None, upload=None,
+                  metrics_path="video"):
+    profile = profile or settings.VIDEO_OUTPUT_PROFILE
+    stream = _open_upload(upload) if upload is not None else None
+    if stream is None:
+        cap, width, height, fps = open_video(input_path)
+        audio_source = input_path
+    else:
+        cap, info = stream
+        width, height, fps = info["width"], info["height"], info["fps"]
+        # The source is still growing, so its audio is muxed in once the video is done
+        audio_source = None
+    out = FFmpegWriter(output_path, width, height, fps, audio_source=audio_source, profile=profile)
+
+    progress = None
+    if job is not None:
+        job.update_progress(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        progress = job.update_progress
+
+    try:
+        stats = run_pipeline(cap, process_frame, out, progress=progress, metrics_path=metrics_path)
+    except BaseException:
+        out.abort()
+        raise
+    else:
+        # ffmpeg finishing the file (flushing buffered frames, writing the index, audio)
+        with timed(metrics_path, "transcode"):
+            out.release()
+    finally:
+        cap.release()
+    if stream is not None and stream[1]["has_audio"]:
+        if is_segmented(profile):
+            # Segments already served can't be remuxed
+            print(f"[WARNING] {output_path} was encoded while uploading; it has no audio track")
+        else:
+            with timed(metrics_path, "transcode"):
+                mux_audio(output_path, input_path, profile)
+    print(f"[✓] Done. Output saved to {output_path} ({format_stats(stats)})")
+    stats["fps"] = fps
+    return stats
+
+
+def _segment_plan(input_path, upload, profile=None):
+    # Progressive (HLS / DASH) outputs are written front to back so playback can start early
+    if upload is not None or not segments_enabled() or is_segmented(profile or settings.VIDEO_OUTPUT_PROFILE):
+        return None
+    try:
+        return plan_segments(input_path)
+    except (OSError, RuntimeError) as e:
+        print(f"[WARNING] Can't split {input_path} into segments, processing it in one piece: {e}")
+        return None
+
+
+def _process_video_segments(input_path, output_path, video_plan, profile=None, job=None, store=None):
+    options = {
+        "conf": CONF_THRESHOLD,
+        "blur": BLUR_DETECTIONS,
+        "style": settings.REDACTION_STYLE,
+        "profile": profile or settings.VIDEO_OUTPUT_PROFILE,
+    }
+    stats, detections = process_video_segments(input_path, output_path, video_plan, options, job=job)
+    if store is not None:
+        for frame_index, dets in enumerate(detections):
+            store.add(frame_index, dets)
+        store.flush()
+    record_frames("video", stats["frames"])
+    observe_stage("video", "transcode", stats["concat"])
+    wall = stats["wall"] or 1e-6
+    print(f"[✓] Done. Output saved to {output_path} ({stats['frames']} frames in {stats['wall']:.2f}s "
+          f"({stats['frames'] / wall:.2f} fps), {stats['segments']} segments on {stats['workers']} workers)")
+    return stats
+
+
+# Process single video; with `store` (a DetectionWriter) every frame's boxes are saved.
+# Long videos are split into segments processed in parallel, unless they are still uploading.
+def process_video(input_path, output_path, model, profile=None, job=None, store=None, upload=None):
+    video_plan = _segment_plan(input_path, upload, profile)
+    if video_plan is not None:
+        return _process_video_segments(input_path, output_path, video_plan, profile, job, store)
+
+    on_detections = None
+    if store is not None:
+        frame_index = itertools.count()
+        on_detections = lambda dets: store.add(next(frame_index), dets)
+    process_frame, keyframes, gate = video_frame_processor(model, on_detections=on_detections)
+
+    print("[INFO] Processing video...")
+    stats = _encode_video(input_path, output_path, process_frame, profile=profile, job=job,
+                          upload=upload)
+    if store is not None:
+        store.flush()
+    _report_detector_runs(keyframes, gate)
+    return stats
 
-        processed = predict_and_process(model, frame.copy(), blur=BLUR_DETECTIONS)
-        out.write(processed)
 
-    cap.release()
-    out.release()
-    print(f"[✓] Done. Output saved to {output_path}")
+def _image_cache_key(file_bytes, file_ext):
+    return cache_key(file_bytes, file_ext, model_version(), CONF_THRESHOLD,
+                     BLUR_DETECTIONS, settings.REDACTION_STYLE)
 
 
-# Process single video using OpenCV
-def process_video(input_path, output_path, model):
-    cap = cv2.VideoCapture(input_path)
-    if not cap.isOpened():
-        raise FileNotFoundError(f"Video not found: {input_path}")
+def _output_url(filename):
+    return f"{settings.MEDIA_URL}blurred/{filename}"
 
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS) or 25
 
-    # Use mp4v for better compatibility
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+def _save_image(filename, data, cached):
+    blurred_dir = os.path.join(settings.MEDIA_ROOT, "blurred")
+    os.makedirs(blurred_dir, exist_ok=True)
+    with open(os.path.join(blurred_dir, filename), "wb") as image_file:
+        image_file.write(data)
+    return {
+        "filename": filename,
+        "url": _output_url(filename),
+        "cached": cached,
+    }
 
-    print("[INFO] Processing video...")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        processed = predict_and_process(model, frame.copy(), blur=BLUR_DETECTIONS)
-        out.write(processed)
+def _file_stamp():
+    """Prefix of stored file names: the time, plus a random part so uploads in the same second never collide."""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
-    cap.release()
-    out.release()
-    print(f"[✓] Done. Output saved to {output_path}")
 
+# Unredacted originals are kept outside MEDIA_ROOT (never served) for re-renders
+def _original_path(filename):
+    os.makedirs(settings.ORIGINALS_ROOT, exist_ok=True)
+    return os.path.join(settings.ORIGINALS_ROOT, filename)
 
-# convert mp4 to webm
-def convert_to_webm(input_path, output_path):
-    subprocess.run([
-        "ffmpeg", "-y",
-        "-i", input_path,
-        "-c:v", "libvpx-vp9", "-b:v", "1M",
-        "-c:a", "libopus",
-        output_path
-    ])
-    print(f"[✓] Converted to {output_path}")
+
+def _class_names(media):
+    if media.class_names:
+        return {int(k): v for k, v in media.class_names.items()}
+    return get_model().names
+
+
+def _encode_image(filename, img):
+    ok, encoded = cv2.imencode(os.path.splitext(filename)[1], img)
+    if not ok:
+        raise ValueError("Could not encode image")
+    return encoded.tobytes()
+
+
+def _record_image(name, timestamp, file_bytes, result, dets, names=None):
+    """Keep the original upload and store its detections; adds `media_id` to `result`."""
+    source_path = _original_path(f"{timestamp}_{name}")
+    with open(source_path, "wb") as source_file:
+        source_file.write(file_bytes)
+
+    media = MediaItem.objects.create(
+        kind=MediaItem.IMAGE, name=name, source=os.path.basename(source_path),
+        output=result["filename"], frame_count=1, model_version=model_version(),
+        conf_threshold=CONF_THRESHOLD, class_names=dict(names or {}),
+    )
+    store = DetectionWriter(media)
+    store.add(0, dets)
+    store.flush()
+    return {**result, "media_id": media.id}
+
+
+def _decode_image(file_bytes):
+    with timed("image", "decode"):
+        return cv2.imdecode(np.frombuffer(file_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _render_image(frame, dets, names, filename):
+    """Blur, encode and write one image; returns (encoded bytes, result)."""
+    with timed("image", "blur"):
+        blurred = render_detections(frame, dets, names, blur=BLUR_DETECTIONS, style=settings.REDACTION_STYLE)
+    with timed("image", "encode"):
+        data = _encode_image(filename, blurred)
+    return data, _save_image(filename, data, cached=False)
+
+
+def _image_batch_job(job, items):
+    """Process uploaded images, given as (file_bytes, name, timestamp, cache key) items.
+
+    Decoding and blur / encode / write run on IMAGE_THREADS threads (OpenCV
+    releases the GIL); inference runs on up to IMAGE_BATCH_SIZE images per
+    model call. Returns one result per item, in order; a file that fails gets
+    an error result and doesn't affect the others.
+    """
+    results = [None] * len(items)
+    model = get_model()
+    with ThreadPoolExecutor(IMAGE_THREADS, thread_name_prefix="image") as pool:
+        start = time.perf_counter()
+        frames = list(pool.map(_decode_image, [file_bytes for file_bytes, _, _, _ in items]))
+        job.timings["decode"] = time.perf_counter() - start
+        decoded = []
+        for i, frame in enumerate(frames):
+            if frame is None:
+                results[i] = {"filename": items[i][1], "error": "Could not decode image"}
+            else:
+                decoded.append(i)
+
+        detections = {}
+        for batch_start in range(0, len(decoded), IMAGE_BATCH_SIZE):
+            batch = decoded[batch_start:batch_start + IMAGE_BATCH_SIZE]
+            try:
+                # One observation per batch of up to IMAGE_BATCH_SIZE images
+                with timed("image", "infer", job.timings):
+                    batch_results = model([frames[i] for i in batch], verbose=False)
+            except Exception as e:
+                for i in batch:
+                    results[i] = {"filename": items[i][1], "error": str(e)}
+                continue
+            for i, result in zip(batch, batch_results):
+                detections[i] = detections_from_result(result, CONF_THRESHOLD)
+                record_detections("image", len(detections[i]))
+
+        start = time.perf_counter()
+        rendered = {
+            i: pool.submit(_render_image, frames[i], detections[i], model.names,
+                           f"blurred_{items[i][2]}_{items[i][1]}")
+            for i in detections
+        }
+        # Cache and database writes stay on this thread
+        for i, future in rendered.items():
+            file_bytes, name, timestamp, key = items[i]
+            try:
+                data, result = future.result()
+                get_cache().put(key, data, detections[i], model.names)
+                results[i] = _record_image(name, timestamp, file_bytes, result, detections[i], model.names)
+            except Exception as e:
+                results[i] = {"filename": name, "error": str(e)}
+                continue
+            record_frames("image")
+        job.timings["render"] = time.perf_counter() - start
+    return results
+
+
+def _video_job(job, media_id, output_path, upload=None):
+    media = MediaItem.objects.get(pk=media_id)
+    input_path = os.path.join(settings.ORIGINALS_ROOT, media.source)
+    try:
+        model = get_model()
+        if upload is not None and segments_enabled() and (
+                upload.complete or (upload.expected_size or 0) >= settings.VIDEO_SEGMENT_MIN_BYTES):
+            # A long video finishes sooner split across processes than streamed through one pipeline
+            upload.wait_complete()
+            upload = None
+        stats = process_video(input_path, output_path, model, job=job,
+                              store=DetectionWriter(media), upload=upload)
+    except BaseException:
+        _discard_video(media, input_path, output_path, upload)
+        raise
+
+    media.frame_count, media.fps = stats["frames"], stats["fps"]
+    media.class_names = dict(model.names)
+    media.save(update_fields=["frame_count", "fps", "class_names"])
+    return {
+        "filename": os.path.basename(output_path),
+        "url": _output_url(os.path.basename(output_path)),
+        "media_id": media.id,
+    }
+
+
+def _video_job_cancelled(job, media_id, output_path, upload=None):
+    """on_cancel of _video_job: cancelled while still queued, so it never got to clean up."""
+    media = MediaItem.objects.get(pk=media_id)
+    _discard_video(media, os.path.join(settings.ORIGINALS_ROOT, media.source), output_path, upload)
+
+
+def _discard_video(media, input_path, output_path, upload=None):
+    # Nothing to re-render from: drop the original, its partial detections and
+    # any partial output. Runs while handling an error or a cancellation, so a
+    # file that is already gone must not replace that with a FileNotFoundError.
+    if upload is not None:
+        upload.abort()
+    media.delete()
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(input_path)
+    remove_output(output_path)
+
+
+def _rerender_image_job(job, media_id, filename, blur, style, strength):
+    media = MediaItem.objects.get(pk=media_id)
+    frame = cv2.imread(os.path.join(settings.ORIGINALS_ROOT, media.source), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Original image is missing")
+
+    dets = load_detections(media).get(0, np.empty((0, 6), np.float32))
+    rendered = render_detections(frame, dets, _class_names(media),
+                                 blur=blur, style=style, strength=strength)
+    result = _save_image(filename, _encode_image(filename, rendered), cached=False)
+    media.output = filename
+    media.save(update_fields=["output"])
+    return {**result, "media_id": media.id}
+
+
+def _rerender_video_job(job, media_id, output_path, blur, style, strength):
+    media = MediaItem.objects.get(pk=media_id)
+    detections = load_detections(media)
+    names = _class_names(media)
+    no_dets = np.empty((0, 6), np.float32)
+    frame_index = itertools.count()
+
+    def process_frame(frame):
+        dets = detections.get(next(frame_index), no_dets)
+        return render_detections(frame, dets, names, blur=blur, style=style, strength=strength)
+
+    print("[INFO] Re-rendering video from stored detections...")
+    _encode_video(os.path.join(settings.ORIGINALS_ROOT, media.source), output_path,
+                  process_frame, job=job, metrics_path="rerender")
+    media.output = os.path.basename(output_path)
+    media.save(update_fields=["output"])
+    return {
+        "filename": media.output,
+        "url": _output_url(media.output),
+        "media_id": media.id,
+    }
+
+
+def _start_video_upload(name, size=None):
+    """Open an UploadSession for a video and queue its processing job right away.
+
+    The job decodes the upload as its chunks arrive. With a progressive
+    VIDEO_OUTPUT_PROFILE (hls / dash) `url` points at the playlist from the
+    start: it appears with the first segment and grows until the job is done.
+    """
+    timestamp = _file_stamp()
+    video_dir = os.path.join(settings.MEDIA_ROOT, "blurred")
+    os.makedirs(video_dir, exist_ok=True)
+
+    input_path = _original_path(f"{timestamp}_{name}")
+    output_ext = get_profile(settings.VIDEO_OUTPUT_PROFILE)["ext"]
+    output_path = os.path.join(video_dir, f"blurred_{timestamp}{output_ext}")
+
+    upload_session = create_session(input_path, name, size)
+    media = MediaItem.objects.create(
+        kind=MediaItem.VIDEO, name=name, source=os.path.basename(input_path),
+        output=os.path.basename(output_path), model_version=model_version(),
+        conf_threshold=CONF_THRESHOLD,
+    )
+    job = get_queue().submit(_video_job, media.id, output_path, upload_session,
+                             kind="video", priority=PRIORITY_NORMAL, on_cancel=_video_job_cancelled)
+    upload_session.info = {
+        "filename": os.path.basename(output_path),
+        "media_id": media.id,
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}/",
+    }
+    if is_segmented(settings.VIDEO_OUTPUT_PROFILE):
+        upload_session.info.update(url=_output_url(os.path.basename(output_path)), progressive=True)
+    return upload_session
+
+
+def _upload_status(upload_session):
+    job = get_queue().get(upload_session.info["job_id"])
+    return {
+        **upload_session.to_dict(),
+        **upload_session.info,
+        "status": job.status if job is not None else None,
+        "upload_url": f"/uploads/{upload_session.id}/",
+    }
 
 
 @csrf_exempt
 def upload(request):
     if request.method == "POST":
-        uploaded_files = request.FILES.getlist("images")
+        start = time.perf_counter()
+        # Stage -> seconds summed over the request's files, returned as a Server-Timing header
+        timings = {}
+        # Videos go straight into their processing job. Under ASGI the body is already
+        # spooled by now, so only the chunked /uploads/ API overlaps upload and processing
+        request.upload_handlers.insert(
+            0, StreamingUploadHandler(request, VIDEO_EXTENSIONS, _start_video_upload))
+        with timed("upload", "receive", timings):
+            uploaded_files = request.FILES.getlist("images")
+        job_queue = get_queue()
         results = []
+        pending = []   # (index in results, batch item) of images not in the cache
 
         for f in uploaded_files:
             file_ext = os.path.splitext(f.name)[1].lower()
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = _file_stamp()
 
-            # IMAGE HANDLING
-            if file_ext in [".jpg", ".jpeg", ".png", ".bmp"]:
+            # IMAGE HANDLING: served from the result cache when the same bytes
+            # were processed before, otherwise processed below with the others
+            if file_ext in IMAGE_EXTENSIONS:
                 file_bytes = f.read()
-                np_arr = np.frombuffer(file_bytes, np.uint8)
-                frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+                with timed("image", "cache_lookup", timings):
+                    key = _image_cache_key(file_bytes, file_ext)
+                    cached = get_cache().get(key)
+                if cached is not None:
+                    output, dets, names = cached
+                    result = _save_image(f"blurred_{timestamp}_{f.name}", output, cached=True)
+                    results.append(_record_image(f.name, timestamp, file_bytes, result, dets, names))
+                    continue
+                pending.append((len(results), (file_bytes, f.name, timestamp, key)))
+                results.append(None)
+
+            # VIDEO HANDLING: already handed to a background job, the client polls it
+            elif file_ext in VIDEO_EXTENSIONS:
+                upload_session = f.upload_session
+                job = job_queue.get(upload_session.info["job_id"])
+                results.append({**upload_session.info, "status": job.status})
+
+        # All new images go through one quick high-priority job the request waits for
+        if pending:
+            job = job_queue.submit(_image_batch_job, [item for _, item in pending],
+                                   kind="image", priority=PRIORITY_HIGH)
+            job.wait()
+            if job.started_at is not None:
+                observe_stage("image", "queue", job.started_at - job.created_at, timings)
+            for stage, seconds in job.timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+            for n, (index, (_, name, _, _)) in enumerate(pending):
+                results[index] = job.result[n] if job.status == DONE else {"filename": name, "error": job.error}
+
+        response = JsonResponse({"results": results})
+        timings["total"] = time.perf_counter() - start
+        response["Server-Timing"] = server_timing(timings)
+        return response
+
+    return JsonResponse({"error": "Only POST allowed"}, status=400)
 
-                blurred = predict_and_process(model, frame, blur=BLUR_DETECTIONS)
-                filename = f"blurred_{timestamp}_{f.name}"
-                blurred_dir = os.path.join(settings.MEDIA_ROOT, "blurred")
-                os.makedirs(blurred_dir, exist_ok=True)
-                blurred_path = os.path.join(blurred_dir, filename)
-                cv2.imwrite(blurred_path, blurred)
 
-                results.append({
-                    "filename": filename,
-                    "url": f"{settings.MEDIA_URL}blurred/{filename}",
-                })
+@csrf_exempt
+async def upload_async(request):
+    """`upload` for ASGI servers (ASYNC_UPLOAD_VIEW): runs on its own worker thread.
 
-            # VIDEO HANDLING
-            elif file_ext in [".mp4", ".mov", ".avi", ".mkv"]:
-                video_dir = os.path.join(settings.MEDIA_ROOT, "blurred")
-                os.makedirs(video_dir, exist_ok=True)
+    Sync views under ASGI share one thread, so a large upload waiting for its
+    images would hold up every other sync view.
+    """
+    return await sync_to_async(upload, thread_sensitive=False)(request)
 
-                input_path = os.path.join(video_dir, f"input_{timestamp}_{f.name}")
-                output_mp4_path = os.path.join(video_dir, f"blurred_{timestamp}.mp4")
-                output_webm_path = os.path.join(video_dir, f"blurred_{timestamp}.webm")
 
-                with open(input_path, "wb") as video_file:
-                    for chunk in f.chunks():
-                        video_file.write(chunk)
+@csrf_exempt
+def create_upload(request):
+    """Start a resumable chunked video upload.
+
+    Body: {"filename": str, "size": int}. Processing starts with the first
+    chunk; send the bytes in order with PATCH /uploads/<id>/ and an
+    `Upload-Offset` header, and GET it to find where to resume. This is the
+    way to upload large videos: the server reads each request body whole
+    before the view runs (ASGI), so processing overlaps the upload only
+    chunk by chunk; keep chunks to a few MB.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=400)
+    try:
+        options = json.loads(request.body or b"{}")
+        name = os.path.basename(str(options["filename"]))
+        size = int(options["size"])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({"error": "filename and size are required"}, status=400)
+    if os.path.splitext(name)[1].lower() not in VIDEO_EXTENSIONS or size <= 0:
+        return JsonResponse({"error": f"Expected a non-empty video ({', '.join(VIDEO_EXTENSIONS)})"},
+                            status=400)
+
+    return JsonResponse(_upload_status(_start_video_upload(name, size)), status=201)
 
-                # Process and convert
-                process_video(input_path, output_mp4_path, model)
-                convert_to_webm(output_mp4_path, output_webm_path)
 
-                # Clean up
-                os.remove(input_path)
-                os.remove(output_mp4_path)
+@csrf_exempt
+def upload_chunk(request, upload_id):
+    upload_session = get_session(upload_id)
+    if upload_session is None:
+        return JsonResponse({"error": "Upload not found"}, status=404)
+
+    if request.method == "GET":
+        return JsonResponse(_upload_status(upload_session))
+
+    if request.method == "DELETE":
+        upload_session.abort()
+        return JsonResponse(_upload_status(upload_session))
+
+    if request.method != "PATCH":
+        return JsonResponse({"error": "Only GET, PATCH or DELETE allowed"}, status=400)
+    try:
+        offset = int(request.headers["Upload-Offset"])
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Upload-Offset header is required"}, status=400)
+
+    # Append as the body is read; under WSGI an interrupted chunk still counts up to where it stopped
+    try:
+        while True:
+            data = request.read(READ_SIZE)
+            if not data:
+                break
+            upload_session.append(offset, data)
+            offset += len(data)
+    except UploadConflict as e:
+        return JsonResponse({**_upload_status(upload_session), "error": str(e)}, status=409)
+    return JsonResponse(_upload_status(upload_session))
+
+
+def cache_stats(request):
+    return JsonResponse(get_cache().stats())
+
+
+def prometheus_metrics(request):
+    """Prometheus scrape endpoint: stage latencies, frame rates, detections, sessions and queue depths"""
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
+
+
+def media_detail(request, media_id):
+    media = MediaItem.objects.filter(pk=media_id).first()
+    if media is None:
+        return JsonResponse({"error": "Media not found"}, status=404)
+    return JsonResponse({
+        **media.to_dict(),
+        "url": _output_url(media.output),
+        "detections": media.detections.count(),
+    })
+
+
+def media_detections(request, media_id):
+    """Audit export: every stored box of a media item, grouped by frame."""
+    media = MediaItem.objects.filter(pk=media_id).first()
+    if media is None:
+        return JsonResponse({"error": "Media not found"}, status=404)
+
+    names = _class_names(media)
+    frames = []
+    for frame, dets in sorted(load_detections(media).items()):
+        frames.append({
+            "frame": frame,
+            "boxes": [{
+                "class": names.get(int(cls_id), str(int(cls_id))),
+                "confidence": round(float(conf), 4),
+                "box": [round(float(v), 1) for v in (x1, y1, x2, y2)],
+            } for x1, y1, x2, y2, conf, cls_id in dets],
+        })
+    return JsonResponse({**media.to_dict(), "frames": frames})
 
-                results.append({
-                    "filename": os.path.basename(output_webm_path),
-                    "url": f"{settings.MEDIA_URL}blurred/{os.path.basename(output_webm_path)}",
-                })
 
-        return JsonResponse({"results": results})
+@csrf_exempt
+def render_media(request, media_id):
+    """Re-render a media item from its stored detections; no model call.
+
+    Body (JSON, all optional): {"blur": bool, "style": "blur"|"pixelate"|"fill",
+    "strength": float}. Images are rendered before responding, videos are
+    queued like uploads.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=400)
+    media = MediaItem.objects.filter(pk=media_id).first()
+    if media is None:
+        return JsonResponse({"error": "Media not found"}, status=404)
+
+    try:
+        options = json.loads(request.body or b"{}")
+        blur = bool(options.get("blur", BLUR_DETECTIONS))
+        style = options.get("style", settings.REDACTION_STYLE)
+        strength = options.get("strength")
+        if strength is not None:
+            strength = float(strength)
+            if not 0 < strength <= 1:
+                raise ValueError("strength must be in (0, 1]")
+        if style not in STYLES:
+            raise ValueError(f"style must be one of {STYLES}")
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    timestamp = _file_stamp()
+    job_queue = get_queue()
+
+    if media.kind == MediaItem.IMAGE:
+        job = job_queue.submit(_rerender_image_job, media.id, f"blurred_{timestamp}_{media.name}",
+                               blur, style, strength, kind="image", priority=PRIORITY_HIGH)
+        job.wait()
+        if job.status != DONE:
+            return JsonResponse({"error": job.error}, status=500)
+        return JsonResponse(job.result)
+
+    output_ext = get_profile(settings.VIDEO_OUTPUT_PROFILE)["ext"]
+    output_path = os.path.join(settings.MEDIA_ROOT, "blurred", f"blurred_{timestamp}{output_ext}")
+    job = job_queue.submit(_rerender_video_job, media.id, output_path, blur, style, strength,
+                           kind="video", priority=PRIORITY_NORMAL)
+    return JsonResponse({
+        "filename": os.path.basename(output_path),
+        "media_id": media.id,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}/",
+    })
+
+
+def job_status(request, job_id):
+    job = get_queue().get(job_id)
+    if job is None:
+        return JsonResponse({"error": "Job not found"}, status=404)
+    return JsonResponse(job.to_dict())
 
-    return JsonResponse({"error": "Only POST allowed"}, status=400)
+
+@csrf_exempt
+def job_cancel(request, job_id):
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=400)
+    job = get_queue().cancel(job_id)
+    if job is None:
+        return JsonResponse({"error": "Job not found"}, status=404)
+    return JsonResponse(job.to_dict())
+
+
+def job_result(request, job_id):
+    job = get_queue().get(job_id)
+    if job is None:
+        return JsonResponse({"error": "Job not found"}, status=404)
+    if job.status != DONE:
+        return JsonResponse(job.to_dict(), status=409)
+    return JsonResponse(job.result)
 
 
 @csrf_exempt
 def disconnect_livestream(request):
-    """API to stop the webcam"""
-    global camera
-
-    if camera and camera.isOpened():
-        camera.release()
-        camera = None
+    """API to stop the webcam once no viewer is left.
+
+    Each websocket releases the camera when it closes; this only makes sure
+    it is closed, it never cuts off other viewers.
+    """
+    if grabber.users:
+        return JsonResponse({"status": "shared", "viewers": grabber.users})
+    if grabber.running:
+        grabber.stop()
         return JsonResponse({"status": "disconnected"})
-    else:
-        return JsonResponse({"status": "already_closed"})
+    return JsonResponse({"status": "already_closed"})
 
 @csrf_exempt
 def delete_file(request):
     if request.method == "POST":
-        import json
         try:
             data = json.loads(request.body)
             filename = data.get("filename")
@@ -216,7 +754,13 @@ def delete_file(request):
 
             file_path = os.path.join(settings.MEDIA_ROOT, "blurred", filename)
             if os.path.exists(file_path):
-                os.remove(file_path)
+                remove_output(file_path)
+                # The stored detections and the kept original go with the output
+                for media in MediaItem.objects.filter(output=filename):
+                    source_path = os.path.join(settings.ORIGINALS_ROOT, media.source)
+                    if os.path.exists(source_path):
+                        os.remove(source_path)
+                    media.delete()
                 return JsonResponse({"status": "deleted"})
             else:
                 return JsonResponse({"error": "File not found"}, status=404)
@@ -78,12 +78,32 @@ TEMPLATES = [
 
 ASGI_APPLICATION = 'mediascanner.asgi.application'
 
-# Optional but recommended (keep Redis if you want scaling later)
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+# Channel layer: in-memory for a single process, Redis to fan broadcasts out
+# across processes (CHANNEL_LAYER=redis). Small capacity/expiry so slow
+# viewers skip stale frames instead of queueing them.
+CHANNEL_LAYER = os.getenv('CHANNEL_LAYER', 'memory')
+if CHANNEL_LAYER == 'redis':
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0')],
+                "capacity": 20,
+                "expiry": 2,
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+            "CONFIG": {"capacity": 20, "expiry": 2},
+        }
     }
-}
+
+# Broadcast livestream producer: "inline" starts it with the first viewer of
+# a process, "external" expects `manage.py broadcast_camera` to publish
+BROADCAST_PRODUCER = os.getenv('BROADCAST_PRODUCER', 'inline')
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -135,6 +155,65 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Unredacted uploads kept for re-rendering from stored detections; never served
+ORIGINALS_ROOT = os.getenv('ORIGINALS_ROOT', BASE_DIR / 'originals')
+
+# Detection model, loaded lazily once per process by media_scanner.model_registry
+MODEL_PATH = os.getenv('MODEL_PATH', BASE_DIR / 'best.pt')
+MODEL_WARMUP = os.getenv('MODEL_WARMUP', '1') == '1'
+
+# Inference backend for every entry point: "torch" (the .pt weights), "onnx"
+# (ONNX Runtime) or "openvino". The latter two use a converted copy cached in
+# EXPORTED_MODELS_DIR (see `manage.py export_model`); INT8 export calibrates
+# on the images in INFERENCE_CALIBRATION_DIR. INFERENCE_THREADS = 0 leaves the
+# thread count to the runtime.
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torch')
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', 0))
+INFERENCE_INT8 = os.getenv('INFERENCE_INT8', '0') == '1'
+INFERENCE_CALIBRATION_DIR = os.getenv('INFERENCE_CALIBRATION_DIR', BASE_DIR / 'calibration')
+EXPORTED_MODELS_DIR = os.getenv('EXPORTED_MODELS_DIR', BASE_DIR / 'models')
+
+# How detected regions are redacted: "blur", "pixelate" or "fill"
+REDACTION_STYLE = os.getenv('REDACTION_STYLE', 'blur')
+
+# Uploaded videos run the detector at most every N frames (adaptive, 1 = every
+# frame); boxes are propagated by optical flow in between
+KEYFRAME_MAX_INTERVAL = int(os.getenv('KEYFRAME_MAX_INTERVAL', 8))
+
+# Skip the detector on frames that barely differ from the last detected one
+# (livestream and uploaded videos) and reuse its result; the detector still
+# runs at least every MOTION_MAX_INTERVAL frames. MOTION_THRESHOLD is the share
+# of changed pixels in a downscaled frame that counts as a change.
+MOTION_GATE = os.getenv('MOTION_GATE', '1') == '1'
+MOTION_THRESHOLD = float(os.getenv('MOTION_THRESHOLD', 0.002))
+MOTION_MAX_INTERVAL = int(os.getenv('MOTION_MAX_INTERVAL', 30))
+
+# Videos longer than VIDEO_SEGMENT_MIN_SECONDS are split at keyframes and the
+# segments processed in parallel by VIDEO_SEGMENT_WORKERS processes (0 = one per
+# 4 cores, 1 = off). Streamed uploads of at least VIDEO_SEGMENT_MIN_BYTES wait
+# for the whole file so they can be split; smaller ones are processed as they arrive.
+VIDEO_SEGMENT_WORKERS = int(os.getenv('VIDEO_SEGMENT_WORKERS', 0))
+VIDEO_SEGMENT_MIN_SECONDS = float(os.getenv('VIDEO_SEGMENT_MIN_SECONDS', 120))
+VIDEO_SEGMENT_MIN_BYTES = int(os.getenv('VIDEO_SEGMENT_MIN_BYTES', 200 * 1024 * 1024))
+
+# Encoder profile for processed videos: "vp9" (.webm), "h264" (.mp4), or the
+# progressive "hls" (.m3u8) / "dash" (.mpd), playable while still being processed
+VIDEO_OUTPUT_PROFILE = os.getenv('VIDEO_OUTPUT_PROFILE', 'vp9')
+
+# In-process background job queue for uploads; express workers only take
+# high-priority (image) jobs so they never wait behind long videos
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_EXPRESS_WORKERS = int(os.getenv('JOB_EXPRESS_WORKERS', 1))
+
+# Serve /upload/ from an async view that runs the upload on its own thread,
+# so large image drops don't hold up other requests under the ASGI server
+ASYNC_UPLOAD_VIEW = os.getenv('ASYNC_UPLOAD_VIEW', '0') == '1'
+
+# Content-addressed cache of processed image uploads (LRU, in memory and on disk)
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', BASE_DIR / 'cache' / 'results')
+RESULT_CACHE_MEMORY_BYTES = int(os.getenv('RESULT_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+RESULT_CACHE_DISK_BYTES = int(os.getenv('RESULT_CACHE_DISK_BYTES', 1024 * 1024 * 1024))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
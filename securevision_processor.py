@@ -1,59 +1,70 @@
-import torch
-from ultralytics import YOLO
 import cv2
 import time
 import glob
 import os
 import datetime
+import multiprocessing
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 
 from mediascanner import settings
+from media_scanner.model_registry import get_model, model_version
+from media_scanner.motion import MotionGate
+from media_scanner.folder_workers import init_worker, process_batch
+from media_scanner.keyframes import KeyframeDetector
+from media_scanner.manifest import DONE, FAILED, Manifest
+from media_scanner.metrics import observe_stage, record_detections, record_frames, serve, timed
+from media_scanner.redaction import detect, detections_from_result, render_detections
+from media_scanner.video_pipeline import format_stats, open_video, run_pipeline
 
 # ─── CONFIG ─────────────────────────────────────────────────────────────────────
 MODE               = "webcam"  # options: "image", "webcam", "video", "folder"
 MODEL_PATH         = r"best.pt"  # <-- your trained model path
+INFERENCE_BACKEND  = None      # "torch", "onnx", "openvino" (None = settings.INFERENCE_BACKEND)
 IMAGE_PATH         = r"C:\Users\miavetisyan\Desktop\images\photo_5_2025-07-16_15-36-36.jpg"
 VIDEO_PATH         = r"C:\Users\miavetisyan\Desktop\video_2025-07-14_15-20-20.mp4"
 IMAGE_FOLDER_PATH  = r"C:\Users\miavetisyan\Desktop\images"
 OUTPUT_FOLDER_PATH = r"C:\Users\miavetisyan\Desktop\output_images"
 SAVE_RESULTS       = True
 BLUR_DETECTIONS    = True
+REDACTION_STYLE    = "blur"  # options: "blur", "pixelate", "fill"
+KEYFRAME_INTERVAL  = 8     # video mode: detect at most every N frames (1 = every frame)
+MOTION_GATE        = True  # webcam/video: reuse the last detections while the picture doesn't change
+MOTION_MAX_INTERVAL = 30   # ... but run the detector at least every N frames
 CONF_THRESHOLD     = 0.5  # Filter detections below this confidence
+FOLDER_BATCH_SIZE  = 8     # images per YOLO call in folder mode
+FOLDER_IO_WORKERS  = 4     # threads decoding / writing images in folder mode
+FOLDER_PREFETCH    = 32    # decoded images kept ready ahead of the model
+FOLDER_WORKERS     = 0     # folder mode processes, each with its own model (0 = one per FOLDER_WORKER_THREADS cores,
+                           # 1 = single process with threaded I/O and no manifest)
+FOLDER_WORKER_THREADS = 4  # cores per worker process when FOLDER_WORKERS = 0
+FOLDER_MANIFEST    = None  # manifest of processed files (None = .securevision_manifest.sqlite3 in OUTPUT_FOLDER_PATH)
+METRICS_PORT       = None  # serve Prometheus metrics on http://0.0.0.0:<port>/metrics while running
 # ────────────────────────────────────────────────────────────────────────────────
 
 
+class _NullWriter:
+    """Stands in for cv2.VideoWriter when SAVE_RESULTS is off."""
+
+    def write(self, frame):
+        pass
+
+    def release(self):
+        pass
+
+
+def _full_model_path(model_path):
+    return os.path.join(settings.BASE_DIR, model_path)
+
+
 def load_model(model_path):
-    # ✅ Check for GPU
-    DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"[INFO] Loading YOLO model on: {DEVICE.upper()}")
-
-    # ✅ Load model and move to correct device
-    full_model_path = os.path.join(settings.BASE_DIR, model_path)
-    model = YOLO(full_model_path).to(DEVICE)
-    return model
-def blur_region(img, x, y, w, h):
-    roi = img[y:y + h, x:x + w]
-    blurred_roi = cv2.GaussianBlur(roi, (25, 25), 30)
-    img[y:y + h, x:x + w] = blurred_roi
-    return img
+    return get_model(_full_model_path(model_path), backend=INFERENCE_BACKEND)
 
 
 def draw_or_blur_predictions(img, results, blur=False):
     for r in results:
-        for box in r.boxes:
-            cls_id = int(box.cls[0])
-            conf = float(box.conf[0])
-            if conf < CONF_THRESHOLD:
-                continue
-
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            label = f"{r.names[cls_id]} {conf:.2f}"
-
-            if blur:
-                img = blur_region(img, x1, y1, x2 - x1, y2 - y1)
-            else:
-                cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(img, label, (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        dets = detections_from_result(r, CONF_THRESHOLD)
+        img = render_detections(img, dets, r.names, blur=blur, style=REDACTION_STYLE)
     return img
 
 
@@ -92,18 +103,24 @@ def run_webcam_mode(model):
         out = cv2.VideoWriter(output_filename, cv2.VideoWriter_fourcc(*'mp4v'),
                               fps, (width, height))
 
+    gate = MotionGate(model, max_interval=MOTION_MAX_INTERVAL, metrics_path="webcam") if MOTION_GATE else None
+
     print("[INFO] Recording webcam... Press 'q' to quit.")
     frame_count = 0
+    frame = None
 
     while True:
-        ret, frame = cap.read()
+        # Each frame is shown and written before the next read, so one buffer is reused throughout
+        ret, frame = cap.read(frame)
         if not ret:
             print("[WARNING] Frame capture failed.")
             break
 
         start = time.time()
-        processed = predict_and_process(model, frame.copy(), blur=BLUR_DETECTIONS)
+        processed = predict_and_process(gate or model, frame, blur=BLUR_DETECTIONS)
         fps_calc = 1 / (time.time() - start + 1e-6)
+        observe_stage("webcam", "process", time.time() - start)
+        record_frames("webcam")
 
         cv2.putText(processed, f"FPS: {fps_calc:.2f}", (10, 30),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
@@ -123,67 +140,244 @@ def run_webcam_mode(model):
         out.release()
     if SAVE_RESULTS:
         print(f"[✓] Saved {frame_count} frames to {output_filename}")
+    if gate is not None:
+        print(f"[INFO] Detector skipped on {gate.skipped}/{gate.frames} unchanged frames")
     cv2.destroyAllWindows()
 
 
 def run_video_mode(model):
-    cap = cv2.VideoCapture(VIDEO_PATH)
-    if not cap.isOpened():
-        raise FileNotFoundError(f"Video not found: {VIDEO_PATH}")
-
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap, width, height, fps = open_video(VIDEO_PATH)
 
-    out = None
+    out = _NullWriter()
     if SAVE_RESULTS:
         out = cv2.VideoWriter("output_video.mp4", cv2.VideoWriter_fourcc(*'mp4v'),
                               fps, (width, height))
 
+    find = lambda frame: detect(model, frame, CONF_THRESHOLD)
+    gate = None
+    if MOTION_GATE:
+        # The gate only sees keyframes, which come every KEYFRAME_INTERVAL frames on a static scene
+        find = gate = MotionGate(find, max_interval=max(1, MOTION_MAX_INTERVAL // KEYFRAME_INTERVAL),
+                                 metrics_path="video")
+    keyframes = KeyframeDetector(find, max_interval=KEYFRAME_INTERVAL)
+
+    def process_frame(frame):
+        with timed("video", "infer"):
+            dets = keyframes(frame)
+        record_detections("video", len(dets))
+        with timed("video", "blur"):
+            return render_detections(frame, dets, model.names,
+                                     blur=BLUR_DETECTIONS, style=REDACTION_STYLE)
+
     print("[INFO] Processing video...")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    try:
+        stats = run_pipeline(cap, process_frame, out)
+    finally:
+        cap.release()
+        out.release()
+    print(f"[✓] Done. Output saved to output_video.mp4 ({format_stats(stats)})")
+    runs = keyframes.keyframes - (gate.skipped if gate is not None else 0)
+    print(f"[INFO] Detector ran on {runs}/{keyframes.frames} frames")
 
-        processed = predict_and_process(model, frame.copy(), blur=BLUR_DETECTIONS)
-        if SAVE_RESULTS and out:
-            out.write(processed)
 
-    cap.release()
-    if out:
-        out.release()
-    print("[✓] Done. Output saved to output_video.mp4")
+def _read_image(img_path):
+    start = time.perf_counter()
+    img = cv2.imread(img_path)
+    return img_path, img, time.perf_counter() - start
 
 
-def run_folder_mode(model):
-    if not os.path.exists(OUTPUT_FOLDER_PATH):
-        os.makedirs(OUTPUT_FOLDER_PATH)
+def _write_image(save_path, img):
+    start = time.perf_counter()
+    cv2.imwrite(save_path, img)
+    return time.perf_counter() - start
+
 
+def _report_throughput(stage_stats, wall_time):
+    print("[INFO] Per-stage throughput:")
+    for stage, (count, busy) in stage_stats.items():
+        rate = count / busy if busy > 0 else 0.0
+        print(f"  {stage:<8} {count:>7} images  {busy:8.2f}s busy  {rate:8.2f} img/s")
+    total = stage_stats["infer"][0]
+    overall = total / wall_time if wall_time > 0 else 0.0
+    print(f"  {'overall':<8} {total:>7} images  {wall_time:8.2f}s wall  {overall:8.2f} img/s")
+
+
+def _list_images(folder):
     image_extensions = ('*.jpg', '*.jpeg', '*.png', '*.bmp', '*.webp')
     image_files = []
     for ext in image_extensions:
-        image_files.extend(glob.glob(os.path.join(IMAGE_FOLDER_PATH, ext)))
+        image_files.extend(glob.glob(os.path.join(folder, ext)))
+    return image_files
+
+
+def run_folder_mode(model):
+    if not os.path.exists(OUTPUT_FOLDER_PATH):
+        os.makedirs(OUTPUT_FOLDER_PATH)
 
-    print(f"[INFO] Found {len(image_files)} images in folder.")
+    image_files = _list_images(IMAGE_FOLDER_PATH)
+    total = len(image_files)
+    print(f"[INFO] Found {total} images in folder.")
+
+    # stage -> [images, busy seconds]; decode/write busy time is summed over threads
+    stage_stats = {"decode": [0, 0.0], "infer": [0, 0.0], "blur": [0, 0.0], "write": [0, 0.0]}
+    wall_start = time.perf_counter()
+
+    with ThreadPoolExecutor(FOLDER_IO_WORKERS, thread_name_prefix="decode") as readers, \
+            ThreadPoolExecutor(FOLDER_IO_WORKERS, thread_name_prefix="write") as writers:
+        files = iter(image_files)
+        pending_reads = deque()
+        pending_writes = deque()
+
+        def prefetch():
+            while len(pending_reads) < FOLDER_PREFETCH:
+                img_path = next(files, None)
+                if img_path is None:
+                    return
+                pending_reads.append(readers.submit(_read_image, img_path))
+
+        def flush_writes(limit):
+            while len(pending_writes) > limit:
+                elapsed = pending_writes.popleft().result()
+                stage_stats["write"][0] += 1
+                stage_stats["write"][1] += elapsed
+                observe_stage("folder", "encode", elapsed)
+
+        def infer_batch(batch):
+            start = time.perf_counter()
+            results = model([img for _, img in batch], verbose=False)
+            elapsed = time.perf_counter() - start
+            stage_stats["infer"][0] += len(batch)
+            stage_stats["infer"][1] += elapsed
+            # One observation per batch of up to FOLDER_BATCH_SIZE images
+            observe_stage("folder", "infer", elapsed)
+
+            for (img_path, img), result in zip(batch, results):
+                record_detections("folder", len(detections_from_result(result, CONF_THRESHOLD)))
+                start = time.perf_counter()
+                output = draw_or_blur_predictions(img, [result], blur=BLUR_DETECTIONS)
+                elapsed = time.perf_counter() - start
+                stage_stats["blur"][0] += 1
+                stage_stats["blur"][1] += elapsed
+                observe_stage("folder", "blur", elapsed)
+                record_frames("folder")
+
+                if SAVE_RESULTS:
+                    save_path = os.path.join(OUTPUT_FOLDER_PATH, os.path.basename(img_path))
+                    pending_writes.append(writers.submit(_write_image, save_path, output))
+            # Keep the write backlog bounded so outputs don't pile up in memory
+            flush_writes(FOLDER_PREFETCH)
+
+        prefetch()
+        batch = []
+        while pending_reads:
+            img_path, img, elapsed = pending_reads.popleft().result()
+            prefetch()
+            stage_stats["decode"][0] += 1
+            stage_stats["decode"][1] += elapsed
+            observe_stage("folder", "decode", elapsed)
+
+            if img is None:
+                print(f"[WARNING] Skipping unreadable file: {img_path}")
+            else:
+                batch.append((img_path, img))
 
-    for i, img_path in enumerate(image_files, 1):
-        img = cv2.imread(img_path)
-        if img is None:
-            print(f"[WARNING] Skipping unreadable file: {img_path}")
-            continue
+            if batch and (len(batch) == FOLDER_BATCH_SIZE or not pending_reads):
+                infer_batch(batch)
+                print(f"[{stage_stats['decode'][0]}/{total}] Processed batch of {len(batch)}")
+                batch = []
 
-        output = predict_and_process(model, img.copy(), blur=BLUR_DETECTIONS)
-        base_name = os.path.basename(img_path)
-        save_path = os.path.join(OUTPUT_FOLDER_PATH, base_name)
+        flush_writes(0)
 
-        if SAVE_RESULTS:
-            cv2.imwrite(save_path, output)
-            print(f"[{i}/{len(image_files)}] Saved: {save_path}")
+    if SAVE_RESULTS:
+        print(f"[✓] Saved {stage_stats['write'][0]} images to {OUTPUT_FOLDER_PATH}")
+    _report_throughput(stage_stats, time.perf_counter() - wall_start)
+
+
+def _folder_workers():
+    """(worker processes, inference threads per worker) for sharded folder mode."""
+    cores = os.cpu_count() or 1
+    workers = FOLDER_WORKERS or max(1, cores // FOLDER_WORKER_THREADS)
+    return workers, max(1, cores // workers)
+
+
+def run_sharded_folder_mode():
+    """Folder mode spread over worker processes, resumable through an on-disk manifest.
+
+    Batches of FOLDER_BATCH_SIZE images are handed out to the workers as they
+    free up. Each result is recorded in the manifest as soon as it comes
+    back, so a rerun (after a crash, or on a folder with new files) only
+    processes files that are new, changed or failed.
+    """
+    os.makedirs(OUTPUT_FOLDER_PATH, exist_ok=True)
+    model_path = _full_model_path(MODEL_PATH)
+    version = f"{model_version(model_path, INFERENCE_BACKEND)}:{CONF_THRESHOLD}:{BLUR_DETECTIONS}:{REDACTION_STYLE}"
+    manifest = Manifest(FOLDER_MANIFEST or os.path.join(OUTPUT_FOLDER_PATH, ".securevision_manifest.sqlite3"),
+                        version=version)
+
+    image_files = [os.path.abspath(path) for path in _list_images(IMAGE_FOLDER_PATH)]
+    todo, skipped = manifest.plan(image_files)
+    print(f"[INFO] Found {len(image_files)} images in folder, {skipped} already processed and unchanged.")
+    if not todo:
+        manifest.close()
+        print("[✓] Nothing to do.")
+        return
+
+    batches = [todo[i:i + FOLDER_BATCH_SIZE] for i in range(0, len(todo), FOLDER_BATCH_SIZE)]
+    workers, threads = _folder_workers()
+    workers = min(workers, len(batches))
+    print(f"[INFO] Processing {len(todo)} images with {workers} worker processes x {threads} threads...")
+    options = {
+        "output_dir": OUTPUT_FOLDER_PATH,
+        "conf": CONF_THRESHOLD,
+        "blur": BLUR_DETECTIONS,
+        "style": REDACTION_STYLE,
+        "save": SAVE_RESULTS,
+    }
+
+    counts = Counter()
+    # stage -> [images, busy seconds], summed over all worker processes
+    stage_stats = {"decode": [0, 0.0], "infer": [0, 0.0], "blur": [0, 0.0], "write": [0, 0.0]}
+    wall_start = time.perf_counter()
+    # spawn: every worker starts clean and loads its own model (CUDA can't be forked)
+    pool = multiprocessing.get_context("spawn").Pool(
+        workers, initializer=init_worker,
+        initargs=(model_path, INFERENCE_BACKEND, threads, options))
+    try:
+        for rows, batch_stats in pool.imap_unordered(process_batch, batches):
+            manifest.record(rows)
+            for stage, (count, busy) in batch_stats.items():
+                stage_stats[stage][0] += count
+                stage_stats[stage][1] += busy
+            processed = 0
+            for row in rows:
+                if row["status"] == FAILED:
+                    print(f"[WARNING] Skipping {row['path']}: {row['error']}")
+                elif not row["unchanged"]:
+                    processed += 1
+                counts["unchanged" if row["unchanged"] else row["status"]] += 1
+            record_frames("folder", processed)
+            print(f"[{sum(counts.values())}/{len(todo)}] Processed batch of {len(rows)}")
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        manifest.close()
+
+    wall_time = time.perf_counter() - wall_start
+    print(f"[✓] Processed {counts[DONE]} images ({counts['unchanged']} unchanged, {counts[FAILED]} failed) "
+          f"in {wall_time:.2f}s ({counts[DONE] / wall_time if wall_time > 0 else 0.0:.2f} img/s)")
+    if SAVE_RESULTS:
+        print(f"[✓] Results in {OUTPUT_FOLDER_PATH}")
+    _report_throughput(stage_stats, wall_time)
 
 
 def main():
+    if METRICS_PORT:
+        serve(METRICS_PORT)
+    if MODE == "folder" and FOLDER_WORKERS != 1:
+        run_sharded_folder_mode()
+        return
     model = load_model(MODEL_PATH)
 
     if MODE == "image":